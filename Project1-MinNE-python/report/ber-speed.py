@@ -1,75 +1,113 @@
-import re
+import json
+import os
+import sys
+from statistics import mean
 
 import matplotlib.pyplot as plt
-import numpy as np
-from numpy.core.fromnumeric import mean
 
 plt.style.use(["fast"])
 
-ber = np.linspace(0, 1, 11)
-
-send_speed_uni = [
-    1299.8999999999999,
-    1025.2666666666667,
-    645.2666666666668,
-    653.5666666666666,
-    893.1333333333333,
-    777.5,
-    381.0,
-    476.63333333333327,
-    372.5333333333333,
-    418.9666666666667,
-    310.06666666666666,
-]
-recv_speed_uni = [
-    1510.2333333333336,
-    1163.2333333333333,
-    1141.9666666666667,
-    1062.2,
-    1084.3666666666668,
-    869.4666666666667,
-    414.93333333333334,
-    603.8333333333333,
-    428.06666666666666,
-    502.2333333333333,
-    354.1333333333334,
-]
-
-with open("log/1.log", "r", encoding="utf-8") as fr:
-    send_speed_bro = np.array(
-        [float(speed) for speed in re.findall(r": (.*?)bps", fr.read())]
-    )
-    send_speed_bro = [
-        mean(send_speed_bro[i : i + 3]) for i in range(0, len(send_speed_bro), 3)
+
+def read_logs(specs: list[str]) -> list[dict]:
+    """从主机日志中读取各误码率下的速率。
+
+    日志每行一条 JSON 记录，取其中发送结束与接收结束的记录，按单播、广播分别求平均。
+
+    Args:
+        specs: 形如 "0.001=../log/1.log" 的误码率与日志路径，同一误码率可以有多个日志。
+
+    Returns:
+        与基准测试结果格式相同的各点，只含发送模式、误码率与速率。
+    """
+    speeds: dict[tuple[str, float], dict[str, list[float]]] = {}
+    for spec in specs:
+        ber, path = spec.split("=", 1)
+        with open(path, "r", encoding="utf-8") as fr:
+            for line in fr:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("message") not in ("Send finish", "Recv finish"):
+                    continue
+                if not record.get("completed", True):
+                    continue
+                mode = "broadcast" if record.get("broadcast") else "unicast"
+                key = "send" if record["message"] == "Send finish" else "recv"
+                speeds.setdefault((mode, float(ber)), {"send": [], "recv": []})
+                speeds[(mode, float(ber))][key].append(record["bps"])
+    return [
+        {
+            "mode": mode,
+            "ber": ber,
+            "send_goodput": mean(speed["send"]) if speed["send"] else 0.0,
+            "recv_goodput": mean(speed["recv"]) if speed["recv"] else 0.0,
+        }
+        for (mode, ber), speed in speeds.items()
     ]
-    print(send_speed_bro)
 
-with open("log/2.log", "r", encoding="utf-8") as fr:
-    recv_speed_bro = np.array(
-        [float(speed) for speed in re.findall(r": (.*?)bps", fr.read())]
+
+# 参数为 "误码率=日志路径" 时读取主机日志，否则读取基准测试结果，默认为 src/benchmark.py 保存的基线。
+if len(sys.argv) > 1 and "=" in sys.argv[1]:
+    base, points = {}, read_logs(sys.argv[1:])
+else:
+    result_path = (
+        sys.argv[1]
+        if len(sys.argv) > 1
+        else os.path.join(os.path.dirname(__file__), "benchmark", "baseline.json")
     )
-    recv_speed_bro = [
-        mean(recv_speed_bro[i : i + 3]) for i in range(0, len(recv_speed_bro), 3)
-    ]
-    print(recv_speed_bro)
+    with open(result_path, "r", encoding="utf-8") as fr:
+        results = json.load(fr)
+        base, points = results["meta"]["base"], results["points"]
+
+
+def ber_series(mode: str) -> tuple[list[float], list[float], list[float]]:
+    """取出误码率扫描中某一发送模式的结果。
+
+    Args:
+        mode: 发送模式，"unicast" 或 "broadcast"。
+
+    Returns:
+        - [0] 误码率，单位为百分之一。
+        - [1] 发送方有效吞吐量，单位为 bps。
+        - [2] 接收方有效吞吐量，单位为 bps。
+    """
+    # 除误码率外，其余参数都取基准点的值；转发方式也要相同，否则同一误码率会有多个点。
+    series = sorted(
+        (
+            point
+            for point in points
+            if point["mode"] == mode
+            and all(
+                point.get(key) == base.get(key)
+                for key in ("stage", "data_len", "size", "forwarding")
+            )
+        ),
+        key=lambda point: point["ber"],
+    )
+    return (
+        [100 * point["ber"] for point in series],
+        [point["send_goodput"] for point in series],
+        [point["recv_goodput"] for point in series],
+    )
+
+
+ber_uni, send_speed_uni, recv_speed_uni = ber_series("unicast")
+ber_bro, send_speed_bro, recv_speed_bro = ber_series("broadcast")
 
 fig, axes = plt.subplots(1, 2, sharex=True)
 
 plt.subplot(1, 2, 1)
 plt.title("Unicast")
-plt.xlim(0, 1)
-plt.ylim(0, 3000)
-plt.plot(ber, send_speed_uni, label="Send")
-plt.plot(ber, recv_speed_uni, label="Receive")
+plt.plot(ber_uni, send_speed_uni, label="Send")
+plt.plot(ber_uni, recv_speed_uni, label="Receive")
 plt.legend()
 plt.grid()
 
 plt.subplot(1, 2, 2)
 plt.title("Broadcast")
-plt.xlim(0, 1)
-plt.ylim(0, 3000)
-plt.plot(ber, send_speed_bro, label="Send")
-plt.plot(ber, recv_speed_bro, label="Receive")
+plt.plot(ber_bro, send_speed_bro, label="Send")
+plt.plot(ber_bro, recv_speed_bro, label="Receive")
 plt.legend()
 plt.grid()
 
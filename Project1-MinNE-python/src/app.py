@@ -14,17 +14,19 @@ if __name__ == "__main__":
     app = AppLayer(device_id)
     print(app)
 
+    # 定期把指标写入 log 目录。
+    if Network.METRICS:
+        export_textfile(get_metrics_path(f"{device_id}-app"))
+
     # 开始运作。
     while True:
         # 持续等待，直到有消息可读。
         if not app.readable:
             continue
-        first_message, is_from_cmd = app.receive_all()
+        data, is_from_cmd = app.receive_all()
 
         # 如果消息来自控制台，说明本机成为发送端。
         if is_from_cmd:
-            # 解析控制台传来的数据。
-            data: dict = eval(first_message)
             if data["dst"] == Topology.BROADCAST_PORT:
                 print("[Broadcast]", end=" ")
             else:
@@ -34,33 +36,34 @@ if __name__ == "__main__":
             # 如果消息类型是文本。
             if data["msgtype"] == MessageType.TEXT:
                 print(text)
-                data["message"] = encode_unicode(text)
-            # 如果消息类型是图片。
+                if Network.UTF8_TEXT:
+                    data["msgtype"] = MessageType.UTF8_TEXT
+                    data["message"] = encode_utf8(text)
+                else:
+                    data["message"] = encode_unicode(text)
+            # 如果消息类型是图片，只传路径，由网络层边读边编码。
             else:
                 print(file)
-                data["message"] = encode_file(file)
+                data["file"] = file
+                if Network.RAW_FILE:
+                    data["msgtype"] = MessageType.RAW_FILE
             # 发送给本机网络层。
-            app.send_to_net(str(data))
+            app.send_to_net(data)
 
         # 如果消息来自本机网络层，说明本机成为接收端。
         else:
-            # 解析本机网络层传来的数据。
-            data: dict = eval(first_message)
             print(f"[Receive from {data['src'][1]}]", end=" ")
             # 如果消息类型是文本。
             if data["msgtype"] == MessageType.TEXT:
                 text = decode_unicode(data["message"])
                 print(text)
-            # 如果消息类型是文件。
+            elif data["msgtype"] == MessageType.UTF8_TEXT:
+                text = decode_utf8(data["message"])
+                print(text)
+            # 如果消息类型是文件，网络层已边收边解码保存。
             else:
                 # 如果解码失败。
-                file, decoded = decode_file(data["message"])
-                if not decoded:
+                if not data["decoded"]:
                     print("File decoding failed")
-                    continue
-                # 如果保存失败。
-                filepath, saved = save_rsc(file)
-                if not saved:
-                    print("File saving failed")
                 else:
-                    print(filepath)
+                    print(data["file"])
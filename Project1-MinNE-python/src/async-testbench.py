@@ -0,0 +1,83 @@
+import asyncio
+from statistics import median
+from threading import Event, Thread
+from time import perf_counter, sleep
+
+from layer._abstract import AbstractLayer
+
+CLIENT_PORT = "30011"
+SYNC_PORT = "30012"
+ASYNC_PORT = "30013"
+ROUNDS = 2000
+IDLE = 2
+
+
+def serve_sync(layer: AbstractLayer, stop: Event, wakeups: list[int]) -> None:
+    """旧版主循环：轮询可读性，再阻塞接收，原样回送。"""
+    while not stop.is_set():
+        wakeups[0] += 1
+        if not layer.readable:
+            continue
+        data, port, _ = layer._receive_bytes()
+        layer._send_bytes(data, port)
+
+
+async def serve_async(layer: AbstractLayer, stop: asyncio.Event, wakeups: list[int]):
+    """事件循环版主循环：数据到达才被唤醒，原样回送。"""
+    await layer.open_async()
+    while not stop.is_set():
+        data, port, success = await layer._receive_bytes_async(0.1)
+        if success:
+            wakeups[0] += 1
+            layer._send_bytes(data, port)
+
+
+def ping(client: AbstractLayer, port: str) -> list[float]:
+    """测量每次往返的时间，单位为微秒。"""
+    rtts = []
+    for i in range(ROUNDS):
+        start = perf_counter()
+        client._send_bytes(i.to_bytes(4, "big"), port)
+        client._receive_bytes(timeout=1)
+        rtts.append((perf_counter() - start) * 1e6)
+    return rtts
+
+
+def report(name: str, rtts: list[float], idle_wakeups: int) -> None:
+    """打印往返时间的分位数与空闲时的唤醒次数。"""
+    rtts.sort()
+    print(
+        f"{name:>6}: median {median(rtts):7.1f}us, "
+        f"p99 {rtts[int(len(rtts) * 0.99)]:7.1f}us, "
+        f"idle wake-ups {idle_wakeups / IDLE:4.1f}/s"
+    )
+
+
+client = AbstractLayer(CLIENT_PORT)
+
+# 旧版：select 轮询 + 阻塞接收。
+sync_layer = AbstractLayer(SYNC_PORT)
+stop, wakeups = Event(), [0]
+thread = Thread(target=serve_sync, args=(sync_layer, stop, wakeups), daemon=True)
+thread.start()
+rtts = ping(client, SYNC_PORT)
+wakeups[0] = 0
+sleep(IDLE)
+report("sync", rtts, wakeups[0])
+stop.set()
+
+# 事件循环：数据报协议 + 按截止时间等待。
+async_layer = AbstractLayer(ASYNC_PORT)
+loop = asyncio.new_event_loop()
+async_stop, async_wakeups = asyncio.Event(), [0]
+Thread(
+    target=loop.run_until_complete,
+    args=(serve_async(async_layer, async_stop, async_wakeups),),
+    daemon=True,
+).start()
+sleep(0.2)
+rtts = ping(client, ASYNC_PORT)
+async_wakeups[0] = 0
+sleep(IDLE)
+report("async", rtts, async_wakeups[0])
+loop.call_soon_threadsafe(async_stop.set)
@@ -0,0 +1,347 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from argparse import SUPPRESS, ArgumentParser
+from contextlib import redirect_stdout
+from datetime import datetime
+from itertools import product
+from random import choices, seed
+from statistics import mean, median
+from string import ascii_letters, digits
+from time import perf_counter
+
+import utils.io
+from simulate import Simulator
+from utils import *
+
+# 基准点的参数与逐项扫描的取值。每次只改变一项，其余取基准点的值。
+BASE_POINT = {
+    "stage": "3",
+    "mode": "unicast",
+    "ber": 0.0,
+    "data_len": 32,
+    "size": 1000,
+    "forwarding": ForwardingMode.CUT_THROUGH,
+}
+SWEEPS = {
+    "ber": [0.0, 1e-4, 3e-4, 1e-3, 2e-3],
+    "mode": ["unicast", "broadcast"],
+    "data_len": [16, 32, 64, 128],
+    "size": [100, 1000, 5000],
+    "stage": ["2", "3", "4"],
+    "forwarding": list(ForwardingMode.MODES),
+}
+# 同时扫描的几项，以及此时固定的其它取值。
+# 误码率对单播与广播都要扫描，供 `report/ber-speed.py` 作图；
+# 转发方式在经过交换机与路由器的阶段 4 拓扑上，与误码率一起扫描。
+CROSS_SWEEPS = [
+    (("ber", "mode"), {}),
+    (("ber", "forwarding"), {"stage": "4"}),
+]
+
+# 区分基准点的参数。
+POINT_KEYS = tuple(BASE_POINT.keys())
+
+# 单次运行的超时时间，以及发送方结束后留给接收方交付的时间，单位为秒。
+RUN_TIMEOUT = 120
+DELIVERY_GRACE = Network.RTO_MAX
+
+# 默认的结果与基线路径。
+report_dir = os.path.join(utils.io.rootdir, "report", "benchmark")
+baseline_file = os.path.join(report_dir, "baseline.json")
+latest_file = os.path.join(report_dir, "latest.json")
+
+
+def build_points(full: bool) -> list[dict]:
+    """生成要测量的参数组合。
+
+    Args:
+        full: 为 `True` 时取所有参数的笛卡尔积，否则从基准点出发逐项扫描。
+
+    Returns:
+        参数组合列表，不含重复项。
+    """
+    if full:
+        keys = list(SWEEPS.keys())
+        combos = [dict(zip(keys, values)) for values in product(*SWEEPS.values())]
+    else:
+        combos = [{key: value} for key, values in SWEEPS.items() for value in values]
+        for keys, fixed in CROSS_SWEEPS:
+            combos += [
+                {**fixed, **dict(zip(keys, values))}
+                for values in product(*(SWEEPS[key] for key in keys))
+            ]
+
+    points = []
+    for combo in combos:
+        point = {**BASE_POINT, **combo}
+        if point not in points:
+            points.append(point)
+    return points
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """计算 50、90、99 分位数，单位换算为毫秒。
+
+    Args:
+        samples: 样本，单位为秒。
+
+    Returns:
+        各分位数；没有样本时为空。
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        f"p{q}": round(
+            1000 * ordered[min(len(ordered) - 1, len(ordered) * q // 100)], 3
+        )
+        for q in (50, 90, 99)
+    }
+
+
+async def measure_once(point: dict, text: str, rate: float, run_seed: int) -> dict:
+    """在模拟器上发送一次消息并测量。
+
+    Args:
+        point: 参数组合。
+        text: 要发送的文本。
+        rate: 各主机的最大发送速率，单位为帧每秒。
+        run_seed: 物理链路的随机种子。
+
+    Returns:
+        该次发送的统计数据与各接收方的时延。
+    """
+    simulator = Simulator(rate, run_seed, {"errorProb": point["ber"]})
+    await simulator.start()
+    hosts = simulator.hosts
+    src = hosts[0]
+    if point["mode"] == "broadcast":
+        dst, targets = Topology.BROADCAST_PORT, hosts[1:]
+    else:
+        dst, targets = hosts[-1], hosts[-1:]
+
+    latencies: dict[str, float] = {}
+
+    async def wait_for(host: str) -> None:
+        """等待某台主机收到正确的消息，记录时延。"""
+        while True:
+            received = await simulator.receive(host)
+            if received and received[1] == text:
+                latencies[host] = perf_counter() - start_tick
+                return
+
+    receivers = [asyncio.create_task(wait_for(host)) for host in targets]
+    start_tick = perf_counter()
+    await simulator.send(src, dst, text)
+
+    # 等发送方全部确认或放弃，再留出交付的时间。
+    while not simulator.transfers(src) and perf_counter() - start_tick < RUN_TIMEOUT:
+        await asyncio.sleep(Network.FLOW_INTERVAL)
+    await asyncio.wait(receivers, timeout=DELIVERY_GRACE)
+    for receiver in receivers:
+        receiver.cancel()
+    await simulator.stop()
+
+    transfers = simulator.transfers(src)
+    return {
+        "stats": transfers[-1] if transfers else TransferStats(dst),
+        "latencies": list(latencies.values()),
+        "targets": len(targets),
+    }
+
+
+def run_point(point: dict, repeat: int, rate: float) -> dict:
+    """在本进程中测量一个参数组合。
+
+    拓扑阶段与帧长在导入时就已确定，每个参数组合都应在新进程中测量。
+
+    Args:
+        point: 参数组合。
+        repeat: 重复次数，第 `i` 次以 `i` 为物理链路的随机种子。
+        rate: 各主机的最大发送速率，单位为帧每秒。
+
+    Returns:
+        参数组合与汇总后的测量结果。
+    """
+    # 切换到该阶段的拓扑与物理层配置，不改动正式配置文件。
+    utils.io.devicemap_file = os.path.join(
+        utils.io.devicemap_dir, f"{point['stage']}.json"
+    )
+    utils.io.ne_file = os.path.join(utils.io.ne_dir, f"{point['stage']}.txt")
+    FrameParam.DATA_LEN = point["data_len"]
+    Network.FORWARDING_MODE = point["forwarding"]
+
+    seed(0)
+    text = "".join(choices(ascii_letters + digits, k=point["size"]))
+    bits = len(encode_utf8(text) if Network.UTF8_TEXT else encode_unicode(text))
+
+    runs = []
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for run_seed in range(repeat):
+            runs.append(asyncio.run(measure_once(point, text, rate, run_seed)))
+
+    stats = [run["stats"] for run in runs]
+    latencies = [latency for run in runs for latency in run["latencies"]]
+    completed = [stat for stat in stats if stat.completed and stat.elapsed]
+    return {
+        **point,
+        "runs": repeat,
+        "bits": bits,
+        "completed": len(completed) / repeat,
+        "delivered": len(latencies) / sum(run["targets"] for run in runs),
+        "send_goodput": (
+            round(median([bits / s.elapsed for s in completed]), 1)
+            if completed
+            else 0.0
+        ),
+        "recv_goodput": (
+            round(median([bits / latency for latency in latencies]), 1)
+            if latencies
+            else 0.0
+        ),
+        "frames": mean(stat.frames for stat in stats),
+        "retransmits": mean(stat.retransmits for stat in stats),
+        "naks": mean(stat.naks for stat in stats),
+        "timeouts": mean(stat.timeouts for stat in stats),
+        "rtt_ms": percentiles([rtt for stat in stats for rtt in stat.rtts]),
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def run_suite(points: list[dict], repeat: int, rate: float) -> dict:
+    """逐个在新进程中测量所有参数组合。
+
+    Args:
+        points: 参数组合列表。
+        repeat: 每个参数组合的重复次数。
+        rate: 各主机的最大发送速率，单位为帧每秒。
+
+    Returns:
+        测量条件与各参数组合的结果。
+    """
+    results = []
+    for point in points:
+        start_tick = perf_counter()
+        output = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--point",
+                json.dumps(point),
+                "--repeat",
+                str(repeat),
+                "--rate",
+                str(rate),
+            ],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        )
+        if output.returncode:
+            print(f"[Error] {point}\n{output.stderr}")
+            continue
+        result = json.loads(output.stdout)
+        results.append(result)
+        print(
+            f"{describe(point)}: {result['recv_goodput']}bps, "
+            f"{result['retransmits']} retransmits "
+            f"({round(perf_counter() - start_tick, 1)}s)"
+        )
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "repeat": repeat,
+            "rate": rate,
+            "arq": Network.ARQ_MODE,
+            "window": Network.WINDOW_SIZE,
+            "base": BASE_POINT,
+        },
+        "points": results,
+    }
+
+
+def describe(point: dict) -> str:
+    """生成参数组合的简短描述。"""
+    return " ".join(f"{key}={point[key]}" for key in POINT_KEYS)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """将结果与基线逐项比较。
+
+    接收方有效吞吐量下降超过容差，或者送达率、完成率下降，都视为退化。
+
+    Args:
+        results: 本次结果。
+        baseline: 基线结果。
+        tolerance: 容差，为相对变化的比例。
+
+    Returns:
+        各退化项的描述。
+    """
+    # 旧基线中没有的参数取基准点的值。
+    reference = {
+        tuple(point.get(key, BASE_POINT[key]) for key in POINT_KEYS): point
+        for point in baseline["points"]
+    }
+    regressions = []
+    print(f"{'point':<60} {'goodput':>10} {'baseline':>10} {'change':>8}")
+    for point in results["points"]:
+        base = reference.get(tuple(point[key] for key in POINT_KEYS))
+        if not base:
+            continue
+        change = (
+            point["recv_goodput"] / base["recv_goodput"] - 1
+            if base["recv_goodput"]
+            else 0.0
+        )
+        print(
+            f"{describe(point):<60} {point['recv_goodput']:>10} "
+            f"{base['recv_goodput']:>10} {change:>+8.1%}"
+        )
+        if change < -tolerance:
+            regressions.append(f"{describe(point)}: goodput {change:+.1%}")
+        for key in ("delivered", "completed"):
+            if point[key] < base[key]:
+                regressions.append(
+                    f"{describe(point)}: {key} {base[key]} -> {point[key]}"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    # 解析参数。
+    parser = ArgumentParser(description="Throughput benchmark on the simulator.")
+    parser.add_argument("--full", action="store_true", help="sweep every combination")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=Network.PACING_RATE)
+    parser.add_argument("--output", default=latest_file)
+    parser.add_argument("--baseline", default=baseline_file)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--point", help=SUPPRESS)
+    args = parser.parse_args()
+
+    # 子进程只测量一个参数组合，结果以 JSON 写到标准输出。
+    if args.point:
+        print(json.dumps(run_point(json.loads(args.point), args.repeat, args.rate)))
+        sys.exit(0)
+
+    results = run_suite(build_points(args.full), args.repeat, args.rate)
+    output = args.baseline if args.save_baseline else args.output
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fw:
+        json.dump(results, fw, indent=4)
+    print(f"Saved to {output}")
+
+    # 与基线比较，有退化时以非零状态退出。
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as fr:
+            regressions = compare(results, json.load(fr), args.tolerance)
+        if regressions:
+            print("[Warning] Regressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+        print("No regressions")
@@ -0,0 +1,55 @@
+from random import Random
+from time import perf_counter
+
+from utils.channel import Channel
+from utils.coding import encode_wire
+
+
+def legacy_corrupt(data: bytes, error_prob: float, random: Random) -> bytes:
+    """逐位抽样翻转旧格式的比特，仅作对照。"""
+    return bytes(byte ^ 1 if random.random() < error_prob else byte for byte in data)
+
+
+frame = encode_wire("01" * 50_000, packed=False)
+packed = encode_wire("01" * 50_000, packed=True)
+
+print(f"{'BER':>8} {'per-bit':>9} {'skip':>9} {'measured BER':>13}")
+for error_prob in (1e-5, 1e-4, 1e-3, 1e-2, 1e-1):
+    random = Random(0)
+    start = perf_counter()
+    legacy_corrupt(frame, error_prob, random)
+    legacy_time = perf_counter() - start
+
+    channel = Channel(error_prob=error_prob, seed=0)
+    start = perf_counter()
+    for _ in range(10):
+        corrupted = channel.corrupt(frame)
+    skip_time = (perf_counter() - start) / 10
+
+    # 实测误码率应接近设定值，压缩格式同样按有效位计。
+    for _ in range(10):
+        channel.corrupt(packed)
+    measured = channel.stats["flipped"] / (20 * 100_000)
+    print(
+        f"{error_prob:>8} {legacy_time * 1000:>7.2f}ms {skip_time * 1000:>7.3f}ms "
+        f"{measured:>13.2e}"
+    )
+
+# 相同种子、相同的帧序列，得到相同的误码与丢包。
+runs = []
+for _ in range(2):
+    channel = Channel(error_prob=1e-3, loss=0.1, seed="1-11100")
+    delivered = []
+    for _ in range(1000):
+        channel.send(frame[:200], delivered.append)
+    runs.append((delivered, channel.stats))
+assert runs[0] == runs[1]
+print(f"Deterministic with seed: OK {runs[0][1]}")
+
+# 缓存区大小按帧的位数计，两种格式的同一帧超长与否相同。
+for nbits, expected in ((1500, True), (1501, False)):
+    for packed_wire in (False, True):
+        channel = Channel(buffer_size=1500)
+        data = encode_wire("1" * nbits, packed_wire)
+        assert channel.send(data, lambda _: None) == expected, (nbits, packed_wire)
+print("MTU in bits for both formats: OK")
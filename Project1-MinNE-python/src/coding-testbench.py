@@ -0,0 +1,96 @@
+from random import choices, seed
+from re import findall
+from string import printable
+from time import perf_counter
+
+from utils.coding import (
+    decode_ascii,
+    decode_unicode,
+    decode_utf8,
+    encode_ascii,
+    encode_unicode,
+    encode_utf8,
+)
+
+
+def legacy_encode_ascii(ascii: str) -> str:
+    """旧版逐字符编码，仅作对照。"""
+    return "".join(str(bin(ord(char)))[2:].zfill(8) for char in ascii)
+
+
+def legacy_decode_ascii(binary: str) -> str:
+    """旧版正则切分解码，仅作对照。"""
+    return "".join(chr(int(byte, 2)) for byte in findall(".{8}", binary))
+
+
+def legacy_encode_unicode(unicode: str) -> str:
+    """旧版逐字符编码，仅作对照。"""
+    return "".join(str(bin(ord(char)))[2:].zfill(16) for char in unicode)
+
+
+def legacy_decode_unicode(binary: str) -> str:
+    """旧版正则切分解码，仅作对照。"""
+    return "".join(chr(int(byte, 2)) for byte in findall(".{16}", binary))
+
+
+def measure(func, arg) -> tuple[float, object]:
+    """测量单次调用耗时。"""
+    start = perf_counter()
+    result = func(arg)
+    return perf_counter() - start, result
+
+
+seed(0)
+cjk = "".join(chr(code) for code in range(0x4E00, 0x4E00 + 256))
+
+# 旧版太慢，只对 1MB 以内的输入对照。
+LEGACY_LIMIT = 1024 * 1024
+
+print(
+    f"{'size':>8} {'codec':>8} {'legacy enc':>11} {'new enc':>9} {'legacy dec':>11} {'new dec':>9}"
+)
+for size in (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024):
+    text = "".join(choices(printable, k=size))
+    mixed = "".join(choices(printable + cjk, k=size))
+    cases = (
+        (
+            "ascii",
+            text,
+            encode_ascii,
+            decode_ascii,
+            legacy_encode_ascii,
+            legacy_decode_ascii,
+        ),
+        (
+            "unicode",
+            mixed,
+            encode_unicode,
+            decode_unicode,
+            legacy_encode_unicode,
+            legacy_decode_unicode,
+        ),
+        ("utf8", mixed, encode_utf8, decode_utf8, None, None),
+    )
+    for name, sample, enc, dec, legacy_enc, legacy_dec in cases:
+        enc_time, binary = measure(enc, sample)
+        dec_time, decoded = measure(dec, binary)
+        assert decoded == sample, name
+
+        legacy_enc_time = legacy_dec_time = float("nan")
+        if legacy_enc and size <= LEGACY_LIMIT:
+            legacy_enc_time, legacy_binary = measure(legacy_enc, sample)
+            legacy_dec_time, legacy_decoded = measure(legacy_dec, legacy_binary)
+            # 新旧编码结果必须逐位相同。
+            assert legacy_binary == binary, name
+            assert legacy_decoded == decoded, name
+
+        print(
+            f"{size:>8} {name:>8} {legacy_enc_time:>10.4f}s {enc_time:>8.4f}s "
+            f"{legacy_dec_time:>10.4f}s {dec_time:>8.4f}s"
+        )
+
+# 基本多文种平面以外的字符，旧版会截断，新版编码为代理对。
+emoji = "表情😀"
+assert decode_unicode(encode_unicode(emoji)) == emoji
+assert decode_utf8(encode_utf8(emoji)) == emoji
+print("Non-BMP round trip: OK")
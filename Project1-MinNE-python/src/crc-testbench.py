@@ -0,0 +1,52 @@
+from random import choices, seed
+from time import perf_counter
+
+import utils.frame
+from utils.crc import generate_crc
+from utils.frame import FrameBuilder, FrameParam, FrameParser
+
+
+def legacy_crc(binary: str) -> int:
+    """旧版逐位移位的 CRC-16 算法，仅作对照。"""
+    cur = 0xFFFF
+    poly = 0xA001
+    for byte in hex(int(binary, 2))[2:]:
+        cur ^= ord(byte)
+        for _ in range(8):
+            last = cur % 2
+            cur >>= 1
+            if last == 1:
+                cur ^= poly
+    return cur
+
+
+def frames_per_second(rounds: int = 5000) -> float:
+    """测量每秒可建造并解析的帧数。"""
+    builder, parser = FrameBuilder(), FrameParser()
+    start = perf_counter()
+    for data in samples[:rounds]:
+        frame = builder.build(src="11300", data=data, dst="12300")
+        parser.parse(frame.binary)
+    return rounds / (perf_counter() - start)
+
+
+seed(0)
+samples = ["".join(choices("01", k=FrameParam.DATA_LEN)) for _ in range(5000)]
+
+# 兼容模式必须与旧版逐位相同。
+for data in samples:
+    assert generate_crc(data) == legacy_crc(data), data
+print("Compat mode: bit-identical to legacy")
+
+utils.frame.generate_crc = lambda binary, compat: legacy_crc(binary)
+before = frames_per_second()
+utils.frame.generate_crc = generate_crc
+FrameParam.CRC_COMPAT = True
+after_compat = frames_per_second()
+FrameParam.CRC_COMPAT = False
+after_packed = frames_per_second()
+FrameParam.CRC_COMPAT = True
+
+print(f"Legacy bit loop: {before:10.1f} frames/s")
+print(f"Table (compat):  {after_compat:10.1f} frames/s")
+print(f"crc_hqx (packed):{after_packed:10.1f} frames/s")
@@ -0,0 +1,80 @@
+import json
+import os
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import layer.router
+import utils.io
+from layer.router import RouterTable
+
+ROUTERS = 1000
+
+
+def legacy_get_router_WAN(device_id: str) -> dict:
+    """原先的写法：每次都重新读取并解析整个文件，仅作对照。"""
+    with open(utils.io.devicemap_file, "r", encoding="utf-8") as fr:
+        return json.loads(fr.read())["router"][device_id]["WAN"]
+
+
+def legacy_get_router_LAN(device_id: str) -> dict:
+    """原先的写法：每次都重新读取并解析整个文件，仅作对照。"""
+    with open(utils.io.devicemap_file, "r", encoding="utf-8") as fr:
+        return json.loads(fr.read())["router"][device_id]["LAN"]
+
+
+def startup(routers: list[str], merged: list[str]) -> tuple[float, float]:
+    """测量建立各路由器的初始路由表、以及部分路由器静态合并的耗时。
+
+    Returns:
+        - [0] 所有路由器建立初始路由表的耗时，单位为秒。
+        - [1] 每台路由器静态合并的平均耗时，单位为秒。
+    """
+    start = perf_counter()
+    for device_id in routers:
+        RouterTable(device_id)
+    init_time = perf_counter() - start
+    start = perf_counter()
+    for device_id in merged:
+        RouterTable(device_id).static_merge()
+    return init_time, (perf_counter() - start) / len(merged)
+
+
+with TemporaryDirectory() as temp_dir:
+    utils.io.devicemap_file = os.path.join(temp_dir, "devicemap.json")
+    with open(utils.io.devicemap_file, "w", encoding="utf-8") as fw:
+        json.dump(utils.io.generate_devicemap(ROUTERS), fw, indent=4)
+    size = os.path.getsize(utils.io.devicemap_file)
+    _, _, routers = utils.io.get_device_ids()
+    print(f"{len(routers)} routers, devicemap {size // 1024}KB")
+
+    # 原先每次读取都解析整个文件，只测一台路由器的静态合并。
+    layer.router.get_router_WAN = legacy_get_router_WAN
+    layer.router.get_router_LAN = legacy_get_router_LAN
+    legacy_init, legacy_merge = startup(routers, routers[:1])
+    layer.router.get_router_WAN = utils.io.get_router_WAN
+    layer.router.get_router_LAN = utils.io.get_router_LAN
+    cached_init, cached_merge = startup(routers, routers[:10])
+    print(
+        f"Init all tables: {legacy_init:.2f}s uncached, {cached_init * 1000:.1f}ms cached"
+    )
+    print(
+        f"Static merge per router: {legacy_merge:.2f}s uncached, "
+        f"{cached_merge * 1000:.1f}ms cached"
+    )
+
+    # 两种读法得到同样的路由表。
+    layer.router.get_router_WAN = legacy_get_router_WAN
+    layer.router.get_router_LAN = legacy_get_router_LAN
+    legacy_table = RouterTable("1")
+    legacy_table.static_merge()
+    layer.router.get_router_WAN = utils.io.get_router_WAN
+    layer.router.get_router_LAN = utils.io.get_router_LAN
+    cached_table = RouterTable("1")
+    cached_table.static_merge()
+    assert str(legacy_table) == str(cached_table)
+
+    # 文件改动后重新解析。
+    with open(utils.io.devicemap_file, "w", encoding="utf-8") as fw:
+        json.dump(utils.io.generate_devicemap(10), fw)
+    assert len(utils.io.get_device_ids()[2]) == 10
+    print("Invalidated by mtime: OK")
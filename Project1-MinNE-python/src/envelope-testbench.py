@@ -0,0 +1,68 @@
+from random import choices, seed
+from time import perf_counter
+
+from utils.envelope import decode_envelope, encode_envelope
+
+
+def measure(func, arg, rounds: int = 5) -> tuple[float, object]:
+    """测量多次调用的平均耗时。"""
+    start = perf_counter()
+    for _ in range(rounds):
+        result = func(arg)
+    return (perf_counter() - start) / rounds, result
+
+
+def legacy_encode(data: dict) -> bytes:
+    """旧版 `str(dict)` 编码，仅作对照。"""
+    return str(data).encode("utf-8")
+
+
+def legacy_decode(data: bytes) -> dict:
+    """旧版 `eval` 解码，仅作对照。"""
+    return eval(data.decode("utf-8"))
+
+
+seed(0)
+
+# 各类消息都能原样往返。
+samples = (
+    {"dst": "12300", "msgtype": "1", "text": "你好，MinNE", "file": ""},
+    {"dst": "65535", "msgtype": "3", "message": "", "file": "/tmp/a.png"},
+    {"src": "11300", "msgtype": "4", "message": "0110100001101001"},
+    {"src": "11300", "msgtype": "3", "file": "/tmp/b.png", "decoded": False},
+)
+for sample in samples:
+    assert decode_envelope(encode_envelope(sample)) == sample, sample
+print("Round trip: OK")
+
+# 不合法的信封一律拒绝。
+for bad in (
+    b"",
+    b"NE",
+    b"XX" + encode_envelope(samples[0])[2:],
+    encode_envelope(samples[2])[:-1],
+):
+    try:
+        decode_envelope(bad)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError(bad)
+print("Malformed envelopes rejected: OK")
+
+print(
+    f"{'bits':>9} {'legacy size':>12} {'size':>9} "
+    f"{'legacy enc':>11} {'enc':>8} {'legacy dec':>11} {'dec':>8}"
+)
+for size in (10**3, 10**4, 10**5, 10**6, 8 * 10**6):
+    data = {"src": "11300", "msgtype": "4", "message": "".join(choices("01", k=size))}
+    legacy_enc_time, legacy_bytes = measure(legacy_encode, data)
+    legacy_dec_time, legacy_data = measure(legacy_decode, legacy_bytes)
+    enc_time, packed = measure(encode_envelope, data)
+    dec_time, decoded = measure(decode_envelope, packed)
+    assert legacy_data == decoded == data
+    print(
+        f"{size:>9} {len(legacy_bytes):>12} {len(packed):>9} "
+        f"{legacy_enc_time:>10.4f}s {enc_time:>7.4f}s "
+        f"{legacy_dec_time:>10.4f}s {dec_time:>7.4f}s"
+    )
@@ -0,0 +1,81 @@
+import json
+import os
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import utils.io
+from layer.router import ForwardingTable, RouterTable
+
+ROUTERS = 1000
+N = 20_000
+
+
+def legacy_search(table: RouterTable, dst: str) -> str:
+    """原先的写法：逐个比较所有路由器与局域网主机，仅作对照。
+
+    原先只接受 5 位端口号，即设备号为 `dst[1]`；这里推广到多位设备号 `dst[1:-3]`。
+    """
+    host = dst[1:-3]
+    try:
+        dst_router = min(filter(lambda nominee: nominee >= host, table._WAN.keys()))
+    except Exception:
+        return ""
+    if dst_router == table._RouterTable__device_id:
+        try:
+            return list(filter(lambda item: item[0] == host, table._LAN.items()))[0][1]
+        except IndexError:
+            return ""
+    return table._WAN[dst_router].exit
+
+
+def measure(search, dsts: list[str]) -> float:
+    """测量每次查询的平均耗时，单位为微秒。"""
+    start = perf_counter()
+    for dst in dsts:
+        search(dst)
+    return (perf_counter() - start) / len(dsts) * 1e6
+
+
+# 与原先的写法逐个比对，包括不存在的设备号。
+for device_id in utils.io.get_device_ids()[2]:
+    table = RouterTable(device_id)
+    table.static_merge()
+    for host in "0123456789":
+        dst = f"1{host}300"
+        assert table.search(dst) == legacy_search(table, dst), dst
+print("Current devicemap: OK")
+
+with TemporaryDirectory() as temp_dir:
+    utils.io.devicemap_file = os.path.join(temp_dir, "devicemap.json")
+    with open(utils.io.devicemap_file, "w", encoding="utf-8") as fw:
+        json.dump(utils.io.generate_devicemap(ROUTERS), fw)
+    table = RouterTable("500")
+    # 合并前先查询一次，合并后的查询结果应当随之更新。
+    before = table.search("1250300")
+    table.static_merge()
+
+random = Random(0)
+hosts = [str(i) for i in range(1, 2 * ROUTERS)] + ["0", "X"]
+for host in hosts:
+    dst = f"1{host}300"
+    assert table.search(dst) == legacy_search(table, dst), dst
+assert before != table.search("1250300")
+print(f"{ROUTERS} routers: OK")
+
+# 编译转发表的耗时，合并路由表后第一次查询时付出。
+start = perf_counter()
+for _ in range(100):
+    ForwardingTable("500", table._WAN, table._LAN)
+print(f"Compile: {(perf_counter() - start) / 100 * 1e3:.2f}ms")
+
+# 每帧查询的耗时：活跃的目的地少于缓存容量时几乎都命中缓存，多于时都要二分查找。
+print(f"{'destinations':>12} {'scan':>10} {'FIB':>10}")
+for active in (100, 2 * ROUTERS):
+    dsts = [f"1{host}300" for host in random.choices(hosts[:active], k=N)]
+    fib = ForwardingTable("500", table._WAN, table._LAN, capacity=ROUTERS // 4)
+    times = [
+        measure(lambda dst: legacy_search(table, dst), dsts),
+        measure(fib.search, dsts),
+    ]
+    print(f"{active:>12} {times[0]:>8.2f}us {times[1]:>8.2f}us")
@@ -1,32 +1,133 @@
+import asyncio
 import socket
+from random import getrandbits
 from select import select
+from time import perf_counter
+from typing import Optional
 
+from utils.coding import decode_wire, is_packed
+from utils.envelope import decode_envelope, encode_envelope
+from utils.fabric import Fabric
+from utils.frame import Frame, FrameParser
+from utils.io import get_packed_ports
+from utils.metrics import (
+    BYTES,
+    CRC_FAILURES,
+    FRAME_PARSE,
+    FRAMES,
+    MESSAGES,
+    QUEUE_DEPTH,
+)
 from utils.params import Network
+from utils.stream import ChunkType, StreamReceiver, StreamSender, decode_chunk
+
+
+class LayerProtocol(asyncio.DatagramProtocol):
+    """事件循环上的数据报协议，把收到的数据交给所属的层。"""
+
+    def __init__(self, queue: asyncio.Queue) -> None:
+        """初始化协议。
+
+        Args:
+            queue: 所属层的接收队列。
+        """
+        self.__queue = queue
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        """收到数据报时放入接收队列。"""
+        self.__queue.put_nowait((data, str(addr[1])))
+
+    def error_received(self, exc: Exception) -> None:
+        """对端未启动等错误不影响本层运行，直接忽略。"""
 
 
 class AbstractLayer:
     """各网元层的抽象工厂。
 
-    实现了套接字相关的基本功能。
+    实现了套接字相关的基本功能。既可以阻塞地收发，
+    也可以在 `open_async` 之后由 asyncio 事件循环驱动，用 `*_async` 方法收发。
     """
 
-    def __init__(self, port: str) -> None:
+    def __init__(self, port: str, fabric: Optional[Fabric] = None) -> None:
         """初始化抽象层。
 
         创建绑定在指定端口的套接字，并设置默认超时时间。
 
         Args:
             port: 套接字要绑定的端口。
+            fabric: 可选，进程内的交换结构；指定时不创建套接字，
+                只能在 `open_async` 之后用 `*_async` 方法收发。默认为 `None`。
         """
-        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__port = port
+        self.__fabric = fabric
+        self.__socket = None
+        self.__timeout = Network.USER_TIMEOUT
 
-        try:
-            self.__socket.bind(("127.0.0.1", int(port)))
-        except OSError:
-            print(f"[Error] Port {port} is currently occupied.")
-            exit(-1)
+        if not fabric:
+            self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                self.__socket.bind(("127.0.0.1", int(port)))
+            except OSError:
+                print(f"[Error] Port {port} is currently occupied.")
+                exit(-1)
+            self.__socket.settimeout(Network.USER_TIMEOUT)
+
+        # 事件循环驱动时的传输与接收队列。
+        self.__transport: Optional[asyncio.DatagramTransport] = None
+        self.__queue: Optional[asyncio.Queue] = None
+
+        # 分块传输的消息号，随机起始以免与重启前的消息混淆。
+        self.__msg_id = getrandbits(32)
 
-        self.__socket.settimeout(Network.USER_TIMEOUT)
+        # 支持压缩线路编码的对端端口：先取配置中显式启用的端口，之后再从收到的帧中学习。
+        self.__packed_peers: set[str] = (
+            set(get_packed_ports()) if Network.PACKED_WIRE else set()
+        )
+
+        # 指标：按对端端口收发的帧数、字节数与消息数，首次与某端口收发时才新建。
+        self.__frames_in = FRAMES.bind("remote", local=port, direction="in")
+        self.__frames_out = FRAMES.bind("remote", local=port, direction="out")
+        self.__bytes_in = BYTES.bind("remote", local=port, direction="in")
+        self.__bytes_out = BYTES.bind("remote", local=port, direction="out")
+        self.__messages_in = MESSAGES.bind("remote", local=port, direction="in")
+        self.__messages_out = MESSAGES.bind("remote", local=port, direction="out")
+
+        # 解析耗时与校验失败的帧数只属于解析帧的层，首次记录时才新建。
+        self.__parser = FrameParser()
+        self.__parse_count = 0
+        self.__parse_time = FRAME_PARSE.bind("local")
+        self.__crc_failures = CRC_FAILURES.bind("local")
+
+    def _receive_bytes(
+        self,
+        bufsize: int = Network.INTER_NE_BUFSIZE,
+        timeout: int = Network.USER_TIMEOUT,
+    ) -> tuple[bytes, str, bool]:
+        """接收原始字节。
+
+        使用指定大小的缓存区，在指定超时时间内，接收发到本套接字的数据。
+
+        Args:
+            bufsize: 可选，缓存区大小，单位为位；默认为 `INTER_NE_BUFSIZE`。
+            timeout: 可选，超时时间，单位为秒；默认为 `USER_TIMEOUT`。
+
+        Returns:
+            - [0] 接收到的字节串。
+            - [1] 发来该数据的地址的端口号。
+            - [2] 接收成功为 `True`，接收超时为 `False`。
+        """
+        # 只有超时时间变化时才重新设置，连续以相同超时接收时不再多两次系统调用。
+        if timeout != self.__timeout:
+            self.__socket.settimeout(timeout)
+            self.__timeout = timeout
+
+        # 尝试接收数据。超时时间为 0 时套接字是非阻塞的，没有数据同样视为超时。
+        try:
+            data, (_, port) = self.__socket.recvfrom(bufsize)
+        except (socket.timeout, BlockingIOError):
+            return b"", "", False
+        self.__bytes_in[str(port)].inc(len(data))
+        return data, str(port), True
 
     def _receive(
         self,
@@ -46,27 +147,88 @@ class AbstractLayer:
             - [1] 发来该数据的地址的端口号。
             - [2] 接收成功为 `True`，接收超时为 `False`。
         """
-        timeout_assigned = timeout != Network.USER_TIMEOUT
+        data, port, success = self._receive_bytes(bufsize, timeout)
+        return data.decode("utf-8"), port, success
 
-        # 如果指定了超时时间，就在发送前设置。
-        if timeout_assigned:
-            self.__socket.settimeout(timeout)
+    def _receive_bits(
+        self,
+        bufsize: int = Network.INTER_NE_BUFSIZE,
+        timeout: int = Network.USER_TIMEOUT,
+    ) -> tuple[str, str, bool]:
+        """接收物理层发来的 01 字符串。
 
-        result = ("", "", False)
-        # 尝试接收数据。
-        try:
-            data, (_, port) = self.__socket.recvfrom(bufsize)
-        # 如果接收超时，不进行异常处理。
-        except socket.timeout:
-            pass
-        # 如果接收成功，则将接收到的 `bytes` 转码为 `str`。
+        自动识别线路编码格式。
+
+        Args:
+            bufsize: 可选，缓存区大小，单位为位；默认为 `INTER_NE_BUFSIZE`。
+            timeout: 可选，超时时间，单位为秒；默认为 `USER_TIMEOUT`。
+
+        Returns:
+            - [0] 接收到的 01 字符串。
+            - [1] 发来该数据的地址的端口号。
+            - [2] 接收成功为 `True`，接收超时为 `False`。
+        """
+        data, port, success = self._receive_bytes(bufsize, timeout)
+        return self._decode_bits(data, port), port, success
+
+    def _decode_bits(self, data: bytes, port: str) -> str:
+        """将物理层发来的字节串解码为 01 字符串。
+
+        如果对端发来的是压缩格式，说明它支持压缩格式，之后发往该端口的帧也改用压缩格式。
+
+        Args:
+            data: 收到的字节串。
+            port: 发来该数据的端口号。
+
+        Returns:
+            解码所得的 01 字符串。
+        """
+        if Network.PACKED_WIRE and is_packed(data):
+            self.__packed_peers.add(port)
+        if data:
+            self.__frames_in[port].inc()
+        return decode_wire(data)
+
+    def _parse_frame(self, binary: str, lazy: bool = False) -> Frame:
+        """解析物理层发来的帧，记录校验失败的帧数，并抽样记录解析耗时。
+
+        Args:
+            binary: 含有帧的 01 字符串。
+            lazy: 可选，为 `True` 时只解析源端口与目标端口，不做校验；默认为 `False`。
+
+        Returns:
+            解析所得的帧。
+        """
+        parse = self.__parser.parse_lazy if lazy else self.__parser.parse
+        self.__parse_count += 1
+        if self.__parse_count % Network.METRICS_SAMPLE:
+            frame = parse(binary)
         else:
-            result = (data.decode("utf-8"), str(port), True)
-        # 不管超不超时，都要恢复默认超时值。
-        finally:
-            if timeout_assigned:
-                self.__socket.settimeout(Network.USER_TIMEOUT)
-            return result
+            start_tick = perf_counter()
+            frame = parse(binary)
+            self.__parse_time[self.__port].observe(perf_counter() - start_tick)
+        if not lazy and not frame.verified:
+            self.__crc_failures[self.__port].inc()
+        return frame
+
+    def _send_bytes(self, data: bytes, port: str) -> int:
+        """向指定地址发送原始字节。
+
+        Args:
+            data: 要发送的字节串。
+            port: 指定地址的端口号。
+
+        Returns:
+            总共发送的字节数。
+        """
+        self.__bytes_out[port].inc(len(data))
+        if self.__fabric:
+            self.__fabric.sendto(data, self.__port, port)
+            return len(data)
+        if self.__transport:
+            self.__transport.sendto(data, ("127.0.0.1", int(port)))
+            return len(data)
+        return self.__socket.sendto(data, ("127.0.0.1", int(port)))
 
     def _send(self, data: str, port: str) -> int:
         """向指定地址发送数据。
@@ -78,7 +240,299 @@ class AbstractLayer:
         Returns:
             总共发送的字节数。
         """
-        return self.__socket.sendto(data.encode("utf-8"), ("127.0.0.1", int(port)))
+        return self._send_bytes(data.encode("utf-8"), port)
+
+    def _send_bits(self, frame: Frame, port: str) -> int:
+        """向指定物理层发送帧。
+
+        对端在配置中启用了压缩格式，或者发来过压缩格式的帧时，使用压缩格式；
+        否则使用旧格式，兼容外部物理层程序。
+
+        Args:
+            frame: 要发送的帧。
+            port: 指定物理层的端口号。
+
+        Returns:
+            总共发送的字节数。
+        """
+        self.__frames_out[port].inc()
+        return self._send_bytes(frame.wire(port in self.__packed_peers), port)
+
+    def _send_message(self, data: bytes, port: str) -> int:
+        """向本机其它层分块发送一条消息。
+
+        协议见 `StreamSender`。等待确认期间收到的其它数据会被丢弃。
+
+        Args:
+            data: 要发送的消息。
+            port: 目的端口号。
+
+        Returns:
+            总共发送的字节数；接收方一直没有确认时为 0。
+        """
+        sender = self.__new_sender(data)
+        sent = 0
+        while True:
+            for chunk in sender.window():
+                sent += self._send_bytes(chunk, port)
+            if sender.done:
+                return sent
+            # 等待本消息的新确认，超时则重发窗口。
+            while True:
+                reply, src, success = self._receive_bytes(
+                    timeout=Network.STREAM_TIMEOUT
+                )
+                if not success:
+                    if not sender.timeout():
+                        print(f"[Warning] Stream to {port} not acknowledged")
+                        return 0
+                    break
+                if src == port and sender.ack(decode_chunk(reply)):
+                    break
+
+    def _receive_message(self, first: bytes, port: str) -> Optional[bytes]:
+        """从第一块开始，接收一条分块发来的消息。
+
+        协议见 `StreamReceiver`。等待期间其它端口发来的数据会被丢弃。
+
+        Args:
+            first: 已收到的第一个块。
+            port: 发送方的端口号。
+
+        Returns:
+            完整的消息；不是合法的块或没有收完时为 `None`。
+        """
+        chunk = decode_chunk(first)
+        receiver = AbstractLayer.__new_receiver(chunk)
+        if not receiver:
+            return None
+        while True:
+            ack = receiver.feed(chunk)
+            if ack:
+                self._send_bytes(ack, port)
+            if receiver.done:
+                return receiver.message
+
+            data, src, success = self._receive_bytes(
+                bufsize=Network.IN_NE_BUFSIZE, timeout=Network.STREAM_TIMEOUT
+            )
+            chunk = None
+            if not success:
+                ack = receiver.timeout()
+                if not ack:
+                    print(f"[Warning] Stream from {port} incomplete")
+                    return None
+                self._send_bytes(ack, port)
+            elif src == port:
+                chunk = decode_chunk(data)
+
+    def __new_sender(self, data: bytes) -> StreamSender:
+        """为一条消息分配消息号，生成分块传输的发送方。"""
+        self.__msg_id = (self.__msg_id + 1) % 2**32
+        return StreamSender(data, self.__msg_id)
+
+    @staticmethod
+    def __new_receiver(chunk) -> Optional[StreamReceiver]:
+        """以第一块生成分块传输的接收方，不是某条消息的第一块时为 `None`。"""
+        if not chunk or chunk.kind != ChunkType.DATA or chunk.seq != 0:
+            return None
+        return StreamReceiver(chunk)
+
+    def _send_envelope(self, data: dict, port: str) -> int:
+        """向本机其它层发送消息数据。
+
+        Args:
+            data: 要发送的消息数据。
+            port: 目的端口号。
+
+        Returns:
+            总共发送的字节数。
+        """
+        sent = self._send_message(encode_envelope(data), port)
+        if sent:
+            self.__messages_out[port].inc()
+        return sent
+
+    def _receive_envelope(self, first: bytes, port: str) -> Optional[dict]:
+        """从第一块开始，接收本机其它层发来的消息数据。
+
+        Args:
+            first: 已收到的第一个块。
+            port: 发送方的端口号。
+
+        Returns:
+            接收到的消息数据；没有收完或不是合法信封时为 `None`。
+        """
+        message = self._receive_message(first, port)
+        return self.__decode_envelope(message, port)
+
+    def __decode_envelope(self, message: Optional[bytes], port: str) -> Optional[dict]:
+        """解码收完的消息，记录收到的消息数。
+
+        Args:
+            message: 收完的消息；没有收完时为 `None`。
+            port: 发送方的端口号。
+
+        Returns:
+            消息数据；没有收完或不是合法信封时为 `None`。
+        """
+        if message is None:
+            return None
+        try:
+            data = decode_envelope(message)
+        except ValueError:
+            return None
+        self.__messages_in[port].inc()
+        return data
+
+    async def open_async(self) -> None:
+        """把本层套接字注册到当前事件循环上。
+
+        之后收到的数据由事件循环放入接收队列，`*_async` 方法按各自的截止时间等待，
+        不再轮询；发送改由事件循环的传输完成。使用交换结构时只在其上注册本层端口。
+        """
+        if self.__fabric:
+            self.__queue = self.__fabric.attach(self.__port)
+        else:
+            self.__queue = asyncio.Queue()
+            self.__socket.setblocking(False)
+            loop = asyncio.get_running_loop()
+            self.__transport, _ = await loop.create_datagram_endpoint(
+                lambda: LayerProtocol(self.__queue), sock=self.__socket
+            )
+        # 队列长度只在导出时读取。
+        QUEUE_DEPTH.labels(local=self.__port).set_function(self.__queue.qsize)
+
+    async def _receive_bytes_async(
+        self, timeout: Optional[float] = None
+    ) -> tuple[bytes, str, bool]:
+        """在事件循环上接收原始字节。
+
+        Args:
+            timeout: 可选，超时时间，单位为秒；默认为 `None`，即一直等待。
+
+        Returns:
+            - [0] 接收到的字节串。
+            - [1] 发来该数据的地址的端口号。
+            - [2] 接收成功为 `True`，接收超时为 `False`。
+        """
+        # 队列里已有数据时直接取出，超时时间为 0 也能收到。
+        if not self.__queue.empty():
+            data, port = self.__queue.get_nowait()
+        else:
+            try:
+                data, port = await asyncio.wait_for(self.__queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return b"", "", False
+        self.__bytes_in[port].inc(len(data))
+        return data, port, True
+
+    async def _receive_bits_async(
+        self, timeout: Optional[float] = None
+    ) -> tuple[str, str, bool]:
+        """在事件循环上接收物理层发来的 01 字符串。
+
+        Args:
+            timeout: 可选，超时时间，单位为秒；默认为 `None`，即一直等待。
+
+        Returns:
+            - [0] 接收到的 01 字符串。
+            - [1] 发来该数据的地址的端口号。
+            - [2] 接收成功为 `True`，接收超时为 `False`。
+        """
+        data, port, success = await self._receive_bytes_async(timeout)
+        return self._decode_bits(data, port), port, success
+
+    async def _send_message_async(self, data: bytes, port: str) -> int:
+        """在事件循环上向本机其它层分块发送一条消息。
+
+        与 `_send_message` 相同，只是等待确认时不阻塞事件循环。
+
+        Args:
+            data: 要发送的消息。
+            port: 目的端口号。
+
+        Returns:
+            总共发送的字节数；接收方一直没有确认时为 0。
+        """
+        sender = self.__new_sender(data)
+        sent = 0
+        while True:
+            for chunk in sender.window():
+                sent += self._send_bytes(chunk, port)
+            if sender.done:
+                return sent
+            while True:
+                reply, src, success = await self._receive_bytes_async(
+                    Network.STREAM_TIMEOUT
+                )
+                if not success:
+                    if not sender.timeout():
+                        print(f"[Warning] Stream to {port} not acknowledged")
+                        return 0
+                    break
+                if src == port and sender.ack(decode_chunk(reply)):
+                    break
+
+    async def _receive_message_async(self, first: bytes, port: str) -> Optional[bytes]:
+        """在事件循环上从第一块开始，接收一条分块发来的消息。
+
+        Args:
+            first: 已收到的第一个块。
+            port: 发送方的端口号。
+
+        Returns:
+            完整的消息；不是合法的块或没有收完时为 `None`。
+        """
+        chunk = decode_chunk(first)
+        receiver = AbstractLayer.__new_receiver(chunk)
+        if not receiver:
+            return None
+        while True:
+            ack = receiver.feed(chunk)
+            if ack:
+                self._send_bytes(ack, port)
+            if receiver.done:
+                return receiver.message
+
+            data, src, success = await self._receive_bytes_async(Network.STREAM_TIMEOUT)
+            chunk = None
+            if not success:
+                ack = receiver.timeout()
+                if not ack:
+                    print(f"[Warning] Stream from {port} incomplete")
+                    return None
+                self._send_bytes(ack, port)
+            elif src == port:
+                chunk = decode_chunk(data)
+
+    async def _send_envelope_async(self, data: dict, port: str) -> int:
+        """在事件循环上向本机其它层发送消息数据。
+
+        Args:
+            data: 要发送的消息数据。
+            port: 目的端口号。
+
+        Returns:
+            总共发送的字节数。
+        """
+        sent = await self._send_message_async(encode_envelope(data), port)
+        if sent:
+            self.__messages_out[port].inc()
+        return sent
+
+    async def _receive_envelope_async(self, first: bytes, port: str) -> Optional[dict]:
+        """在事件循环上从第一块开始，接收本机其它层发来的消息数据。
+
+        Args:
+            first: 已收到的第一个块。
+            port: 发送方的端口号。
+
+        Returns:
+            接收到的消息数据；没有收完或不是合法信封时为 `None`。
+        """
+        message = await self._receive_message_async(first, port)
+        return self.__decode_envelope(message, port)
 
     @property
     def readable(self) -> bool:
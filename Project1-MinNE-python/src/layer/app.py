@@ -1,3 +1,6 @@
+from typing import Optional
+
+from utils.fabric import Fabric
 from utils.params import *
 
 from layer._abstract import AbstractLayer
@@ -9,66 +12,103 @@ class AppLayer(AbstractLayer):
     实现了控制台 -> 主机应用层 <-> 主机网络层的消息收发。
     """
 
-    def __init__(self, device_id: str) -> None:
+    def __init__(self, device_id: str, fabric: Optional[Fabric] = None) -> None:
         """初始化主机应用层。
 
         Args:
             device_id: 该主机的设备号。
+            fabric: 可选，进程内的交换结构，见 `AbstractLayer`；默认为 `None`。
         """
         self.__device_id = device_id
         self.__port = f"1{device_id}300"
         self.__net = f"1{device_id}200"
-        super().__init__(self.__port)
+        super().__init__(self.__port, fabric)
 
     def __str__(self) -> str:
         """打印设备号与端口号。"""
         return f"[Device {self.__device_id}] <App Layer @{self.__port}>\n{'-'*30}"
 
-    def receive_all(self) -> tuple[str, bool]:
+    def receive_all(self) -> tuple[dict, bool]:
         """接收来自控制台与本机网络层的消息。
 
         Returns:
-            - [0] 接收到的消息。
+            - [0] 接收到的消息数据。
             - [1] 控制台发来为 `True`，本机网络层发来为 `False`。
         """
         while True:
-            message, port, _ = self._receive(bufsize=Network.IN_NE_BUFSIZE)
-            if port == Topology.CMD_PORT:
-                return message, True
-            elif port == self.__net:
-                return message, False
-            else:
+            message, port, _ = self._receive_bytes(bufsize=Network.IN_NE_BUFSIZE)
+            if port not in (Topology.CMD_PORT, self.__net):
                 continue
+            # 没有收完或不是合法信封的消息直接丢弃。
+            data = self._receive_envelope(message, port)
+            if data is not None:
+                return data, port == Topology.CMD_PORT
 
-    def receive_from_cmd(self) -> str:
+    def receive_from_cmd(self) -> dict:
         """接收来自控制台的消息。
 
         Returns:
-            接收到的消息。
+            接收到的消息数据。
         """
-        port = ""
-        while port != Topology.CMD_PORT:
-            message, port, _ = self._receive(bufsize=Network.IN_NE_BUFSIZE)
-        return message
+        return self.__receive_from(Topology.CMD_PORT)
 
-    def receive_from_net(self) -> str:
+    def receive_from_net(self) -> dict:
         """接收来自本机网络层的消息。
 
         Returns:
-            接收到的消息。
+            接收到的消息数据。
         """
-        port = ""
-        while port != self.__net:
-            message, port, _ = self._receive(bufsize=Network.IN_NE_BUFSIZE)
-        return message
+        return self.__receive_from(self.__net)
 
-    def send_to_net(self, message: str) -> int:
+    def send_to_net(self, data: dict) -> int:
         """向本机网络层发送消息。
 
         Args:
-            message: 要发送的消息。
+            data: 要发送的消息数据。
+
+        Returns:
+            总共发送的字节数。
+        """
+        return self._send_envelope(data, self.__net)
+
+    async def receive_from_net_async(self) -> dict:
+        """在事件循环上接收来自本机网络层的消息。
+
+        Returns:
+            接收到的消息数据。
+        """
+        while True:
+            message, port, _ = await self._receive_bytes_async()
+            if port != self.__net:
+                continue
+            data = await self._receive_envelope_async(message, port)
+            if data is not None:
+                return data
+
+    async def send_to_net_async(self, data: dict) -> int:
+        """在事件循环上向本机网络层发送消息。
+
+        Args:
+            data: 要发送的消息数据。
 
         Returns:
             总共发送的字节数。
         """
-        return self._send(message, self.__net)
+        return await self._send_envelope_async(data, self.__net)
+
+    def __receive_from(self, expected: str) -> dict:
+        """接收指定端口发来的消息数据。
+
+        Args:
+            expected: 指定的端口号。
+
+        Returns:
+            接收到的消息数据。
+        """
+        while True:
+            message, port, _ = self._receive_bytes(bufsize=Network.IN_NE_BUFSIZE)
+            if port != expected:
+                continue
+            data = self._receive_envelope(message, port)
+            if data is not None:
+                return data
@@ -26,4 +26,4 @@ class CommandLayer(AbstractLayer, CommandUI):
         """
         super()._onclick_send_btn()
         src = self._user_data.pop("src")
-        self._send(str(self._user_data), src)
+        self._send_envelope(self._user_data, src)
@@ -1,7 +1,14 @@
-from time import sleep
+import asyncio
+from collections import deque
+from time import perf_counter
+from typing import Iterable, Iterator, Optional, Union
 
+from utils.arq import RecvWindow, RTOEstimator, SendWindow, TransferStats
 from utils.coding import *
+from utils.fabric import Fabric
 from utils.frame import *
+from utils.metrics import *
+from utils.pacing import TokenBucket
 from utils.params import *
 
 from layer._abstract import AbstractLayer
@@ -13,17 +20,33 @@ class NetLayer(AbstractLayer):
     实现了主机应用层 <-> 主机网络层 <-> 主机物理层的消息收发。
     """
 
-    def __init__(self, device_id: str) -> None:
+    # 消息类型与请求帧会话状态的对应关系。
+    REQ_STATES = {
+        MessageType.TEXT: SessionState.REQ_TXT,
+        MessageType.FILE: SessionState.REQ_IMG,
+        MessageType.RAW_FILE: SessionState.REQ_RAW,
+        MessageType.UTF8_TEXT: SessionState.REQ_UTF8,
+    }
+    MSG_TYPES = {state: msgtype for msgtype, state in REQ_STATES.items()}
+
+    def __init__(
+        self,
+        device_id: str,
+        fabric: Optional[Fabric] = None,
+        pacer: Optional[TokenBucket] = None,
+    ) -> None:
         """初始化主机网络层。
 
         Args:
             device_id: 该主机的设备号。
+            fabric: 可选，进程内的交换结构，见 `AbstractLayer`；默认为 `None`。
+            pacer: 可选，本机物理层链路的令牌桶；默认按 `Network` 中的参数新建。
         """
         self.__device_id = device_id
         self.__app = f"1{device_id}300"
         self.__port = f"1{device_id}200"
         self.__phy = f"1{device_id}100"
-        super().__init__(self.__port)
+        super().__init__(self.__port, fabric)
 
         self.__normal_builder = FrameBuilder()
         self.__normal_builder.build(
@@ -36,38 +59,91 @@ class NetLayer(AbstractLayer):
             session_state=SessionState.NORMAL,
             data="",
         )
-        self.__parser = FrameParser()
+        self.__estimators: dict[str, RTOEstimator] = {}
+        self.__pacer = pacer or TokenBucket()
+        # 最近若干次发送的统计数据。
+        self.__transfers: deque[TransferStats] = deque(maxlen=100)
+
+        # 差错控制的指标，每次发送结束时按统计数据累加。
+        self.__build_time = FRAME_BUILD.labels(device=device_id)
+        self.__build_count = 0
+        self.__ack_rtt = ACK_RTT.labels(device=device_id)
+        self.__sent = TRANSFERS.labels(device=device_id)
+        self.__naks = NAKS.labels(device=device_id)
+        self.__retransmits = RETRANSMITS.labels(device=device_id)
+        self.__timeouts = TIMEOUTS.labels(device=device_id)
+        self.__aborts = {
+            role: KEEPALIVE_ABORTS.labels(device=device_id, role=role)
+            for role in ("send", "recv")
+        }
 
     def __str__(self) -> str:
         """打印设备号与端口号。"""
         return f"[Device {self.__device_id}] <Net Layer @{self.__port}>\n{'-'*30}"
 
-    def receive_all(self) -> tuple[str, bool]:
+    def receive_all(self) -> tuple[Union[dict, str], bool]:
         """接收来自本机应用层与本机物理层的消息。
 
         Returns:
-            - [0] 接收到的消息。
+            - [0] 接收到的消息：本机应用层发来的是消息数据，本机物理层发来的是 01 字符串。
             - [1] 本机应用层发来为 `True`，本机物理层发来为 `False`。
         """
         while True:
-            message, port, _ = self._receive(bufsize=Network.IN_NE_BUFSIZE)
+            message, port, _ = self._receive_bytes(bufsize=Network.IN_NE_BUFSIZE)
             if port == self.__app:
-                return message, True
+                # 没有收完或不是合法信封的消息直接丢弃。
+                data = self._receive_envelope(message, port)
+                if data is not None:
+                    return data, True
             elif port == self.__phy:
-                return bits_to_string(message), False
+                return self._decode_bits(message, port), False
             else:
                 continue
 
-    def receive_from_app(self) -> str:
+    def receive_from_app(self) -> dict:
         """接收来自本机应用层的消息。
 
         Returns:
-            接收到的消息。
+            接收到的消息数据。
+        """
+        while True:
+            message, port, _ = self._receive_bytes(bufsize=Network.IN_NE_BUFSIZE)
+            if port != self.__app:
+                continue
+            data = self._receive_envelope(message, port)
+            if data is not None:
+                return data
+
+    async def receive_all_async(self) -> tuple[Union[dict, str], bool]:
+        """在事件循环上接收来自本机应用层与本机物理层的消息。
+
+        Returns:
+            - [0] 接收到的消息：本机应用层发来的是消息数据，本机物理层发来的是 01 字符串。
+            - [1] 本机应用层发来为 `True`，本机物理层发来为 `False`。
         """
-        port = ""
-        while port != self.__app:
-            message, port, _ = self._receive(bufsize=Network.IN_NE_BUFSIZE)
-        return message
+        while True:
+            message, port, _ = await self._receive_bytes_async()
+            if port == self.__app:
+                data = await self._receive_envelope_async(message, port)
+                if data is not None:
+                    return data, True
+            elif port == self.__phy:
+                return self._decode_bits(message, port), False
+
+    async def receive_from_phy_async(
+        self, timeout: float = Network.RECV_TIMEOUT
+    ) -> tuple[str, bool]:
+        """在事件循环上接收来自本机物理层的消息。
+
+        Args:
+            timeout: 可选，接收超时时间，单位为秒，默认为 `RECV_TIMEOUT`。
+
+        Returns:
+            - [0] 接收到的消息。
+            - [1] 接收成功为 `True`，接收超时为 `False`。
+        """
+        binary, _, success = await self._receive_bits_async(timeout)
+        return binary, success
 
     def receive_from_phy(self, timeout: int = Network.RECV_TIMEOUT) -> tuple[str, bool]:
         """接收来自本机物理层的消息。
@@ -79,33 +155,95 @@ class NetLayer(AbstractLayer):
             - [0] 接收到的消息。
             - [1] 接收成功为 `True`，接收超时为 `False`。
         """
-        binary, _, success = self._receive(timeout=timeout)
-        binary = bits_to_string(binary) if success else binary
+        binary, _, success = self._receive_bits(timeout=timeout)
         return binary, success
 
-    def send_to_app(self, message: str) -> int:
+    def send_to_app(self, data: dict) -> int:
         """向本机应用层发送消息。
 
         Args:
-            message: 要发送的消息。
+            data: 要发送的消息数据。
 
         Returns:
             总共发送的字节数。
         """
-        return self._send(message, self.__app)
+        return self._send_envelope(data, self.__app)
 
-    def send_to_phy(self, binary: str) -> int:
-        """向本机物理层发送消息。
+    async def send_to_app_async(self, data: dict) -> int:
+        """在事件循环上向本机应用层发送消息。
 
         Args:
-            binary: 要发送的消息。
+            data: 要发送的消息数据。
+
+        Returns:
+            总共发送的字节数。
+        """
+        return await self._send_envelope_async(data, self.__app)
+
+    async def send_to_phy_async(self, frame: Frame, paced: bool = True) -> int:
+        """在事件循环上向本机物理层发送帧。
+
+        限速时只让出事件循环，不阻塞同一循环上的其它设备。
+
+        Args:
+            frame: 要发送的帧。
+            paced: 可选，是否受令牌桶限速；默认为 `True`。
+
+        Returns:
+            总共发送的字节数。
+        """
+        if paced:
+            waited = self.__pacer.reserve()
+            if waited:
+                await asyncio.sleep(waited)
+        return self._send_bits(frame, self.__phy)
+
+    def send_to_phy(self, frame: Frame, paced: bool = True) -> int:
+        """向本机物理层发送帧。
+
+        Args:
+            frame: 要发送的帧。
+            paced: 可选，是否受令牌桶限速；默认为 `True`。
+                ACK/NAK 应为 `False`，不排队直接发送。
 
         Returns:
             总共发送的字节数。
         """
         # 流量控制。
-        sleep(Network.FLOW_INTERVAL)
-        return self._send(string_to_bits(binary), self.__phy)
+        if paced:
+            self.__pacer.consume()
+        return self._send_bits(frame, self.__phy)
+
+    @property
+    def pacer(self) -> TokenBucket:
+        """本机物理层链路的令牌桶。"""
+        return self.__pacer
+
+    @property
+    def transfers(self) -> list[TransferStats]:
+        """最近若干次发送的统计数据，按时间先后排列。"""
+        return list(self.__transfers)
+
+    def record_transfer(self, stats: TransferStats) -> None:
+        """记录一次发送的统计数据，并累加到指标上。
+
+        Args:
+            stats: 该次发送的统计数据。
+        """
+        self.__transfers.append(stats)
+        self.__sent.inc()
+        self.__naks.inc(stats.naks)
+        self.__retransmits.inc(stats.retransmits)
+        self.__timeouts.inc(stats.timeouts)
+        for rtt in stats.rtts:
+            self.__ack_rtt.observe(rtt)
+        # 没有完成的发送都是因连续超时而放弃的。
+        if not stats.completed:
+            self.__aborts["send"].inc()
+
+    def record_abort(self) -> None:
+        """记录一次因连续超时而放弃的接收。"""
+        self.__aborts["recv"].inc()
 
     def should_receive(self, port: str) -> bool:
         """判断本层是否应该接收某帧。
@@ -118,82 +256,185 @@ class NetLayer(AbstractLayer):
         """
         return port in (self.__app, Topology.BROADCAST_PORT)
 
-    def build_pool(self, app_data: dict) -> list[Frame]:
-        """将消息打包为帧。
+    def build_pool(self, app_data: dict) -> Iterator[Frame]:
+        """将消息逐帧打包。
+
+        帧按需生成：文件由 `iter_encode_file` 分段读取编码，发送窗口取到哪一帧，
+        才读到文件的哪一段，内存占用与文件大小无关。
 
         Args:
-            app_data: 本机应用层传来的消息数据。
+            app_data: 本机应用层传来的消息数据，含 "message" 或文件路径 "file"。
 
-        Returns:
-            打包的帧列表。
+        Yields:
+            依次为请求帧、常规帧、结束帧。
         """
-        message = app_data["message"]
-        frame_num = Frame.calc_num(message)
-
-        # 第一帧是请求帧。
-        request_frame = self.__normal_builder.build(
-            session_state=SessionState.REQ_TXT
-            if app_data["msgtype"] == MessageType.TEXT
-            else SessionState.REQ_IMG,
+        msgtype = app_data["msgtype"]
+        if "file" in app_data:
+            raw = msgtype == MessageType.RAW_FILE
+            chunks = iter_encode_file(app_data["file"], raw=raw)
+            total = encoded_file_len(app_data["file"], raw=raw)
+        else:
+            chunks = iter([app_data["message"]])
+            total = len(app_data["message"])
+
+        # 第一帧是请求帧，会话状态标明消息类型，数据为消息总位数。
+        yield self.__build(
+            self.__normal_builder,
+            session_state=NetLayer.REQ_STATES[msgtype],
+            data=dec_to_bin(total, FrameParam.DATA_LEN),
             dst=app_data["dst"],
         )
-        frame_pool = [request_frame]
 
-        # 中间的帧是常规帧。
-        frame_pool.extend(
-            [
-                self.__normal_builder.build(
+        # 中间的帧是常规帧。始终留下最后不超过一帧的数据，留给结束帧。
+        remained = ""
+        for chunk in chunks:
+            remained += chunk
+            frame_num = (len(remained) - 1) // FrameParam.DATA_LEN
+            for i in range(frame_num):
+                yield self.__build(
+                    self.__normal_builder,
                     session_state=SessionState.NORMAL,
-                    data=message[
+                    data=remained[
                         i * FrameParam.DATA_LEN : (i + 1) * FrameParam.DATA_LEN
                     ],
                 )
-                for i in range(frame_num - 1)
-            ]
-        )
+            remained = remained[frame_num * FrameParam.DATA_LEN :]
 
         # 最后一帧是结束帧。
-        final_frame = self.__normal_builder.build(
+        yield self.__build(
+            self.__normal_builder,
             session_state=SessionState.FIN,
-            data=message[(frame_num - 1) * FrameParam.DATA_LEN :],
+            data=remained,
         )
-        frame_pool.append(final_frame)
-
-        return frame_pool
 
-    def build_ack(self, dst: str) -> Frame:
+    def build_ack(self, dst: str, seq: int) -> Frame:
         """生成 ACK 帧。
 
         Args:
             dst: ACK 的目的地，即原消息的源。
+            seq: 确认的序号。
 
         Returns:
             生成的 ACK 帧。
         """
-        return self.__reply_builder.build(reply_state=ReplyState.ACK, dst=dst)
+        return self.__build(
+            self.__reply_builder, reply_state=ReplyState.ACK, seq=seq, dst=dst
+        )
 
-    def build_nak(self, dst: str) -> Frame:
+    def build_nak(self, dst: str, seq: int) -> Frame:
         """生成 NAK 帧。
 
         Args:
             dst: NAK 的目的地，即原消息的源。
+            seq: 期望重传的序号。
 
         Returns:
             生成的 NAK 帧。
         """
-        return self.__reply_builder.build(reply_state=ReplyState.NAK, dst=dst)
+        return self.__build(
+            self.__reply_builder, reply_state=ReplyState.NAK, seq=seq, dst=dst
+        )
+
+    def __build(self, builder: FrameBuilder, **kwargs) -> Frame:
+        """用指定的生成器封装一帧，抽样记录封装耗时。
+
+        Args:
+            builder: 帧生成器。
+            kwargs: 传给 `FrameBuilder.build` 的参数。
+
+        Returns:
+            生成的帧。
+        """
+        self.__build_count += 1
+        if self.__build_count % Network.METRICS_SAMPLE:
+            return builder.build(**kwargs)
+        start_tick = perf_counter()
+        frame = builder.build(**kwargs)
+        self.__build_time.observe(perf_counter() - start_tick)
+        return frame
+
+    def build_send_window(self, frames: Iterable[Frame], dst: str) -> SendWindow:
+        """生成发送窗口。
+
+        广播时各接收方的进度不一致，窗口固定为 1，即停止等待。
+
+        Args:
+            frames: 待发送的帧。
+            dst: 消息的目的端口号。
+
+        Returns:
+            生成的发送窗口。
+        """
+        size = 1 if dst == Topology.BROADCAST_PORT else Network.WINDOW_SIZE
+        return SendWindow(frames, size, Network.ARQ_MODE)
+
+    def declared_len(self, req_frame: Frame) -> Optional[int]:
+        """取出请求帧声明的消息总位数。
+
+        Args:
+            req_frame: 校验通过的请求帧。
+
+        Returns:
+            消息总位数；请求帧没有声明时为 `None`。
+        """
+        if len(req_frame.data) != FrameParam.DATA_LEN:
+            return None
+        return bin_to_dec(req_frame.data)
+
+    def build_recv_window(self, first_seq: int) -> RecvWindow:
+        """生成接收窗口。
+
+        Args:
+            first_seq: 请求帧的序号。
+
+        Returns:
+            生成的接收窗口。
+        """
+        return RecvWindow(first_seq, Network.WINDOW_SIZE, Network.ARQ_MODE)
+
+    def estimator(self, dst: str) -> RTOEstimator:
+        """获取到某目的地的重传超时估计器。
+
+        每个目的端口（包括广播端口）各自维护一个估计器。
+
+        Args:
+            dst: 目的端口号。
+
+        Returns:
+            该目的地的重传超时估计器。
+        """
+        if dst not in self.__estimators:
+            self.__estimators[dst] = RTOEstimator()
+        return self.__estimators[dst]
 
-    def parse_reply(self, binary: str) -> bool:
+    def parse_reply(self, binary: str) -> Frame:
         """解析回复。
 
         Args:
             binary: 含有回复的 01 字符串。
 
         Returns:
-            ACK 为 `True`，NAK 为 `False`。
+            收到的回复帧。
         """
-        response = self.__parser.parse(binary)
-        return True if response.reply_state == ReplyState.ACK else False
+        return self._parse_frame(binary)
+
+    def is_reply(self, frame: Frame) -> bool:
+        """判断某帧是否为发给本机的有效 ACK/NAK。
+
+        回复帧不携带数据；校验失败的回复序号不可信，一律不算。
+
+        Args:
+            frame: 收到的帧。
+
+        Returns:
+            是为 `True`，不是为 `False`。
+        """
+        return (
+            frame.verified
+            and frame.dst == self.__app
+            and frame.session_state == SessionState.NORMAL
+            and not frame.data
+        )
 
     def parse_message(self, binary: str) -> Frame:
         """解析消息。
@@ -204,4 +445,4 @@ class NetLayer(AbstractLayer):
         Returns:
             收到的消息帧。
         """
-        return self.__parser.parse(binary)
+        return self._parse_frame(binary)
@@ -1,8 +1,14 @@
+from bisect import bisect_left
+from collections import OrderedDict
 from dataclasses import dataclass
+from heapq import heappop, heappush
 from time import time
+from typing import Optional
 
-from utils.coding import *
-from utils.io import get_router_LAN, get_router_WAN
+from utils.fabric import Fabric
+from utils.frame import Frame
+from utils.io import get_forwarding_mode, get_router_LAN, get_router_WAN
+from utils.metrics import FRAMES_DROPPED
 from utils.params import *
 
 from layer._abstract import AbstractLayer
@@ -18,8 +24,6 @@ class Path:
     exit: str
     # 到达目的地的费用。
     cost: int
-    # 当前是否已经最优化。
-    optimized: bool
 
 
 @dataclass
@@ -32,13 +36,79 @@ class TableCache:
     completed: bool
 
 
+class ForwardingTable:
+    """转发表，由路由表编译而来。
+
+    目的主机由设备号不小于它的、设备号最小的路由器管辖。各路由器设备号按顺序排列，
+    用二分查找管辖目的主机的路由器，再直接查出本地物理层出口；
+    查找结果另按最近使用的先后缓存，超出容量时淘汰最久未用的。
+
+    路由表变化后整体重建，不做修改，缓存也随之作废。
+    """
+
+    def __init__(
+        self,
+        device_id: str,
+        WAN: dict[str, Path],
+        LAN: dict[str, str],
+        capacity: int = Network.ROUTE_CACHE_SIZE,
+    ) -> None:
+        """编译转发表。
+
+        Args:
+            device_id: 该路由器的设备号。
+            WAN: 路由表广域网环境，见 `RouterTable`。
+            LAN: 路由表局域网环境，见 `get_router_LAN`。
+            capacity: 可选，缓存的查找结果数；默认为 `ROUTE_CACHE_SIZE`。
+        """
+        self.__device_id = device_id
+        self.__routers = sorted(WAN.keys())
+        self.__exits = {dst: path.exit for dst, path in WAN.items()}
+        self.__LAN = dict(LAN)
+        self.__capacity = capacity
+        self.__cache: OrderedDict[str, str] = OrderedDict()
+
+    def search(self, dst: str) -> str:
+        """查询到达目的应用层的本地物理层出口。
+
+        Args:
+            dst: 目的应用层端口号，形如 "1{设备号}300"。
+
+        Returns:
+            到达目的地的本地物理层出口。如果没找到，就返回 ""。
+        """
+        exit_port = self.__cache.get(dst)
+        if exit_port is not None:
+            self.__cache.move_to_end(dst)
+            return exit_port
+
+        exit_port = self.__lookup(dst[1:-3])
+        self.__cache[dst] = exit_port
+        if len(self.__cache) > self.__capacity:
+            self.__cache.popitem(last=False)
+        return exit_port
+
+    def __lookup(self, host: str) -> str:
+        """查询到达目的主机的本地物理层出口，不经缓存。"""
+        index = bisect_left(self.__routers, host)
+        # 如果找不到上级路由器。
+        if index == len(self.__routers):
+            return ""
+        router = self.__routers[index]
+        # 如果上级路由器是自己，就从局域网出口送出。
+        if router == self.__device_id:
+            return self.__LAN.get(host, "")
+        return self.__exits[router]
+
+
 class RouterTable:
     """路由表。
 
     - 键：路由器设备号。
     - 值：到达该路由器的路径。
 
-    实现了 `Dijkstra` 算法、解包、打包。
+    实现了链路状态数据库、基于二叉堆的 `Dijkstra` 算法、解包、打包。
+    转发时查询由路由表编译而来的转发表，见 `ForwardingTable`。
     """
 
     def __init__(self, device_id: str) -> None:
@@ -50,6 +120,8 @@ class RouterTable:
         self.__device_id = device_id
         self._LAN = get_router_LAN(self.__device_id)
         self.__init_WAN()
+        # 转发表在路由表变化后作废，下次查询时重新编译。
+        self.__FIB: Optional[ForwardingTable] = None
 
     def __str__(self) -> str:
         """打印路由表。"""
@@ -71,42 +143,34 @@ class RouterTable:
         """
         self._WAN: dict[str, Path] = {}
         WAN_env = get_router_WAN(self.__device_id)
-        self._neighbors = list(WAN_env.keys())
 
         # 到自己的费用始终为 0。
-        self._WAN[self.__device_id] = Path(next="", exit="", cost=0, optimized=True)
+        self._WAN[self.__device_id] = Path(next="", exit="", cost=0)
 
-        # 依传入的字典逐项初始化。
-        min_cost, min_dst = float("inf"), ""
+        # 依传入的字典逐项初始化，记录到达周围路由器的路径。
         for dst, dic in WAN_env.items():
-            # 记录到达周围路由器的路径。
-            cur_cost = dic["cost"]
-            self._WAN[dst] = Path(
-                next=dst, exit=dic["exit"], cost=cur_cost, optimized=False
-            )
-            # 顺便找到费用最小值。
-            if cur_cost < min_cost:
-                min_cost = cur_cost
-                min_dst = dst
+            self._WAN[dst] = Path(next=dst, exit=dic["exit"], cost=dic["cost"])
 
-        # 记录当前费用最低的路由器端口号。
-        self._next_merge = min_dst
+        # 链路状态数据库，目前只有自己的邻接关系。
+        # - 键：路由器设备号。
+        # - 值：该路由器的邻居设备号与到达邻居的费用。
+        self.__LSDB: dict[str, dict[str, int]] = {
+            self.__device_id: {dst: dic["cost"] for dst, dic in WAN_env.items()}
+        }
+        # 到达各邻居的本地物理层端口号。
+        self.__exits = {dst: dic["exit"] for dst, dic in WAN_env.items()}
 
     @property
     def package(self) -> str:
         """打包路由表。
 
-        将到达邻居的下一跳与费用打包为字符串。
+        将到达各邻居的链路费用打包为字符串。
 
         Returns:
             路由包，格式为 "device:dst-cost|dst-cost|...|dst-cost:$"。
         """
         body = "|".join(
-            f"{dst}-{cost}"
-            for dst, cost in filter(
-                lambda item: item[0] in self._neighbors,
-                [(dst, str(path.cost)) for dst, path in self._WAN.items()],
-            )
+            f"{dst}-{cost}" for dst, cost in self.__LSDB[self.__device_id].items()
         )
         return f"{self.__device_id}:{body}:$"
 
@@ -137,74 +201,61 @@ class RouterTable:
     def merge(self, package: str) -> None:
         """合并外部路由表与本地路由表。
 
-        采用 `Dijkstra` 算法更新本地路由表路径。
+        将发来的邻接关系存入链路状态数据库，再重新计算最短路径。
 
         Args:
             package: 发来的路由包。
         """
-        # 解包字符串为路由表。
-        src, new_table = RouterTable.__unpack(package)
-
-        # 标记到达该来源的路径为最优化。
-        self._WAN[src].optimized = True
-
-        # 创建本地路由表的一份浅拷贝。
-        local_copy = self._WAN.copy()
-
-        # 遍历更新本地路由表。
-        min_cost, min_dst = float("inf"), ""
-        for dst, new_cost in new_table.items():
-            # 比对两表内，关于该目的地的数据。
-            local_path = self._WAN.get(dst, None)
-            new_path = Path(
-                next=src,
-                exit=self._WAN[src].exit,
-                cost=new_cost + self._WAN[src].cost,
-                optimized=False,
-            )
-
-            # 如果表里没有这条记录，就追加进表。
-            if not local_path:
-                self._WAN[dst] = new_path
-                cur_cost = new_cost
-            # 如果这条记录已经是最优化的，就跳过。
-            elif local_path.optimized:
-                continue
-            # 如果本地记录费用低，就维持本地路径。
-            elif local_path.cost < new_path.cost:
-                cur_cost = local_path.cost
-            # 如果新记录费用低，就更新路径。
-            else:
-                self._WAN[dst] = new_path
-                cur_cost = new_cost
-
-            # 更新当前非最优化路径集的费用最小值。
-            if min_cost > cur_cost:
-                min_cost = cur_cost
-                min_dst = dst
-
-            # 如果这条路径原来就有，就在拷贝中删掉这一条。
-            if local_path:
-                local_copy.pop(dst)
-
-        # 检测还有哪些端口没被比较过最小值。
-        remained = dict(filter(lambda item: not item[1].optimized, local_copy.items()))
-        # 如果还有端口没被比较过，就将最小值与这些端口相比较。
-        if remained:
-            min_item = min(remained.items(), key=lambda item: item[1].cost)
-            if min_item[1].cost < min_cost:
-                min_dst = min_item[0]
-        # 记录最小值对应的端口。
-        self._next_merge = min_dst
-
-        # 排序路由表。
-        self._WAN = dict(sorted(self._WAN.items(), key=lambda item: item[0]))
+        src, table = RouterTable.__unpack(package)
+        self.__LSDB[src] = table
+        self.__shortest_paths()
 
     def static_merge(self) -> None:
-        """静态合并路由表，与配置文件内的其它路由表合并。"""
-        while self._next_merge:
-            table = RouterTable(self._next_merge)
-            self.merge(table.package)
+        """静态合并路由表，与配置文件内的其它路由表合并。
+
+        从自己的邻居出发，读入所有可达路由器的邻接关系，最后只计算一次最短路径。
+        """
+        pending = list(self.__LSDB[self.__device_id].keys())
+        while pending:
+            router = pending.pop()
+            if router in self.__LSDB:
+                continue
+            self.__LSDB[router] = {
+                dst: dic["cost"] for dst, dic in get_router_WAN(router).items()
+            }
+            pending.extend(self.__LSDB[router].keys())
+        self.__shortest_paths()
+
+    def __shortest_paths(self) -> None:
+        """在链路状态数据库上，以 `Dijkstra` 算法计算到达各路由器的最短路径。
+
+        用二叉堆取出费用最低的路由器，耗时为 O((V + E) log V)。费用相同时，
+        先取出的路径优先。路径的下一跳记为到达目的地前的最后一台路由器，
+        出口为到达第一台路由器的本地物理层端口，与逐个合并路由包的结果一致。
+        """
+        # 费用、设备号、前一台路由器、出口。
+        heap: list[tuple[int, str, str, str]] = [(0, self.__device_id, "", "")]
+        costs = {self.__device_id: 0}
+        WAN: dict[str, Path] = {}
+        while heap:
+            cost, router, prev, exit = heappop(heap)
+            if router in WAN:
+                continue
+            WAN[router] = Path(next=prev, exit=exit, cost=cost)
+            for dst, link_cost in self.__LSDB.get(router, {}).items():
+                new_cost = cost + link_cost
+                if dst in WAN or new_cost >= costs.get(dst, float("inf")):
+                    continue
+                costs[dst] = new_cost
+                # 从自己出发时，下一跳就是邻居本身，出口为到达邻居的端口。
+                if router == self.__device_id:
+                    heappush(heap, (new_cost, dst, dst, self.__exits[dst]))
+                else:
+                    heappush(heap, (new_cost, dst, router, exit))
+
+        # 排序路由表，并让转发表作废。
+        self._WAN = dict(sorted(WAN.items(), key=lambda item: item[0]))
+        self.__FIB = None
 
     def search(self, dst: str) -> str:
         """
@@ -216,34 +267,14 @@ class RouterTable:
         Returns:
             到达目的地的本地物理层出口。如果没找到，就返回 ""。
         """
-        # 传入的端口号必须为5位。
-        try:
-            assert len(dst) == 5
-        except AssertionError:
+        # 传入的端口号至少为5位。
+        if len(dst) < 5:
             return ""
 
-        # 反映射查找路径。
-        try:
-            dst_router = min(
-                filter(lambda nominee: nominee >= dst[1], self._WAN.keys())
-            )
-        # 如果找不到上级路由器。
-        except Exception:
-            return ""
-        # 如果上级路由器是自己。
-        if dst_router == self.__device_id:
-            try:
-                dst_exit = list(
-                    filter(lambda item: item[0] == dst[1], self._LAN.items())
-                )[0][1]
-            # 如果找不到对应的本地物理层出口。
-            except IndexError:
-                return ""
-            else:
-                return dst_exit
-        # 如果目的地不在子网内，就返回出口。
-        else:
-            return self._WAN[dst_router].exit
+        # 按当前路由表编译转发表，一次性替换。
+        if self.__FIB is None:
+            self.__FIB = ForwardingTable(self.__device_id, self._WAN, self._LAN)
+        return self.__FIB.search(dst)
 
 
 class RouterLayer(AbstractLayer, RouterTable):
@@ -254,22 +285,29 @@ class RouterLayer(AbstractLayer, RouterTable):
         - LAN: 单播、广播。
     """
 
-    def __init__(self, device_id: str) -> None:
+    def __init__(self, device_id: str, fabric: Optional[Fabric] = None) -> None:
         """初始化路由器网络层。
 
         Args:
             device_id: 该路由器的设备号。
+            fabric: 可选，进程内的交换结构，见 `AbstractLayer`；默认为 `None`。
         """
         # 初始化套接字。
         self.__device_id = device_id
         self.__port = f"1{device_id}200"
-        AbstractLayer.__init__(self, self.__port)
+        AbstractLayer.__init__(self, self.__port, fabric)
 
         # 初始化路由表。
         RouterTable.__init__(self, device_id)
         self.__cache: dict[str, TableCache] = {}
         self.__broadcast_tick = time()
 
+        # 转发方式与入口处丢弃的帧数。
+        self.__store_and_forward = (
+            get_forwarding_mode(device_id) == ForwardingMode.STORE_AND_FORWARD
+        )
+        self.__dropped = FRAMES_DROPPED.labels(local=self.__port)
+
     def __str__(self) -> str:
         """打印设备号与端口号。"""
         return f"[Device {self.__device_id}] <Router Layer @{self.__port}>\n{'-'*30}"
@@ -281,29 +319,62 @@ class RouterLayer(AbstractLayer, RouterTable):
             - [0] 接收到的消息。
             - [1] 发来该消息的本地物理层端口。
         """
-        binary, port, success = self._receive()
-        binary = bits_to_string(binary) if success else binary
+        binary, port, _ = self._receive_bits()
+        return binary, port
+
+    async def receive_from_phys_async(self) -> tuple[str, str]:
+        """在事件循环上接收来自本机物理层的消息。
+
+        Returns:
+            - [0] 接收到的消息。
+            - [1] 发来消息的本地物理层端口。
+        """
+        binary, port, _ = await self._receive_bits_async()
         return binary, port
 
-    def unicast_to_phy(self, binary: str, port: str) -> int:
-        """向本机指定物理层单播消息。
+    @property
+    def store_and_forward(self) -> bool:
+        """是否存储转发，见 `ForwardingMode`。"""
+        return self.__store_and_forward
+
+    def parse(self, binary: str) -> Optional[Frame]:
+        """解析本机物理层发来的帧，在入口处丢弃无法转发的帧。
+
+        直通转发时只解析源端口与目标端口，其余字段在首次访问时才解析，见 `LazyFrame`；
+        存储转发时完整解析并校验。连端口都解析不出的帧，以及存储转发时校验失败的帧，
+        都被丢弃并计数。
+
+        Args:
+            binary: 含有帧的 01 字符串。
+
+        Returns:
+            解析所得的帧；被丢弃时为 `None`。
+        """
+        frame = self._parse_frame(binary, lazy=not self.__store_and_forward)
+        if frame.dst == "X" or (self.__store_and_forward and not frame.verified):
+            self.__dropped.inc()
+            return None
+        return frame
+
+    def unicast_to_phy(self, frame: Frame, port: str) -> int:
+        """向本机指定物理层单播帧。
 
         Args:
-            binary: 要发送的消息。
+            frame: 要发送的帧。
             port: 信息要送到的本地物理层端口。
 
         Returns:
             总共发送的字节数。
         """
-        return self._send(string_to_bits(binary), port)
+        return self._send_bits(frame, port)
 
-    def broadcast_to_LAN(self, binary: str, port: str = "") -> str:
+    def broadcast_to_LAN(self, frame: Frame, port: str = "") -> str:
         """向局域网广播消息，除了指定的端口。
 
         仅用于局域网主机间的广播；指定的端口一般是当次收到消息的端口。
 
         Args:
-            binary: 要发送的消息。
+            frame: 要发送的帧。
             port: 可选，指定不发消息的端口号；默认为 ""。
 
         Returns:
@@ -311,16 +382,16 @@ class RouterLayer(AbstractLayer, RouterTable):
         """
         target_phys = list(filter(lambda phy: phy != port, self._LAN.values()))
         for phy in target_phys:
-            self.unicast_to_phy(binary, phy)
+            self.unicast_to_phy(frame, phy)
         return f"[{' '.join(target_phys)}]"
 
-    def broadcast_to_WAN(self, binary: str, port: str = "") -> str:
+    def broadcast_to_WAN(self, frame: Frame, port: str = "") -> str:
         """向广域网广播消息，除了指定的端口。
 
         仅用于扩散路由表；指定的端口一般是当次收到路由表的端口。
 
         Args:
-            binary: 要发送的消息。
+            frame: 要发送的帧。
             port: 可选，指定不发消息的端口号；默认为 ""。
 
         Returns:
@@ -333,7 +404,7 @@ class RouterLayer(AbstractLayer, RouterTable):
             )
         )
         for exit in target_exits:
-            self.unicast_to_phy(binary, exit)
+            self.unicast_to_phy(frame, exit)
         return f"[{' '.join(target_exits)}]"
 
     def show_table(self) -> None:
@@ -1,7 +1,11 @@
-from collections import defaultdict
-
-from utils.coding import bits_to_string, string_to_bits
-from utils.io import get_switch_config
+from collections import OrderedDict, defaultdict
+from time import monotonic
+from typing import Iterable, Optional
+
+from utils.fabric import Fabric
+from utils.frame import Frame
+from utils.io import get_forwarding_mode, get_switch_config
+from utils.metrics import FRAMES_DROPPED
 from utils.params import *
 
 from layer._abstract import AbstractLayer
@@ -13,17 +17,44 @@ class SwitchTable:
     - 键：本地物理层端口号。
     - 值：远程端口状态。
         - 键：远程应用层端口号。
-        - 值：该远程端口号在表内的剩余寿命。
+        - 值：该表项过期的时刻，单位为秒。
 
     实现了单播、广播、学习、清除。
+
+    学到的表项寿命都是 `ttl` 秒，按最近刷新的先后排列，过期的先后也就与之相同：
+    学习与刷新只需把表项移到队尾，清除过期表项时只需从队首依次检查，
+    表满时同样从队首淘汰最久未刷新的表项。每帧的开销与表的大小无关。
+
+    另有远程端口到本地端口的反向索引，随学习与清除增量维护，
+    查找本地端口时不必遍历所有本地端口；广播端口不占表项，直接返回所有本地端口。
     """
 
-    def __init__(self) -> None:
-        """初始化内部字典。"""
-        self._table = defaultdict(dict[str, int])
+    def __init__(
+        self,
+        ports: Iterable[str] = (),
+        ttl: float = Network.REMOTE_TTL,
+        capacity: int = Network.REMOTE_MAX_ENTRIES,
+    ) -> None:
+        """初始化内部字典。
+
+        Args:
+            ports: 可选，所有本地物理层端口号，广播帧从这些端口送出；默认为空。
+            ttl: 可选，表项的寿命，单位为秒；默认为 `REMOTE_TTL`。
+            capacity: 可选，最多学习的表项数；默认为 `REMOTE_MAX_ENTRIES`。
+        """
+        self._table = defaultdict(dict[str, float])
+        self.__ports = list(ports)
+        self._table.update((port, {}) for port in self.__ports)
+        self.__ttl = ttl
+        self.__capacity = capacity
+        # 学到的表项，按最近刷新的先后排列，队首最早过期。
+        self.__recent: OrderedDict[tuple[str, str], None] = OrderedDict()
+        # 反向索引，远程端口号 -> 本地端口号，值固定为 `None`，按学到的先后排列。
+        self.__locals: dict[str, dict[str, None]] = {}
 
     def __str__(self) -> None:
-        """打印端口地址表。"""
+        """打印端口地址表，寿命为剩余的秒数。"""
+        now = monotonic()
         head = f"{'-'*24}\n|{' '*7}|{'Remote'.center(14)}|\n|{'Local'.center(7)}|{'-'*14}|\n|{' '*7}|{'Port'.center(7)}|{'Life'.center(6)}|"
         body = "\n".join(
             filter(
@@ -32,8 +63,8 @@ class SwitchTable:
                     "|----------------------|\n"
                     + "\n".join(
                         [
-                            f"|{local.center(7)}|{port.center(7)}|{str(life).center(6)}|"
-                            for port, life in remotes.items()
+                            f"|{local.center(7)}|{port.center(7)}|{str(round(expiry - now)).center(6)}|"
+                            for port, expiry in remotes.items()
                         ]
                     )
                     if len(remotes.items()) != 0
@@ -44,9 +75,16 @@ class SwitchTable:
         )
         return f"{head}\n{body}\n{'-'*24}"
 
+    @property
+    def size(self) -> int:
+        """学到的表项数。"""
+        return len(self.__recent)
+
     def update(self, local: str, remote: str) -> bool:
         """更新端口地址表。
 
+        学习或刷新这对端口，并清除已过期的表项。
+
         Args:
             local: 当前激活的本地端口。
             remote: 当前激活的远程端口。
@@ -54,26 +92,51 @@ class SwitchTable:
         Returns:
             端口地址表是否有更新，有更新为 `True`，没有更新为 `False`。
         """
-        updated = False
+        now = monotonic()
+        updated = self.__expire(now)
+        remotes = self._table[local]
 
         # 查询是否有该关系，没有就会迎来更新。
-        if remote not in self._table[local].keys():
+        key = (local, remote)
+        if remote in remotes:
+            self.__recent.move_to_end(key)
+        else:
+            self.__recent[key] = None
+            self.__locals.setdefault(remote, {})[local] = None
             updated = True
+            # 表满时淘汰最久未刷新的表项。
+            if len(self.__recent) > self.__capacity:
+                self.__evict()
+        remotes[remote] = now + self.__ttl
+        return updated
 
-        # 不管之前有没有这对关系，它们的寿命都要重置为最大值+1。（后面的遍历会扣回最大值。）
-        self._table[local].update({remote: Network.REMOTE_MAX_LIFE + 1})
-
-        # 所有远程端口寿命-1。
-        for remotes in self._table.values():
-            for port, life in remotes.copy().items():
-                life -= 1
-                if life == 0:
-                    remotes.pop(port)
-                    updated = True
-                else:
-                    remotes.update({port: life})
+    def expire(self) -> bool:
+        """清除已过期的表项。
 
-        return updated
+        Returns:
+            是否有表项被清除。
+        """
+        return self.__expire(monotonic())
+
+    def __expire(self, now: float) -> bool:
+        """从最久未刷新的表项开始，清除到某时刻为止已过期的表项。"""
+        expired = False
+        while self.__recent:
+            local, remote = next(iter(self.__recent))
+            if self._table[local][remote] > now:
+                break
+            self.__evict()
+            expired = True
+        return expired
+
+    def __evict(self) -> None:
+        """删除最久未刷新的表项。"""
+        (local, remote), _ = self.__recent.popitem(last=False)
+        self._table[local].pop(remote, None)
+        ports = self.__locals[remote]
+        del ports[local]
+        if not ports:
+            del self.__locals[remote]
 
     def search_locals(self, remote: str) -> list[str]:
         """在端口地址表中查找本地端口号。
@@ -82,14 +145,12 @@ class SwitchTable:
             remote: 某一远程应用层的端口号。
 
         Returns:
-            对应的本地物理层端口号列表。
+            对应的本地物理层端口号列表；广播端口对应所有本地端口，未学到的端口为空。
         """
-        return list(
-            filter(
-                lambda local: remote in self._table[local].keys(),
-                self._table.keys(),
-            )
-        )
+        if remote == Topology.BROADCAST_PORT:
+            return list(self.__ports)
+        self.__expire(monotonic())
+        return list(self.__locals.get(remote, ()))
 
     def search_remotes(self, local: str) -> list[str]:
         """在端口地址表中查找远程端口号。
@@ -109,11 +170,12 @@ class SwitchLayer(AbstractLayer, SwitchTable):
     实现的消息收发: 交换机网络层 -> 交换机物理层。（单播、广播）
     """
 
-    def __init__(self, device_id: str) -> None:
+    def __init__(self, device_id: str, fabric: Optional[Fabric] = None) -> None:
         """初始化交换机网络层。
 
         Args:
             device_id: 该交换机的设备号。
+            fabric: 可选，进程内的交换结构，见 `AbstractLayer`；默认为 `None`。
         """
         # 初始化套接字。
         self.__device_id = device_id
@@ -121,13 +183,16 @@ class SwitchLayer(AbstractLayer, SwitchTable):
         self.__phys = [
             f"1{device_id}10{i}" for i in range(get_switch_config(device_id))
         ]
-        AbstractLayer.__init__(self, self.__port)
+        AbstractLayer.__init__(self, self.__port, fabric)
 
         # 初始化端口地址表。
-        SwitchTable.__init__(self)
-        self._table.update(
-            dict([phy, {Topology.BROADCAST_PORT: float("inf")}] for phy in self.__phys)
+        SwitchTable.__init__(self, self.__phys)
+
+        # 转发方式与入口处丢弃的帧数。
+        self.__store_and_forward = (
+            get_forwarding_mode(device_id) == ForwardingMode.STORE_AND_FORWARD
         )
+        self.__dropped = FRAMES_DROPPED.labels(local=self.__port)
 
     def __str__(self) -> str:
         """打印设备号与端口号。"""
@@ -140,29 +205,62 @@ class SwitchLayer(AbstractLayer, SwitchTable):
             - [0] 接收到的消息。
             - [1] 发来消息的本地物理层端口。
         """
-        binary, port, success = self._receive()
-        binary = bits_to_string(binary) if success else binary
+        binary, port, _ = self._receive_bits()
+        return binary, port
+
+    async def receive_from_phys_async(self) -> tuple[str, str]:
+        """在事件循环上接收来自本机物理层的消息。
+
+        Returns:
+            - [0] 接收到的消息。
+            - [1] 发来消息的本地物理层端口。
+        """
+        binary, port, _ = await self._receive_bits_async()
         return binary, port
 
-    def unicast_to_phy(self, binary: str, port: str) -> int:
-        """向本机指定物理层单播消息。
+    @property
+    def store_and_forward(self) -> bool:
+        """是否存储转发，见 `ForwardingMode`。"""
+        return self.__store_and_forward
+
+    def parse(self, binary: str) -> Optional[Frame]:
+        """解析本机物理层发来的帧，在入口处丢弃无法转发的帧。
+
+        直通转发时只解析源端口与目标端口，其余字段在首次访问时才解析，见 `LazyFrame`；
+        存储转发时完整解析并校验。连端口都解析不出的帧，以及存储转发时校验失败的帧，
+        都被丢弃并计数。
+
+        Args:
+            binary: 含有帧的 01 字符串。
+
+        Returns:
+            解析所得的帧；被丢弃时为 `None`。
+        """
+        frame = self._parse_frame(binary, lazy=not self.__store_and_forward)
+        if frame.dst == "X" or (self.__store_and_forward and not frame.verified):
+            self.__dropped.inc()
+            return None
+        return frame
+
+    def unicast_to_phy(self, frame: Frame, port: str) -> int:
+        """向本机指定物理层单播帧。
 
         Args:
-            binary: 要发送的消息。
+            frame: 要发送的帧。
             port: 信息要送到的本地物理层端口。
 
         Returns:
             总共发送的字节数。
         """
-        return self._send(string_to_bits(binary), port)
+        return self._send_bits(frame, port)
 
-    def broadcast_to_phys(self, binary: str, port: str) -> str:
+    def broadcast_to_phys(self, frame: Frame, port: str) -> str:
         """向所有物理层广播消息，除了指定的端口。
 
         指定的端口一般是当次发来消息的端口。
 
         Args:
-            binary: 要发送的消息。
+            frame: 要发送的帧。
             port: 指定的端口号。
 
         Returns:
@@ -170,7 +268,7 @@ class SwitchLayer(AbstractLayer, SwitchTable):
         """
         target_phys = list(filter(lambda phy: phy != port, self.__phys))
         for phy in target_phys:
-            self.unicast_to_phy(binary, phy)
+            self.unicast_to_phy(frame, phy)
         return f"[{' '.join(target_phys)}]"
 
     def show_table(self) -> None:
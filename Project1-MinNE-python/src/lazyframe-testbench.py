@@ -0,0 +1,49 @@
+from random import choice, choices, random, seed
+from time import perf_counter
+
+from utils.coding import decode_wire, encode_wire
+from utils.frame import FrameBuilder, FrameParser
+
+ROUNDS = 2000
+
+# 与完整解析逐帧比对源端口与目标端口，包括全 1 的端口与带有随机误码的帧。
+seed(0)
+builder, parser = FrameBuilder(), FrameParser()
+ports = ["11300", "12300", "65535", "63487", "31", "0"]
+for _ in range(5000):
+    data = "".join(choices("01", weights=(1, 4), k=choice((0, 8, 200))))
+    frame = builder.build(src=choice(ports), data=data, dst=choice(ports))
+    noisy = "".join(
+        ("1" if bit == "0" else "0") if random() < 0.005 else bit
+        for bit in frame.binary
+    )
+    for binary in (frame.binary, noisy, noisy[: len(noisy) // 2]):
+        full = parser.parse(binary)
+        lazy = parser.parse_lazy(binary)
+        assert (lazy.src, lazy.dst) == (full.src, full.dst), binary
+        # 其余字段在首次访问时解析，与完整解析相同。
+        assert (lazy.seq, lazy.data, lazy.verified) == (
+            full.seq,
+            full.data,
+            full.verified,
+        )
+print("Ports match full parse: OK")
+
+# 转发设备每跳的耗时：收到压缩格式的字节串，解析出端口，再编码发出。
+print(f"{'data bits':>10} {'parse':>10} {'lazy':>10} {'hop':>10} {'lazy hop':>10}")
+for data_len in (32, 256, 2048, 16384):
+    data = "".join(choices("01", k=data_len))
+    frame = builder.build(src="11300", data=data, dst="12300")
+    wire = encode_wire(frame.binary, True)
+    times = []
+    for parse in (parser.parse, parser.parse_lazy):
+        start = perf_counter()
+        for _ in range(ROUNDS):
+            parse(frame.binary)
+        times.append((perf_counter() - start) / ROUNDS * 1e6)
+    for parse in (parser.parse, parser.parse_lazy):
+        start = perf_counter()
+        for _ in range(ROUNDS):
+            parse(decode_wire(wire)).wire(True)
+        times.append((perf_counter() - start) / ROUNDS * 1e6)
+    print(f"{data_len:>10}" + "".join(f"{t:>8.1f}us" for t in times))
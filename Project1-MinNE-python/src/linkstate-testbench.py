@@ -0,0 +1,144 @@
+import json
+import os
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import utils.io
+from layer.router import Path, RouterTable
+
+SIZES = (100, 1000, 3000, 10_000)
+# 原先的写法太慢，只在不超过该规模的拓扑上对照。
+LEGACY_MAX = 3000
+
+
+class LegacyTable(RouterTable):
+    """原先的写法：每次合并一台路由器的路由包，再挑出下一台要合并的路由器，仅作对照。"""
+
+    def __init__(self, device_id: str) -> None:
+        super().__init__(device_id)
+        # 路径已经最优化的路由器。
+        self._optimized = {device_id}
+        neighbors = {dst: path for dst, path in self._WAN.items() if dst != device_id}
+        self._next_merge = min(
+            neighbors, key=lambda dst: neighbors[dst].cost, default=""
+        )
+
+    def merge(self, package: str) -> None:
+        src, new_table = RouterTable._RouterTable__unpack(package)
+        self._optimized.add(src)
+        local_copy = self._WAN.copy()
+        min_cost, min_dst = float("inf"), ""
+        for dst, new_cost in new_table.items():
+            local_path = self._WAN.get(dst, None)
+            new_path = Path(
+                next=src,
+                exit=self._WAN[src].exit,
+                cost=new_cost + self._WAN[src].cost,
+            )
+            if not local_path:
+                self._WAN[dst] = new_path
+                cur_cost = new_cost
+            elif dst in self._optimized:
+                continue
+            elif local_path.cost < new_path.cost:
+                cur_cost = local_path.cost
+            else:
+                self._WAN[dst] = new_path
+                cur_cost = new_cost
+            if min_cost > cur_cost:
+                min_cost = cur_cost
+                min_dst = dst
+            if local_path:
+                local_copy.pop(dst)
+        remained = dict(
+            filter(lambda item: item[0] not in self._optimized, local_copy.items())
+        )
+        if remained:
+            min_item = min(remained.items(), key=lambda item: item[1].cost)
+            if min_item[1].cost < min_cost:
+                min_dst = min_item[0]
+        self._next_merge = min_dst
+        self._WAN = dict(sorted(self._WAN.items(), key=lambda item: item[0]))
+
+    def static_merge(self) -> None:
+        while self._next_merge:
+            self.merge(RouterTable(self._next_merge).package)
+
+
+def check_shortest(device_id: str, WAN: dict[str, Path], config: dict) -> None:
+    """检查路由表满足最短路径的条件，不依赖任何一种算法。
+
+    每条链路都不能让费用更低；每条路径的费用都等于前一台路由器的费用加上链路费用，
+    出口也与前一台路由器相同。
+    """
+    links = {
+        router: {dst: dic["cost"] for dst, dic in router_config["WAN"].items()}
+        for router, router_config in config["router"].items()
+    }
+    assert WAN[device_id].cost == 0
+    for router, path in WAN.items():
+        for dst, cost in links[router].items():
+            assert WAN[dst].cost <= path.cost + cost, (router, dst)
+        if router == device_id:
+            continue
+        if path.next == router:
+            assert path.cost == links[device_id][router], router
+            assert path.exit == config["router"][device_id]["WAN"][router]["exit"]
+        else:
+            prev = WAN[path.next]
+            assert path.cost == prev.cost + links[path.next][router], router
+            assert path.exit == prev.exit, router
+
+
+# 当前拓扑上，与原先的写法得到完全相同的路由表。
+for device_id in utils.io.get_device_ids()[2]:
+    table, legacy = RouterTable(device_id), LegacyTable(device_id)
+    table.static_merge()
+    legacy.static_merge()
+    assert table._WAN == legacy._WAN, device_id
+    print(table)
+print("Current devicemap: OK")
+
+# 随机拓扑上检查最短路径，并与原先的写法比较耗时与结果。
+print(f"{'routers':>8} {'legacy':>10} {'heap':>10} {'worse':>6} {'ties':>6}")
+for size in SIZES:
+    config = utils.io.generate_devicemap(size)
+    with TemporaryDirectory() as temp_dir:
+        utils.io.devicemap_file = os.path.join(temp_dir, "devicemap.json")
+        with open(utils.io.devicemap_file, "w", encoding="utf-8") as fw:
+            json.dump(config, fw)
+        device_id = str(size // 2)
+        # 先读入一次，两种写法都不计解析文件的耗时。
+        RouterTable(device_id)
+
+        start = perf_counter()
+        table = RouterTable(device_id)
+        table.static_merge()
+        heap_time = perf_counter() - start
+        check_shortest(device_id, table._WAN, config)
+
+        # 逐个合并各路由器的路由包，结果与静态合并相同。
+        if size == SIZES[0]:
+            merged = RouterTable(device_id)
+            for router in config["router"]:
+                merged.merge(RouterTable(router).package)
+            assert merged._WAN == table._WAN
+
+        if size > LEGACY_MAX:
+            print(f"{size:>8} {'-':>10} {heap_time:>9.3f}s")
+            continue
+        start = perf_counter()
+        legacy = LegacyTable(device_id)
+        legacy.static_merge()
+        legacy_time = perf_counter() - start
+
+    # 原先的写法费用更高的目的地数，以及费用相同、路径不同的目的地数。
+    worse = sum(legacy._WAN[dst].cost > path.cost for dst, path in table._WAN.items())
+    ties = sum(
+        legacy._WAN[dst].cost == path.cost
+        and (legacy._WAN[dst].next, legacy._WAN[dst].exit) != (path.next, path.exit)
+        for dst, path in table._WAN.items()
+    )
+    assert set(legacy._WAN) == set(table._WAN)
+    print(f"{size:>8} {legacy_time:>9.3f}s {heap_time:>9.3f}s {worse:>6} {ties:>6}")
+print("Shortest paths: OK")
@@ -0,0 +1,67 @@
+import os
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from utils import *
+
+
+def legacy_write_log(path: str, message: str) -> None:
+    """原先的写法：每条日志都打开、追加、关闭文件，仅作对照。"""
+    with open(path, "a", encoding="utf-8") as fa:
+        fa.write(f"[{datetime.now().strftime('%H:%M:%S.%f')[:-3]}] {message}\n")
+
+
+N = 20_000
+with TemporaryDirectory() as temp_dir:
+    # 每条日志的耗时。
+    legacy_path = os.path.join(temp_dir, "legacy.log")
+    start = perf_counter()
+    for i in range(N):
+        legacy_write_log(legacy_path, f"Send finish: {i}.0bps")
+    legacy_time = (perf_counter() - start) / N
+
+    # 缓冲区足够大时，记录方只做追加；格式化与写入的耗时在关闭时单独计。
+    logger = Logger(os.path.join(temp_dir, "buffered.log"), capacity=N + 1)
+    start = perf_counter()
+    for i in range(N):
+        logger.info("Send finish", dst="12300", bps=float(i))
+    buffered_time = (perf_counter() - start) / N
+    start = perf_counter()
+    logger.close()
+    flush_time = (perf_counter() - start) / N
+    print(
+        f"Per record: {legacy_time * 1e6:.1f}us open-per-line, "
+        f"{buffered_time * 1e6:.2f}us to record, "
+        f"{flush_time * 1e6:.2f}us to format and write in the background"
+    )
+
+    # 所有记录都按顺序写入，每行都是合法的 JSON。
+    records = read_log(os.path.join(temp_dir, "buffered.log"))
+    assert [record["bps"] for record in records] == [float(i) for i in range(N)]
+    assert records[0]["level"] == "INFO" and records[0]["message"] == "Send finish"
+
+    # 低于最低级别的记录被丢弃。
+    logger = Logger(os.path.join(temp_dir, "level.log"), level=LogLevel.WARNING)
+    logger.debug("RTO", rto=0.5)
+    logger.warning("Keepalive max retries", dst="12300")
+    logger.close()
+    records = read_log(os.path.join(temp_dir, "level.log"))
+    assert [record["level"] for record in records] == ["WARNING"]
+
+    # 超过最大字节数时轮转，只保留指定个数的旧文件。
+    rotate_path = os.path.join(temp_dir, "rotate.log")
+    logger = Logger(rotate_path, capacity=100, max_bytes=20_000, backups=2)
+    for i in range(2_000):
+        logger.info("Recv finish", src="11300", bps=float(i))
+        if i % 100 == 99:
+            logger.flush()
+    logger.close()
+    files = sorted(name for name in os.listdir(temp_dir) if name.startswith("rotate"))
+    assert files == ["rotate.log", "rotate.log.1", "rotate.log.2"], files
+    assert all(
+        os.path.getsize(os.path.join(temp_dir, name)) <= 20_000 for name in files
+    )
+    # 最新的记录在当前文件中，轮转没有打断任何一行。
+    assert read_log(rotate_path)[-1]["bps"] == 1999.0
+    print(f"Rotation: OK {files}")
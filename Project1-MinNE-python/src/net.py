@@ -1,65 +1,175 @@
+import asyncio
+import os
 import sys
 from time import time
+from typing import Optional, Union
 
 from layer import NetLayer
 from utils import *
 
-if __name__ == "__main__":
-    # 解析参数。
-    if len(sys.argv) != 2:
-        print("[Error] Device ID expected")
-        exit(-1)
 
-    # 创建主机网络层。
-    device_id = sys.argv[1]
-    net = NetLayer(device_id)
-    print(net)
+async def linger(
+    net: NetLayer, window: RecvWindow, src: str
+) -> Optional[tuple[Union[dict, str], bool]]:
+    """接收结束后再停留 `RTO_MAX`，为重传的帧补发 ACK。
+
+    最后几帧的 ACK 可能丢失，发送方会在超时后重传；接收方若已退出，
+    这些帧就不再得到确认，发送方只能重传到连续超时上限才放弃。
+
+    Args:
+        net: 主机网络层。
+        window: 刚结束的接收窗口。
+        src: 发送方的端口号。
+
+    Returns:
+        停留期间收到的其它消息，格式同 `receive_all_async`，留给主循环处理；
+        没有时为 `None`。
+    """
+    linger_end = time() + Network.RTO_MAX
+    while (remained := linger_end - time()) > 0:
+        try:
+            message, is_from_app = await asyncio.wait_for(
+                net.receive_all_async(), remained
+            )
+        except asyncio.TimeoutError:
+            return None
+        if is_from_app:
+            return message, is_from_app
+
+        frame = net.parse_message(message)
+        if not net.should_receive(frame.dst) or not frame.verified:
+            continue
+        # 发送窗口内、已经交付过的帧是重复帧，再确认一次；其余的帧属于新的会话。
+        if frame.src != src or not (
+            0 < seq_offset(window.expected, frame.seq) <= Network.WINDOW_SIZE
+        ):
+            return message, is_from_app
+        print(f"{frame} | Repeated")
+        _, ack_seq = window.accept(frame)
+        await net.send_to_phy_async(net.build_ack(dst=src, seq=ack_seq), paced=False)
+    return None
 
+
+async def serve(net: NetLayer, device_id: str) -> None:
+    """主机网络层的主循环，由事件循环驱动。
+
+    Args:
+        net: 主机网络层。
+        device_id: 该主机的设备号。
+    """
+    await net.open_async()
     recv_frame = Frame()
     resp_frame = Frame()
+    # 接收结束后停留期间收到的其它消息，留到下一轮处理。
+    carried = None
 
     # 开始运作。
     while True:
-        # 持续等待，直到有消息可读。
-        if not net.readable:
-            continue
-        first_message, is_from_app = net.receive_all()
+        # 等待本机应用层或本机物理层发来消息。
+        if carried:
+            (first_message, is_from_app), carried = carried, None
+        else:
+            first_message, is_from_app = await net.receive_all_async()
 
         # 如果消息来自本机应用层，说明本机成为发送端。
         if is_from_app:
             # 逐帧封装。
-            send_data: dict = eval(first_message)
+            send_data: dict = first_message
+            # 文件在发送途中才逐段读取，发送前先确认它能打开。
+            if "file" in send_data and not os.path.isfile(send_data["file"]):
+                print(f"[Error] {send_data['file']} not found")
+                write_log(
+                    device_id, "File not found", LogLevel.ERROR, file=send_data["file"]
+                )
+                continue
             frame_pool = net.build_pool(send_data)
-            send_total = len(frame_pool) - 1
+            is_broadcast = send_data["dst"] == Topology.BROADCAST_PORT
+            window = net.build_send_window(frame_pool, send_data["dst"])
 
-            # 逐帧发送。
-            send_cnt = keepalive_cnt = 0
-            write_log(device_id, "Send start")
+            # 按窗口发送。
+            send_len = 0
+            estimator = net.estimator(send_data["dst"])
+            send_ticks: dict[int, float] = {}
+            # 选择重传为每个未确认的帧单独计时，回退 N 帧只为窗口计时。
+            selective = Network.ARQ_MODE == ARQMode.SELECTIVE_REPEAT
+            deadlines: dict[int, float] = {}
+            resent: set[int] = set()
+            # 选择重传各帧的计时器先后到期，同一个计时周期内只算一次超时。
+            keepalive_cnt, tick_end = 0, 0.0
+            stats = TransferStats(send_data["dst"])
+            pending = window.fill()
+            send_len += sum(len(frame.data) for frame in pending)
+            stats.frames += len(pending)
+            write_log(device_id, "Send start", dst=send_data["dst"])
             start_tick = time()
+            restart_timer = True
             while True:
-                # 向物理层发送消息。
-                net.send_to_phy(frame_pool[send_cnt].binary)
-                print(f"{frame_pool[send_cnt]} | Sent, ", end="")
-
-                # 如果是单播，只有接收到 ACK 才发下一帧。
-                if send_data["dst"] != Topology.BROADCAST_PORT:
-                    resend_flag = True
-                    resp_binary, success = net.receive_from_phy()
-                    # 如果超时，就累加 1 次超时次数。
+                # 向物理层发送窗口内需要（重）发的帧，记录发送时刻用于估计往返时间。
+                for frame in pending:
+                    await net.send_to_phy_async(frame)
+                    send_ticks[frame.seq] = time()
+                    if selective:
+                        deadlines[frame.seq] = send_ticks[frame.seq] + estimator.rto
+                    print(f"{frame} | Sent")
+                pending = []
+                # 窗口滑动或重传后，从发送完毕的时刻重新计时。
+                if restart_timer:
+                    deadline = time() + estimator.rto
+                    restart_timer = False
+
+                # 如果是单播，按 ACK/NAK 滑动窗口，超时则重传。
+                if not is_broadcast:
+                    if selective:
+                        deadline = min(deadlines.values(), default=time())
+                    resp_binary, success = await net.receive_from_phy_async(
+                        max(deadline - time(), 0)
+                    )
+                    # 如果超时，就重传到期的帧。
                     if not success:
-                        keepalive_cnt += 1
-                        print("Timeout")
+                        now = time()
+                        pending = window.timeout(
+                            {seq for seq, tick in deadlines.items() if tick <= now}
+                        )
+                        resent.update(frame.seq for frame in pending)
+                        stats.retransmits += len(pending)
+                        restart_timer = True
+                        # 每个计时周期只累加 1 次超时次数，并退避重传超时。
+                        if now >= tick_end:
+                            keepalive_cnt += 1
+                            estimator.backoff()
+                            net.pacer.on_loss()
+                            stats.timeouts += 1
+                            tick_end = now + estimator.rto
+                            print(f"Timeout, RTO {round(estimator.rto, 3)}s")
                     # 如果有回复。
                     else:
+                        reply = net.parse_reply(resp_binary)
+                        # 不是给自己的回复，或者回复本身出错，就继续等到超时。
+                        if not net.is_reply(reply):
+                            continue
                         # 重置超时次数。
                         keepalive_cnt = 0
-                        # 解包读取回复。
-                        is_ack = net.parse_reply(resp_binary)
-                        if is_ack:
-                            print("ACK")
-                            resend_flag = False
+                        if reply.reply_state == ReplyState.ACK:
+                            print(f"ACK {reply.seq}")
+                            # 按 Karn 算法，只用未重传过的帧估计往返时间。
+                            send_tick = send_ticks.pop(reply.seq, None)
+                            if send_tick and reply.seq not in resent:
+                                stats.rtts.append(time() - send_tick)
+                                estimator.sample(stats.rtts[-1])
+                            if selective:
+                                deadlines.pop(reply.seq, None)
+                            if window.ack(reply.seq):
+                                estimator.reset_backoff()
+                                net.pacer.on_ack()
+                                restart_timer = True
                         else:
-                            print("NAK")
+                            print(f"NAK {reply.seq}")
+                            net.pacer.on_loss()
+                            pending = window.nak(reply.seq)
+                            resent.update(frame.seq for frame in pending)
+                            stats.naks += 1
+                            stats.retransmits += len(pending)
+                            restart_timer = True
 
                 # 如果是广播，只要至少有一次 ACK 就发下一帧，不检查 ACK 数量。
                 else:
@@ -67,51 +177,114 @@ if __name__ == "__main__":
                     ack_cnt = nak_cnt = 0
                     # 持续等待回复。
                     while True:
-                        resp_binary, success = net.receive_from_phy()
+                        resp_binary, success = await net.receive_from_phy_async(
+                            estimator.rto
+                        )
                         # 如果没有回复，说明之后也没有信息会发来了。
                         # ! 这是一个潜在的bug，有可能回复因为延时没到达。
                         if not success:
                             # 如果一次回复都没收到，说明这帧超时，就累加 1 次超时次数。
                             if not has_at_least_one_response:
                                 keepalive_cnt += 1
+                                estimator.backoff()
+                                stats.timeouts += 1
                                 resend_flag = True
                             break
 
+                        # 不是给自己的回复就忽略。
+                        reply = net.parse_reply(resp_binary)
+                        if reply.verified and not net.is_reply(reply):
+                            continue
+
+                        # 校验失败的帧可能是其它主机的数据帧，视为 NAK，
+                        # 但不用来估计往返时间，也不重置超时次数。
+                        if not reply.verified:
+                            nak_cnt += 1
+                            resend_flag = True
+                            continue
+
+                        # 用第一个回复估计往返时间。
+                        send_tick = send_ticks.pop(window.base.seq, None)
+                        if send_tick and window.base.seq not in resent:
+                            stats.rtts.append(time() - send_tick)
+                            estimator.sample(stats.rtts[-1])
+
                         # 一旦有回复，就重置超时次数。
                         keepalive_cnt = 0
                         has_at_least_one_response = True
-                        # 解包读取回复。
-                        is_ack = net.parse_reply(resp_binary)
-                        if is_ack:
+                        if reply.reply_state == ReplyState.ACK:
                             ack_cnt += 1
                         else:
                             nak_cnt += 1
                             resend_flag = True
                     print(f"{ack_cnt} ACK, {nak_cnt} NAK")
+                    stats.naks += nak_cnt
+                    if resend_flag:
+                        net.pacer.on_loss()
+                        pending = window.timeout()
+                        resent.update(frame.seq for frame in pending)
+                        stats.retransmits += len(pending)
+                    else:
+                        window.ack(window.base.seq)
+                        estimator.reset_backoff()
+                        net.pacer.on_ack()
 
                 # 如果连续多次超时，就停止重传。
                 if keepalive_cnt == Network.KEEPALIVE_MAX_RETRY:
                     print("[Warning] Keepalive max retries")
+                    write_log(
+                        device_id,
+                        "Keepalive max retries",
+                        LogLevel.WARNING,
+                        dst=send_data["dst"],
+                    )
                     break
-                # 如果不必重传，就可以发送下一帧。
-                if not resend_flag:
-                    send_cnt += 1
-                # 如果没有下一帧了，就跳出循环。
-                if send_cnt == send_total + 1:
+                # 新放入窗口的帧是首次发送。
+                fresh = window.fill()
+                resent.difference_update(frame.seq for frame in fresh)
+                send_len += sum(len(frame.data) for frame in fresh)
+                stats.frames += len(fresh)
+                pending.extend(fresh)
+                # 如果所有帧都已确认，就跳出循环。
+                if window.done:
+                    stats.completed = True
                     break
 
             # 释放这些帧的空间。
-            del frame_pool
+            del frame_pool, window
 
             # 计算网速。
             end_tick = time()
-            speed = 16 * len(send_data["message"]) / (end_tick - start_tick)
-            write_log(device_id, f"Send finish: {round(speed, 1)}bps")
+            stats.bits, stats.elapsed = send_len, end_tick - start_tick
+            net.record_transfer(stats)
+            speed = 16 * send_len / (end_tick - start_tick)
+            write_log(
+                device_id,
+                "Send finish",
+                dst=send_data["dst"],
+                broadcast=is_broadcast,
+                completed=stats.completed,
+                bps=round(speed, 1),
+                frames=stats.frames,
+                retransmits=stats.retransmits,
+            )
+            write_log(
+                device_id,
+                "RTO",
+                LogLevel.DEBUG,
+                dst=send_data["dst"],
+                rto=round(estimator.rto, 3),
+                srtt=round(estimator.srtt, 3),
+            )
 
         # 如果消息来自本机物理层，说明本机成为接收端。
         else:
-            cur_seq, keepalive_cnt = -1, 0
+            window, keepalive_cnt = None, 0
+            # 已经回复过 NAK 的期望序号。
+            nak_seq = None
             recv_msgtype = recv_message = ""
+            recv_len, recv_total = 0, None
+            decoder, filepath = None, ""
             is_first_recv = True
             recv_finish = False
             # 持续接收消息。
@@ -121,7 +294,10 @@ if __name__ == "__main__":
                     recv_binary, success = first_message, True
                     is_first_recv = False
                 else:
-                    recv_binary, success = net.receive_from_phy()
+                    # 发送方最长会等待 `RTO_MAX` 才重传，接收方每次至少要等这么久。
+                    recv_binary, success = await net.receive_from_phy_async(
+                        Network.RTO_MAX
+                    )
 
                 # 如果超时，就累加1次超时次数。
                 if not success:
@@ -150,60 +326,134 @@ if __name__ == "__main__":
                         print(f"{recv_frame} | Not for me")
                         continue
 
-                    # 如果序号重复，就丢弃这帧，再回复一遍 ACK。
-                    if cur_seq == recv_frame.seq:
-                        print(f"{recv_frame} | Repeated")
-                        ack = net.build_ack(dst=recv_frame.src)
-                        net.send_to_phy(ack.binary)
-                        continue
-
                     # 如果校验未通过，就丢弃这帧，回复 NAK。
+                    # 同一个期望序号只回复一次 NAK，直到它向前推进，
+                    # 不然回退 N 帧每收到一个坏帧都要重传整个窗口。
                     if not recv_frame.verified:
                         print(f"{recv_frame} | Invalid")
-                        nak = net.build_nak(dst=recv_frame.src)
-                        net.send_to_phy(nak.binary)
+                        expected = window.expected if window else recv_frame.seq
+                        if expected != nak_seq:
+                            nak = net.build_nak(dst=recv_frame.src, seq=expected)
+                            await net.send_to_phy_async(nak, paced=False)
+                            nak_seq = expected
                         continue
 
-                    # 如果帧信息正确，就接收这帧，回复 ACK。
-                    cur_seq = recv_frame.seq
-                    if recv_frame.session_state == SessionState.REQ_TXT:
-                        recv_msgtype = MessageType.TEXT
-                    elif recv_frame.session_state == SessionState.REQ_IMG:
-                        recv_msgtype = MessageType.FILE
-                    elif recv_frame.session_state == SessionState.FIN:
-                        recv_message += recv_frame.data
-                        recv_finish = True
-                    else:
-                        recv_message += recv_frame.data
+                    # 收到第一个校验通过的请求帧后，才建立接收窗口。
+                    if not window:
+                        if recv_frame.session_state not in SessionState.REQ_LIST:
+                            continue
+                        window = net.build_recv_window(recv_frame.seq)
 
-                    print(f"{recv_frame} | Verified")
-                    ack = net.build_ack(dst=recv_frame.src)
-                    net.send_to_phy(ack.binary)
+                    # 交给接收窗口，按序交付后回复 ACK。
+                    delivered, ack_seq = window.accept(recv_frame)
+                    if not delivered:
+                        print(f"{recv_frame} | Repeated")
+                    else:
+                        nak_seq = None
+                    for frame in delivered:
+                        if frame.session_state in SessionState.REQ_LIST:
+                            recv_msgtype = NetLayer.MSG_TYPES[frame.session_state]
+                            # 文件边收边解码写入磁盘，不在内存中累积。
+                            if recv_msgtype in MessageType.FILE_LIST:
+                                filepath = new_rsc_path()
+                                decoder = FileDecoder(
+                                    filepath,
+                                    raw=recv_msgtype == MessageType.RAW_FILE,
+                                )
+                            # 文本记下请求帧声明的总位数，用来检查是否收完整。
+                            else:
+                                recv_total = net.declared_len(frame)
+                        else:
+                            # 帧按序交付，文本直接拼接即可。
+                            if decoder:
+                                decoder.feed(frame.data)
+                            else:
+                                recv_message += frame.data
+                            recv_len += len(frame.data)
+                            recv_finish = frame.session_state == SessionState.FIN
+                        print(f"{frame} | Verified")
+                    ack = net.build_ack(dst=recv_frame.src, seq=ack_seq)
+                    await net.send_to_phy_async(ack, paced=False)
 
                 # 如果超时次数达到 Keepalive 机制上限，就不再接收。
                 if keepalive_cnt == Network.KEEPALIVE_MAX_RETRY:
                     print(f"[Warning] Keepalive max retries")
+                    write_log(
+                        device_id,
+                        "Keepalive max retries",
+                        LogLevel.WARNING,
+                        src=recv_frame.src,
+                    )
+                    net.record_abort()
                     break
                 # 如果接收结束，就退出循环。
                 if recv_finish:
                     break
 
+            # 如果收的是文件，关闭文件；没收完整就删除临时文件，也算解码失败。
+            decoded = decoder.close(recv_finish) if decoder else False
             # 如果什么都没收到，就继续开始等待双端消息。
-            if not recv_message:
+            if not recv_len:
+                continue
+
+            # 如果文本没收完整，就不交给应用层。
+            if recv_msgtype not in MessageType.FILE_LIST and not (
+                recv_finish and recv_total in (None, len(recv_message))
+            ):
+                print(
+                    f"[Warning] Incomplete message, {len(recv_message)}/{recv_total} bits"
+                )
                 continue
 
-            # 如果接收到了消息，就将消息传给应用层。
-            net.send_to_app(
-                str(
+            # 如果接收到了消息，就将消息传给应用层；文件只传保存路径。
+            if recv_msgtype in MessageType.FILE_LIST:
+                await net.send_to_app_async(
+                    {
+                        "msgtype": recv_msgtype,
+                        "file": filepath,
+                        "decoded": decoded,
+                        "src": recv_frame.src,
+                    }
+                )
+            else:
+                await net.send_to_app_async(
                     {
                         "msgtype": recv_msgtype,
                         "message": recv_message,
                         "src": recv_frame.src,
                     }
                 )
-            )
 
             # 计算网速。
             end_tick = time()
-            speed = 16 * len(recv_message) / (end_tick - start_tick)
-            write_log(device_id, f"Recv finish: {round(speed, 1)}bps")
+            speed = 16 * recv_len / (end_tick - start_tick)
+            write_log(
+                device_id,
+                "Recv finish",
+                src=recv_frame.src,
+                broadcast=recv_frame.dst == Topology.BROADCAST_PORT,
+                bps=round(speed, 1),
+            )
+
+            # 交付之后再停留一段时间，为重传的帧补发 ACK。
+            if recv_finish:
+                carried = await linger(net, window, recv_frame.src)
+
+
+if __name__ == "__main__":
+    # 解析参数。
+    if len(sys.argv) != 2:
+        print("[Error] Device ID expected")
+        exit(-1)
+
+    # 创建主机网络层。
+    device_id = sys.argv[1]
+    net = NetLayer(device_id)
+    print(net)
+
+    # 定期把指标写入 log 目录。
+    if Network.METRICS:
+        export_textfile(get_metrics_path(f"{device_id}-net"))
+
+    # 开始运作。
+    asyncio.run(serve(net, device_id))
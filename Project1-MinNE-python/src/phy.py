@@ -0,0 +1,87 @@
+import asyncio
+import sys
+from argparse import ArgumentParser
+
+from utils import *
+
+
+class PhyProtocol(asyncio.DatagramProtocol):
+    """一个物理层端口上的数据报协议。
+
+    只接收本设备网络层发来的帧，经链路送到对端物理层，再由对端物理层的套接字
+    转交给对端设备的网络层，与外部物理层程序的端口约定相同。
+    """
+
+    def __init__(
+        self, port: str, peer: str, channel: Channel, transports: dict
+    ) -> None:
+        """初始化协议。
+
+        Args:
+            port: 本物理层的端口号。
+            peer: 对端物理层的端口号。
+            channel: 从本物理层发往对端的链路。
+            transports: 所有物理层端口的传输，用于从对端端口转交。
+        """
+        self.__port = port
+        self.__peer = peer
+        self.__upper = upper_port(port)
+        self.__channel = channel
+        self.__transports = transports
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        """登记本端口的传输。"""
+        self.__transports[self.__port] = transport
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        """收到本设备网络层发来的帧时，经链路转交给对端设备的网络层。"""
+        if str(addr[1]) != self.__upper:
+            return
+        self.__channel.send(data, self.__deliver)
+
+    def error_received(self, exc: Exception) -> None:
+        """对端未启动等错误不影响转发，直接忽略。"""
+
+    def __deliver(self, data: bytes) -> None:
+        """从对端物理层端口把帧交给对端设备的网络层。"""
+        self.__transports[self.__peer].sendto(
+            data, ("127.0.0.1", int(upper_port(self.__peer)))
+        )
+
+
+async def serve(channels: dict[str, Channel]) -> None:
+    """在所有已连线的物理层端口上转发。
+
+    Args:
+        channels: 各方向的链路，键为发送方物理层端口号。
+    """
+    loop = asyncio.get_running_loop()
+    transports: dict[str, asyncio.DatagramTransport] = {}
+    for port, peer in get_phy_links().items():
+        try:
+            await loop.create_datagram_endpoint(
+                lambda: PhyProtocol(port, peer, channels[port], transports),
+                local_addr=("127.0.0.1", int(port)),
+            )
+        except OSError:
+            print(f"[Error] Port {port} is currently occupied.")
+            exit(-1)
+        print(f"[PHY {port}] <-> [PHY {peer}]")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    # 解析参数。
+    parser = ArgumentParser(description="Stand in for bin/phy.exe.")
+    parser.add_argument("--seed", type=int, help="seed for errors and losses")
+    args = parser.parse_args()
+
+    # 按物理层配置文件建立各方向的链路。
+    channels = build_channels(get_phy_params(), args.seed)
+
+    # 开始运作，退出时打印统计数据。
+    try:
+        asyncio.run(serve(channels))
+    except KeyboardInterrupt:
+        print(sum_stats(channels.values()))
+        sys.exit(0)
@@ -1,36 +1,31 @@
+import asyncio
 import sys
 
 from layer import RouterLayer
 from utils import *
 
-if __name__ == "__main__":
-    # 解析参数。
-    if len(sys.argv) != 2:
-        print("[Error] Device ID expected")
-        exit(-1)
 
-    # 创建路由器网络层。
-    device_id = sys.argv[1]
-    router = RouterLayer(device_id)
-    print(router)
+async def serve(router: RouterLayer) -> None:
+    """路由器网络层的主循环，由事件循环驱动。
 
-    # 合并其它路由器的路由表。
-    router.static_merge()
-    router.show_table()
-
-    # 开始运作。
-    parser = FrameParser()
+    Args:
+        router: 路由器网络层。
+    """
+    await router.open_async()
     while True:
-        # 持续等待，直到有消息可读。
-        if not router.readable:
+        # 等待本机物理层发来消息。
+        binary, in_port = await router.receive_from_phys_async()
+        frame = router.parse(binary)
+
+        # 无法转发的帧已在入口处丢弃。
+        if frame is None:
+            print(f"[Log] Drop-{in_port}")
             continue
-        binary, in_port = router.receive_from_phys()
-        frame = parser.parse(binary)
 
         print(f"[Log] {frame.src}-{in_port}-", end="")
         # 如果是局域网广播帧，就向局域网广播。
         if frame.dst == Topology.BROADCAST_PORT:
-            print(router.broadcast_to_LAN(binary, in_port), end="")
+            print(router.broadcast_to_LAN(frame, in_port), end="")
 
         # 如果是单播帧。
         else:
@@ -47,6 +42,29 @@ if __name__ == "__main__":
             # 如果找到了，就向其单播。
             else:
                 print(exit_port, end="")
-                router.unicast_to_phy(binary, exit_port)
+                router.unicast_to_phy(frame, exit_port)
 
         print(f"-{frame.dst}")
+
+
+if __name__ == "__main__":
+    # 解析参数。
+    if len(sys.argv) != 2:
+        print("[Error] Device ID expected")
+        exit(-1)
+
+    # 创建路由器网络层。
+    device_id = sys.argv[1]
+    router = RouterLayer(device_id)
+    print(router)
+
+    # 定期把指标写入 log 目录。
+    if Network.METRICS:
+        export_textfile(get_metrics_path(f"{device_id}-router"))
+
+    # 合并其它路由器的路由表。
+    router.static_merge()
+    router.show_table()
+
+    # 开始运作。
+    asyncio.run(serve(router))
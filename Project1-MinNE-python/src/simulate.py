@@ -0,0 +1,216 @@
+import asyncio
+import os
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from random import choices, seed
+from string import ascii_letters, digits
+from time import perf_counter
+from typing import Optional
+
+import net
+import router
+import switch
+from layer import AppLayer, NetLayer, RouterLayer, SwitchLayer
+from utils import *
+
+
+class Simulator:
+    """单进程拓扑模拟器。
+
+    按设备拓扑文件与物理层配置文件，在同一个事件循环上运行所有主机、交换机与
+    路由器，各层之间经 `Fabric` 以内存队列代替 UDP 套接字与外部物理层程序。
+    各设备复用 `net.py`、`switch.py`、`router.py` 中的主循环，主机应用层由
+    `send` 与 `receive` 代替。
+    """
+
+    def __init__(
+        self,
+        rate: float = Network.PACING_RATE,
+        seed=None,
+        overrides: dict[str, float] = None,
+    ) -> None:
+        """初始化模拟器。
+
+        各方向的物理链路按物理层配置文件加入误码、丢包与时延，见 `Channel`。
+
+        Args:
+            rate: 可选，各主机的最大发送速率，单位为帧每秒；默认为 `PACING_RATE`。
+            seed: 可选，物理链路的随机种子；默认为 `None`，即每次运行都不同。
+            overrides: 可选，对所有链路生效的参数，覆盖物理层配置文件，
+                参数名见 `get_phy_params`；默认为 `None`。
+        """
+        params = {
+            port: {**param, **(overrides or {})}
+            for port, param in get_phy_params().items()
+        }
+        self.__channels = build_channels(params, seed)
+        self.__fabric = Fabric(get_phy_links(), self.__channels)
+        self.__rate = rate
+        self.__apps: dict[str, AppLayer] = {}
+        self.__nets: dict[str, NetLayer] = {}
+        self.__tasks: list[asyncio.Task] = []
+
+    @property
+    def hosts(self) -> list[str]:
+        """拓扑内的主机设备号列表。"""
+        return list(self.__apps.keys())
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """所有物理链路的统计数据之和，见 `Channel.stats`。"""
+        return sum_stats(self.__channels.values())
+
+    async def start(self) -> None:
+        """创建所有设备并开始运作。"""
+        hosts, switches, routers = get_device_ids()
+        for device_id in hosts:
+            layer = NetLayer(
+                device_id,
+                self.__fabric,
+                TokenBucket(self.__rate),
+            )
+            self.__tasks.append(asyncio.create_task(net.serve(layer, device_id)))
+            self.__nets[device_id] = layer
+            app = AppLayer(device_id, self.__fabric)
+            await app.open_async()
+            self.__apps[device_id] = app
+        for device_id in switches:
+            layer = SwitchLayer(device_id, self.__fabric)
+            self.__tasks.append(asyncio.create_task(switch.serve(layer)))
+        for device_id in routers:
+            layer = RouterLayer(device_id, self.__fabric)
+            layer.static_merge()
+            self.__tasks.append(asyncio.create_task(router.serve(layer)))
+
+        # 让各设备进入主循环，在交换结构上注册端口。
+        await asyncio.sleep(0)
+
+    async def stop(self) -> None:
+        """停止所有设备。"""
+        pending = set(self.__tasks)
+        while pending:
+            for task in pending:
+                task.cancel()
+            # 数据恰好与取消同时到达时，`wait_for` 可能吞掉取消，没结束的就再取消一次。
+            _, pending = await asyncio.wait(pending, timeout=Network.FLOW_INTERVAL)
+        self.__tasks.clear()
+
+    def transfers(self, host: str) -> list[TransferStats]:
+        """获取某台主机最近若干次发送的统计数据。
+
+        Args:
+            host: 主机设备号。
+
+        Returns:
+            该主机网络层记录的统计数据，按时间先后排列。
+        """
+        return self.__nets[host].transfers
+
+    async def send(self, src: str, dst: str, text: str) -> None:
+        """由某台主机的应用层发送文本。
+
+        Args:
+            src: 源主机设备号。
+            dst: 目的主机设备号；为 `BROADCAST_PORT` 时广播。
+            text: 要发送的文本。
+        """
+        data = {
+            "msgtype": MessageType.TEXT,
+            "dst": dst if dst == Topology.BROADCAST_PORT else f"1{dst}300",
+        }
+        if Network.UTF8_TEXT:
+            data["msgtype"] = MessageType.UTF8_TEXT
+            data["message"] = encode_utf8(text)
+        else:
+            data["message"] = encode_unicode(text)
+        await self.__apps[src].send_to_net_async(data)
+
+    async def receive(
+        self, host: str, timeout: Optional[float] = None
+    ) -> Optional[tuple[str, str]]:
+        """等待某台主机的应用层收到文本。
+
+        Args:
+            host: 主机设备号。
+            timeout: 可选，超时时间，单位为秒；默认为 `None`，即一直等待。
+
+        Returns:
+            - [0] 源主机应用层的端口号。
+            - [1] 收到的文本。
+            超时为 `None`。
+        """
+        try:
+            data = await asyncio.wait_for(
+                self.__apps[host].receive_from_net_async(), timeout
+            )
+        except asyncio.TimeoutError:
+            return None
+        if data["msgtype"] == MessageType.UTF8_TEXT:
+            return data["src"], decode_utf8(data["message"])
+        return data["src"], decode_unicode(data["message"])
+
+
+async def main(src: str, dst: str, text: str, rate: float, seed=None) -> str:
+    """启动模拟器，发送一条文本并等待目的主机收到。
+
+    Args:
+        src: 源主机设备号。
+        dst: 目的主机设备号。
+        text: 要发送的文本。
+        rate: 各主机的最大发送速率，单位为帧每秒。
+        seed: 可选，物理链路的随机种子；默认为 `None`。
+
+    Returns:
+        启动耗时与传输结果。
+    """
+    start_tick = perf_counter()
+    simulator = Simulator(rate, seed)
+    await simulator.start()
+    startup = perf_counter() - start_tick
+
+    start_tick = perf_counter()
+    await simulator.send(src, dst, text)
+    received = await simulator.receive(dst, timeout=60)
+    elapsed = perf_counter() - start_tick
+    await simulator.stop()
+
+    # 请求帧加上各数据帧。
+    bits = len(encode_utf8(text) if Network.UTF8_TEXT else encode_unicode(text))
+    frames = 1 + -(-bits // FrameParam.DATA_LEN)
+    report = f"Startup: {round(startup * 1000, 1)}ms\nPHY: {simulator.stats}\n"
+    if not received or received[1] != text:
+        return f"{report}[Error] Message from {src} to {dst} not delivered"
+    return (
+        f"{report}Delivered {len(text)} chars from {src} to {dst} "
+        f"in {round(elapsed, 3)}s: {frames} frames, "
+        f"{round(frames / elapsed, 1)} frames/s"
+    )
+
+
+if __name__ == "__main__":
+    # 解析参数。
+    parser = ArgumentParser(description="Run the whole topology in one process.")
+    parser.add_argument("src", help="source host ID")
+    parser.add_argument("dst", help="destination host ID")
+    parser.add_argument("text", nargs="?", default="Hello, MinNE!")
+    parser.add_argument("--size", type=int, help="send SIZE random chars instead")
+    parser.add_argument("--rate", type=float, default=Network.PACING_RATE)
+    parser.add_argument("--seed", type=int, help="seed for errors and losses")
+    parser.add_argument("--verbose", action="store_true", help="show device logs")
+    parser.add_argument("--metrics", help="write the metrics to this textfile")
+    args = parser.parse_args()
+
+    text = args.text
+    if args.size is not None:
+        seed(0)
+        text = "".join(choices(ascii_letters + digits, k=args.size))
+
+    # 各设备逐帧打印的日志默认不显示。
+    if args.verbose:
+        report = asyncio.run(main(args.src, args.dst, text, args.rate, args.seed))
+    else:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            report = asyncio.run(main(args.src, args.dst, text, args.rate, args.seed))
+    print(report)
+    if args.metrics:
+        REGISTRY.write_textfile(args.metrics)
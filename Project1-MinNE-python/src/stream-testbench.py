@@ -0,0 +1,73 @@
+from os import urandom
+from threading import Thread
+from time import perf_counter
+
+from layer._abstract import AbstractLayer
+from utils.params import Network
+from utils.stream import Chunk, ChunkType, encode_chunk
+
+SENDER_PORT = "30001"
+RECEIVER_PORT = "30002"
+
+
+def largest_datagram(sender: AbstractLayer) -> int:
+    """二分查找单个数据报能发送的最大字节数，即旧版整条消息的上限。"""
+    low, high = 1, 1 << 20
+    while low < high:
+        mid = (low + high + 1) // 2
+        try:
+            sender._send_bytes(bytes(mid), RECEIVER_PORT)
+        except OSError:
+            high = mid - 1
+        else:
+            low = mid
+    return low
+
+
+def drain(receiver: AbstractLayer) -> None:
+    """丢弃接收方套接字中残留的数据。"""
+    while receiver._receive_bytes(bufsize=Network.IN_NE_BUFSIZE, timeout=0.1)[2]:
+        pass
+
+
+def transfer(sender: AbstractLayer, receiver: AbstractLayer, size: int) -> float:
+    """分块传输一条消息，返回吞吐量，单位为 MB/s。"""
+    message = urandom(size)
+    result = {}
+
+    def receive() -> None:
+        data, port, _ = receiver._receive_bytes(bufsize=Network.IN_NE_BUFSIZE)
+        result["message"] = receiver._receive_message(data, port)
+
+    thread = Thread(target=receive)
+    thread.start()
+    start = perf_counter()
+    sender._send_message(message, RECEIVER_PORT)
+    thread.join()
+    elapsed = perf_counter() - start
+    assert result["message"] == message, size
+    return size / elapsed / 2**20
+
+
+sender = AbstractLayer(SENDER_PORT)
+receiver = AbstractLayer(RECEIVER_PORT)
+
+limit = largest_datagram(sender)
+drain(receiver)
+print(f"Single datagram limit: {limit} bytes")
+
+# 超过单个数据报上限的消息，旧版直接发送失败。
+try:
+    sender._send_bytes(bytes(limit + 1), RECEIVER_PORT)
+except OSError as error:
+    print(f"Single datagram of {limit + 1} bytes: {error}")
+
+# 单块消息与旧版一样直接发送，不等待确认。
+single = encode_chunk(Chunk(ChunkType.DATA, 0, 0, 1, b"hello"))
+sender._send_bytes(single, RECEIVER_PORT)
+data, port, _ = receiver._receive_bytes()
+assert receiver._receive_message(data, port) == b"hello"
+
+print(f"{'size':>10} {'throughput':>12}")
+for size in (2**16, 2**20, 2**23, 2**26):
+    print(f"{size:>10} {transfer(sender, receiver, size):>8.1f} MB/s")
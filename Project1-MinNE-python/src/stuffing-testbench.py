@@ -0,0 +1,78 @@
+from random import choices, random, seed
+from time import perf_counter
+
+from utils.frame import FrameBuilder, FrameParam, FrameParser
+
+
+def legacy_add_locator(self: FrameBuilder) -> None:
+    """旧版逐个插入的位填充，仅作对照。"""
+    binary = self._FrameBuilder__binary
+    pos = binary.find(FrameParam.SUSPICIOUS)
+    while pos != -1:
+        binary = f"{binary[: pos + FrameParam.SUSPICIOUS_LEN]}0{binary[pos + FrameParam.SUSPICIOUS_LEN :]}"
+        pos = binary.find(FrameParam.SUSPICIOUS, pos + 6)
+    self._FrameBuilder__binary = f"{FrameParam.LOCATOR}{binary}{FrameParam.LOCATOR}"
+
+
+def legacy_extract_message(binary: str) -> str:
+    """旧版逐段拼接的去填充，仅作对照。"""
+    message = ""
+    start = binary.find(FrameParam.LOCATOR)
+    if start == -1:
+        return ""
+    start += FrameParam.LOCATOR_LEN
+    susp = binary.find(FrameParam.SUSPICIOUS, start)
+    while susp != -1:
+        try:
+            after_susp = binary[susp + FrameParam.SUSPICIOUS_LEN]
+        except IndexError:
+            return ""
+        if after_susp == "1":
+            message += binary[start : susp - 1]
+            return message
+        else:
+            message += binary[start : susp + FrameParam.SUSPICIOUS_LEN]
+            start = susp + FrameParam.SUSPICIOUS_LEN + 1
+            susp = binary.find(FrameParam.SUSPICIOUS, start)
+    return ""
+
+
+def build_and_parse(data: str, rounds: int) -> float:
+    """测量建造并解析一帧的平均耗时，单位为微秒。"""
+    builder, parser = FrameBuilder(), FrameParser()
+    start = perf_counter()
+    for _ in range(rounds):
+        frame = builder.build(src="11300", data=data, dst="12300")
+        parser.parse(frame.binary)
+    return (perf_counter() - start) / rounds * 1e6
+
+
+new_add_locator = FrameBuilder._FrameBuilder__add_locator
+new_extract_message = FrameParser._FrameParser__extract_message
+
+# 与旧版逐位比对，包括带有随机误码的帧。
+seed(0)
+builder, parser = FrameBuilder(), FrameParser()
+for _ in range(2000):
+    data = "".join(choices("01", weights=(1, 4), k=200))
+    frame = builder.build(src="11300", data=data, dst="12300")
+    noisy = "".join(
+        ("1" if bit == "0" else "0") if random() < 0.01 else bit
+        for bit in frame.binary
+    )
+    for binary in (frame.binary, noisy, noisy[: len(noisy) // 2]):
+        assert new_extract_message(binary) == legacy_extract_message(binary)
+    FrameBuilder._FrameBuilder__add_locator = legacy_add_locator
+    assert builder.build(step_seq=False).binary == frame.binary
+    FrameBuilder._FrameBuilder__add_locator = new_add_locator
+print("Stuffing/destuffing: byte-identical to legacy")
+
+for length, rounds in ((32, 5000), (1024, 1000), (64 * 1024, 10)):
+    data = "".join(choices("01", weights=(1, 4), k=length))
+    FrameBuilder._FrameBuilder__add_locator = legacy_add_locator
+    FrameParser._FrameParser__extract_message = staticmethod(legacy_extract_message)
+    before = build_and_parse(data, rounds)
+    FrameBuilder._FrameBuilder__add_locator = new_add_locator
+    FrameParser._FrameParser__extract_message = staticmethod(new_extract_message)
+    after = build_and_parse(data, rounds)
+    print(f"{length:6d} bits: {before:12.1f}us -> {after:10.1f}us")
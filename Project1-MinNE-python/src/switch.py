@@ -1,44 +1,65 @@
+import asyncio
 import sys
 
 from layer import SwitchLayer
 from utils import *
 
-if __name__ == "__main__":
-    # 解析参数。
-    if len(sys.argv) != 2:
-        print("[Error] Device ID expected.")
-        exit(-1)
 
-    # 创建交换机网络层。
-    device_id = sys.argv[1]
-    switch = SwitchLayer(device_id)
-    print(switch)
+async def serve(switch: SwitchLayer) -> None:
+    """交换机网络层的主循环，由事件循环驱动。
 
-    # 开始运作。
-    parser = FrameParser()
+    Args:
+        switch: 交换机网络层。
+    """
+    await switch.open_async()
     while True:
-        # 持续等待，直到有消息可读。
-        if not switch.readable:
+        # 等待本机物理层发来消息。
+        binary, in_port = await switch.receive_from_phys_async()
+        frame = switch.parse(binary)
+
+        # 无法转发的帧已在入口处丢弃，也不用来学习。
+        if frame is None:
+            print(f"[Log] Drop-{in_port}")
             continue
-        binary, in_port = switch.receive_from_phys()
-        frame = parser.parse(binary)
 
         # 刷新端口地址表。
         if switch.update(local=in_port, remote=frame.src):
             switch.show_table()
 
-        # 查找应该从哪个端口送出。
-        out_ports = switch.search_locals(frame.dst)
+        # 查找应该从哪个端口送出，广播帧不必查表。
+        if frame.dst == Topology.BROADCAST_PORT:
+            out_ports = []
+        else:
+            out_ports = switch.search_locals(frame.dst)
 
         print(f"[Log] {frame.src}-{in_port}-", end="")
         # 如果查出是单播，就直接向端口发送。
         if len(out_ports) == 1:
             out_port = out_ports[0]
-            switch.unicast_to_phy(binary, out_port)
+            switch.unicast_to_phy(frame, out_port)
             print(out_port, end="")
 
         # 如果没查到或者是广播，就向所有端口发送。
         else:
-            print(switch.broadcast_to_phys(binary, in_port), end="")
+            print(switch.broadcast_to_phys(frame, in_port), end="")
 
         print(f"-{frame.dst}")
+
+
+if __name__ == "__main__":
+    # 解析参数。
+    if len(sys.argv) != 2:
+        print("[Error] Device ID expected.")
+        exit(-1)
+
+    # 创建交换机网络层。
+    device_id = sys.argv[1]
+    switch = SwitchLayer(device_id)
+    print(switch)
+
+    # 定期把指标写入 log 目录。
+    if Network.METRICS:
+        export_textfile(get_metrics_path(f"{device_id}-switch"))
+
+    # 开始运作。
+    asyncio.run(serve(switch))
@@ -0,0 +1,109 @@
+from random import Random
+from time import perf_counter, sleep
+
+from layer.switch import SwitchTable
+from utils.params import Topology
+
+
+class LegacyTable(SwitchTable):
+    """原先的写法：每收到一帧，所有表项的寿命都减一，仅作对照。"""
+
+    def update(self, local: str, remote: str) -> bool:
+        updated = remote not in self._table[local].keys()
+        self._table[local].update({remote: 100 + 1})
+        for remotes in self._table.values():
+            for port, life in remotes.copy().items():
+                life -= 1
+                if life == 0:
+                    remotes.pop(port)
+                    updated = True
+                else:
+                    remotes.update({port: life})
+        return updated
+
+
+def legacy_search(table: SwitchTable, remote: str) -> list[str]:
+    """原先的查找：遍历所有本地端口，逐个检查是否学到了该远程端口，仅作对照。"""
+    return list(
+        filter(
+            lambda local: remote in table._table[local].keys(),
+            table._table.keys(),
+        )
+    )
+
+
+# 每帧学习或刷新一次，比较两种写法在不同表大小下的耗时。
+# 原先的寿命以帧计，表里最多留下最近 100 帧的表项，再多的表项也只会轮流过期。
+N = 20_000
+print(f"{'entries':>8} {'sweep':>10} {'ordered':>10}")
+for entries in (10, 100, 1000):
+    ports = [f"1310{i % 8}" for i in range(entries)]
+    remotes = [f"{20000 + i}" for i in range(entries)]
+    times = []
+    for table in (LegacyTable(), SwitchTable()):
+        start = perf_counter()
+        for i in range(N):
+            table.update(ports[i % entries], remotes[i % entries])
+        times.append((perf_counter() - start) / N * 1e6)
+    print(f"{entries:>8} {times[0]:>8.2f}us {times[1]:>8.2f}us")
+
+# 表项按时间过期，刷新过的表项不过期。
+table = SwitchTable(["13100"], ttl=0.2)
+assert table.update("13100", "11300") and table.update("13101", "12300")
+sleep(0.12)
+assert not table.update("13101", "12300")
+sleep(0.12)
+assert table.expire()
+assert table.search_locals("11300") == [] and table.search_locals("12300") == ["13101"]
+assert table.search_locals(Topology.BROADCAST_PORT) == ["13100"]
+print("Expiry by time: OK")
+
+# 表满时淘汰最久未刷新的表项。
+table = SwitchTable(capacity=3)
+for remote in ("11300", "12300", "14300"):
+    table.update("13100", remote)
+table.update("13100", "11300")
+table.update("13101", "17300")
+assert table.size == 3
+assert table.search_remotes("13100") == ["11300", "14300"]
+assert table.search_remotes("13101") == ["17300"]
+print("LRU eviction: OK")
+
+# 64 个端口、学到 1 万个地址时，每帧查找本地端口的耗时。
+PORTS = [f"1{3000 + i}" for i in range(64)]
+REMOTES = [f"{20000 + i}" for i in range(10_000)]
+table = SwitchTable(PORTS, capacity=len(REMOTES))
+for i, remote in enumerate(REMOTES):
+    table.update(PORTS[i % len(PORTS)], remote)
+assert table.size == len(REMOTES)
+random = Random(0)
+known = random.choices(REMOTES, k=N)
+unknown = [f"{40000 + i}" for i in range(N)]
+print(f"{'lookup':>10} {'filter':>10} {'index':>10}")
+for name, dsts in (
+    ("unicast", known),
+    ("unknown", unknown),
+    ("broadcast", [Topology.BROADCAST_PORT] * N),
+):
+    times = []
+    for search in (lambda remote: legacy_search(table, remote), table.search_locals):
+        start = perf_counter()
+        for dst in dsts:
+            search(dst)
+        times.append((perf_counter() - start) / N * 1e6)
+    print(f"{name:>10} {times[0]:>8.2f}us {times[1]:>8.2f}us")
+for dst in known[:100] + unknown[:100]:
+    assert table.search_locals(dst) == legacy_search(table, dst)
+assert table.search_locals(Topology.BROADCAST_PORT) == PORTS
+print("Reverse index: OK")
+
+# 清除与淘汰时同步维护反向索引。
+table = SwitchTable(["13100", "13101"], capacity=2)
+table.update("13100", "11300")
+table.update("13101", "11300")
+assert table.search_locals("11300") == ["13100", "13101"]
+table.update("13100", "12300")
+assert table.search_locals("11300") == ["13101"]
+table.update("13100", "14300")
+assert table.search_locals("11300") == [] and table.search_locals("14300") == ["13100"]
+print("Index on eviction: OK")
@@ -1,4 +1,13 @@
 from utils.coding import *
+from utils.crc import *
+from utils.envelope import *
 from utils.params import *
 from utils.frame import *
+from utils.arq import *
+from utils.pacing import *
+from utils.stream import *
+from utils.channel import *
+from utils.fabric import *
+from utils.metrics import *
+from utils.logger import *
 from utils.io import *
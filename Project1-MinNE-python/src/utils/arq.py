@@ -0,0 +1,299 @@
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from utils.frame import Frame, FrameParam
+from utils.params import ARQMode, Network
+
+
+def seq_offset(seq: int, base: int) -> int:
+    """计算序号相对窗口起点的偏移量。
+
+    Args:
+        seq: 序号。
+        base: 窗口起点的序号。
+
+    Returns:
+        模 `SEQ_SPACE` 意义下的偏移量。
+    """
+    return (seq - base) % FrameParam.SEQ_SPACE
+
+
+def max_window(mode: str) -> int:
+    """计算该协议下序号空间允许的最大窗口。
+
+    Args:
+        mode: 差错控制协议，见 `ARQMode`。
+
+    Returns:
+        回退 N 帧为序号空间减 1，选择重传为序号空间的一半。
+    """
+    if mode == ARQMode.SELECTIVE_REPEAT:
+        return FrameParam.SEQ_SPACE // 2
+    return FrameParam.SEQ_SPACE - 1
+
+
+class SendWindow:
+    """发送窗口。
+
+    只维护协议状态，不涉及套接字；由调用者负责发送与计时。
+    帧从迭代器中按需取出，窗口外的帧不会预先生成。
+    """
+
+    def __init__(self, frames: Iterable[Frame], size: int, mode: str) -> None:
+        """初始化发送窗口。
+
+        Args:
+            frames: 待发送的帧，按序号递增排列。
+            size: 窗口大小，超过序号空间允许的上限时取上限。
+            mode: 差错控制协议，见 `ARQMode`。
+        """
+        self.__frames = iter(frames)
+        self.__size = max(1, min(size, max_window(mode)))
+        self.__mode = mode
+        self.__outstanding: deque[Frame] = deque()
+        self.__acked: set[int] = set()
+        self.__exhausted = False
+
+    @property
+    def done(self) -> bool:
+        """是否所有帧都已被确认。"""
+        return self.__exhausted and not self.__outstanding
+
+    @property
+    def base(self) -> Frame:
+        """窗口内最早未确认的帧。"""
+        return self.__outstanding[0]
+
+    def fill(self) -> list[Frame]:
+        """从迭代器中取帧，直到填满窗口。
+
+        Returns:
+            新放入窗口、需要首次发送的帧。
+        """
+        fresh = []
+        while not self.__exhausted and len(self.__outstanding) < self.__size:
+            try:
+                frame = next(self.__frames)
+            except StopIteration:
+                self.__exhausted = True
+            else:
+                self.__outstanding.append(frame)
+                fresh.append(frame)
+        return fresh
+
+    def ack(self, seq: int) -> bool:
+        """处理 ACK。
+
+        回退 N 帧时为累计确认，确认到 `seq` 为止的所有帧；
+        选择重传时只确认 `seq` 这一帧。
+
+        Args:
+            seq: ACK 携带的序号。
+
+        Returns:
+            窗口是否向前滑动。
+        """
+        if not self.__outstanding:
+            return False
+        offset = seq_offset(seq, self.base.seq)
+        if offset >= len(self.__outstanding):
+            return False
+
+        if self.__mode == ARQMode.SELECTIVE_REPEAT:
+            self.__acked.add(seq)
+            slid = False
+            while self.__outstanding and self.base.seq in self.__acked:
+                self.__acked.discard(self.__outstanding.popleft().seq)
+                slid = True
+            return slid
+
+        for _ in range(offset + 1):
+            self.__outstanding.popleft()
+        return True
+
+    def nak(self, seq: int) -> list[Frame]:
+        """处理 NAK。
+
+        NAK 携带接收方期望的下一个序号。回退 N 帧时，它之前的帧视为已确认，
+        窗口内剩下的帧全部重传；选择重传时只重传这一帧。
+
+        Args:
+            seq: NAK 携带的序号。
+
+        Returns:
+            需要重传的帧。
+        """
+        if self.__mode == ARQMode.SELECTIVE_REPEAT:
+            return [
+                frame
+                for frame in self.__outstanding
+                if frame.seq == seq and seq not in self.__acked
+            ]
+        self.ack(seq - 1)
+        return list(self.__outstanding)
+
+    def timeout(self, expired: set[int] = None) -> list[Frame]:
+        """处理超时。
+
+        回退 N 帧只为窗口计时，超时后重传整个窗口；选择重传为每帧单独计时，
+        只重传计时器到期的帧。
+
+        Args:
+            expired: 可选，计时器到期的序号，仅用于选择重传；
+                为 `None` 时视为窗口内未确认的帧全部到期。
+
+        Returns:
+            需要重传的帧。
+        """
+        return [
+            frame
+            for frame in self.__outstanding
+            if frame.seq not in self.__acked
+            and (
+                self.__mode != ARQMode.SELECTIVE_REPEAT
+                or expired is None
+                or frame.seq in expired
+            )
+        ]
+
+
+class RecvWindow:
+    """接收窗口。
+
+    只维护协议状态，不涉及套接字；由调用者负责回复 ACK/NAK。
+    """
+
+    def __init__(self, first_seq: int, size: int, mode: str) -> None:
+        """初始化接收窗口。
+
+        Args:
+            first_seq: 第一帧（请求帧）的序号。
+            size: 窗口大小；回退 N 帧的接收窗口始终为 1。
+            mode: 差错控制协议，见 `ARQMode`。
+        """
+        self.__expected = first_seq
+        self.__mode = mode
+        self.__size = (
+            max(1, min(size, max_window(mode)))
+            if mode == ARQMode.SELECTIVE_REPEAT
+            else 1
+        )
+        self.__buffer: dict[int, Frame] = {}
+
+    @property
+    def expected(self) -> int:
+        """期望收到的下一个序号，也是 NAK 携带的序号。"""
+        return self.__expected
+
+    def accept(self, frame: Frame) -> tuple[list[Frame], int]:
+        """接收一个校验通过的帧。
+
+        Args:
+            frame: 校验通过的帧。
+
+        Returns:
+            - [0] 按序交付的帧，重复或乱序时为空。
+            - [1] 要回复的 ACK 序号。
+        """
+        offset = seq_offset(frame.seq, self.__expected)
+
+        if self.__mode == ARQMode.SELECTIVE_REPEAT:
+            # 窗口内的帧先缓存，再按序交付；窗口外的帧是重复帧，只需再确认一次。
+            if offset < self.__size:
+                self.__buffer[frame.seq] = frame
+            delivered = []
+            while self.__expected in self.__buffer:
+                delivered.append(self.__buffer.pop(self.__expected))
+                self.__expected = (self.__expected + 1) % FrameParam.SEQ_SPACE
+            return delivered, frame.seq
+
+        # 回退 N 帧只接收期望的那一帧，其余都丢弃，并重复确认已收到的最后一帧。
+        if offset != 0:
+            return [], (self.__expected - 1) % FrameParam.SEQ_SPACE
+        self.__expected = (self.__expected + 1) % FrameParam.SEQ_SPACE
+        return [frame], frame.seq
+
+
+class RTOEstimator:
+    """重传超时估计器。
+
+    按 RFC 6298 维护平滑往返时间与其偏差，超时后指数退避，结果限制在
+    `RTO_MIN` 与 `RTO_MAX` 之间。
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+
+    def __init__(self) -> None:
+        """初始化估计器，尚无样本时使用 `RTO_INIT`。"""
+        self.__srtt = 0.0
+        self.__rttvar = 0.0
+        self.__sampled = False
+        self.__base = Network.RTO_INIT
+        self.__backoff = 0
+
+    @property
+    def rto(self) -> float:
+        """当前重传超时，单位为秒。"""
+        return min(
+            max(self.__base * 2**self.__backoff, Network.RTO_MIN), Network.RTO_MAX
+        )
+
+    @property
+    def srtt(self) -> float:
+        """平滑往返时间，单位为秒；没有样本时为 0。"""
+        return self.__srtt
+
+    def sample(self, rtt: float) -> None:
+        """加入一个往返时间样本。
+
+        按 Karn 算法，调用者只应传入未经重传的帧的往返时间。
+
+        Args:
+            rtt: 往返时间，单位为秒。
+        """
+        if not self.__sampled:
+            self.__srtt, self.__rttvar = rtt, rtt / 2
+            self.__sampled = True
+        else:
+            self.__rttvar += RTOEstimator.BETA * (
+                abs(self.__srtt - rtt) - self.__rttvar
+            )
+            self.__srtt += RTOEstimator.ALPHA * (rtt - self.__srtt)
+        self.__base = self.__srtt + RTOEstimator.K * self.__rttvar
+        self.__backoff = 0
+
+    def backoff(self) -> None:
+        """超时后将重传超时加倍。"""
+        if self.rto < Network.RTO_MAX:
+            self.__backoff += 1
+
+    def reset_backoff(self) -> None:
+        """有新数据被确认时撤销退避，恢复按样本计算的重传超时。"""
+        self.__backoff = 0
+
+
+@dataclass
+class TransferStats:
+    """一次发送的统计数据。"""
+
+    # 目的端口号。
+    dst: str
+    # 发送的有效数据位数。
+    bits: int = 0
+    # 首次发送的帧数。
+    frames: int = 0
+    # 重传的帧数。
+    retransmits: int = 0
+    # 收到的 NAK 数。
+    naks: int = 0
+    # 超时次数。
+    timeouts: int = 0
+    # 从第一帧发出到全部确认的时间，单位为秒。
+    elapsed: float = 0.0
+    # 是否全部确认，连续超时放弃时为 `False`。
+    completed: bool = False
+    # 各帧的往返时间样本，单位为秒。
+    rtts: list[float] = field(default_factory=list)
@@ -0,0 +1,199 @@
+import asyncio
+from math import log, log1p
+from random import Random
+from typing import Callable, Iterable
+
+from utils.coding import PACKED_HEADER_LEN, is_packed
+
+
+class Channel:
+    """物理链路的一个方向。
+
+    代替外部物理层程序，按误码率翻转比特，按丢包率丢弃帧，按时延与抖动推迟交付。
+    与外部物理层程序相同，缓存区大小即单帧的最大位数（MTU），更长的帧被丢弃；
+    两种线路格式都按帧的位数计算，不按线路上的字节数。
+    指定随机种子时，同样的帧序列得到同样的误码与丢包。
+    """
+
+    def __init__(
+        self,
+        error_prob: float = 0.0,
+        buffer_size: int = 1500,
+        delay: float = 0.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        seed=None,
+    ) -> None:
+        """初始化链路。
+
+        Args:
+            error_prob: 可选，误码率，即每一位出错的概率；默认为 0。
+            buffer_size: 可选，缓存区大小，即单帧的最大位数；默认为 1500。
+            delay: 可选，传播时延，单位为秒；默认为 0。
+            jitter: 可选，时延抖动的幅度，单位为秒，时延在其正负范围内均匀分布；默认为 0。
+            loss: 可选，整帧丢失的概率；默认为 0。
+            seed: 可选，随机种子；默认为 `None`，即每次运行都不同。
+        """
+        self.__error_prob = error_prob
+        self.__buffer_size = buffer_size
+        self.__delay = delay
+        self.__jitter = jitter
+        self.__loss = loss
+        self.__random = Random(seed)
+        self.__stats = dict.fromkeys(
+            ("sent", "delivered", "lost", "oversized", "flipped"), 0
+        )
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """统计数据：发送帧数、交付帧数、丢失帧数、超长帧数、翻转位数。"""
+        return dict(self.__stats)
+
+    def error_positions(self, nbits: int) -> list[int]:
+        """按误码率抽取出错的位置。
+
+        不逐位抽样，而是按几何分布直接抽取相邻两个错误之间的间隔，
+        耗时只与出错的位数成正比，低误码率下的长帧也几乎没有开销。
+
+        Args:
+            nbits: 总位数。
+
+        Returns:
+            出错位置的升序列表。
+        """
+        if self.__error_prob <= 0 or nbits <= 0:
+            return []
+        if self.__error_prob >= 1:
+            return list(range(nbits))
+        log_q = log1p(-self.__error_prob)
+        positions = []
+        index = -1
+        while True:
+            index += 1 + int(log(1.0 - self.__random.random()) / log_q)
+            if index >= nbits:
+                return positions
+            positions.append(index)
+
+    @staticmethod
+    def frame_bits(data: bytes) -> int:
+        """计算线路上一帧的位数。
+
+        旧格式每位占 1 字节；压缩格式的位数写在头部。
+
+        Args:
+            data: 线路上传输的字节串。
+
+        Returns:
+            帧的位数。
+        """
+        if is_packed(data):
+            return int.from_bytes(data[1:PACKED_HEADER_LEN], "big")
+        return len(data)
+
+    def corrupt(self, data: bytes) -> bytes:
+        """按误码率翻转帧中的比特。
+
+        旧格式每位占 1 字节，翻转该字节的最低位；压缩格式只翻转头部之后的有效位。
+
+        Args:
+            data: 线路上传输的字节串。
+
+        Returns:
+            可能含有误码的字节串。
+        """
+        if is_packed(data):
+            positions = self.error_positions(Channel.frame_bits(data))
+            if not positions:
+                return data
+            buffer = bytearray(data)
+            for position in positions:
+                buffer[PACKED_HEADER_LEN + (position >> 3)] ^= 0x80 >> (position & 7)
+        else:
+            positions = self.error_positions(len(data))
+            if not positions:
+                return data
+            buffer = bytearray(data)
+            for position in positions:
+                buffer[position] ^= 1
+        self.__stats["flipped"] += len(positions)
+        return bytes(buffer)
+
+    def send(self, data: bytes, deliver: Callable[[bytes], None]) -> bool:
+        """让一帧经过本链路。
+
+        没有时延时立即交付，否则由当前事件循环到时交付。
+
+        Args:
+            data: 线路上传输的字节串。
+            deliver: 交付回调，参数为可能含有误码的字节串。
+
+        Returns:
+            帧将被交付为 `True`，丢失或超长为 `False`。
+        """
+        self.__stats["sent"] += 1
+        if Channel.frame_bits(data) > self.__buffer_size:
+            self.__stats["oversized"] += 1
+            return False
+        if self.__loss and self.__random.random() < self.__loss:
+            self.__stats["lost"] += 1
+            return False
+
+        data = self.corrupt(data)
+        delay = self.__delay
+        if self.__jitter:
+            delay = max(
+                0.0, delay + self.__random.uniform(-self.__jitter, self.__jitter)
+            )
+        if not delay:
+            self.__deliver(data, deliver)
+        else:
+            asyncio.get_running_loop().call_later(delay, self.__deliver, data, deliver)
+        return True
+
+    def __deliver(self, data: bytes, deliver: Callable[[bytes], None]) -> None:
+        """交付一帧。"""
+        self.__stats["delivered"] += 1
+        deliver(data)
+
+
+def build_channels(
+    params: dict[str, dict[str, float]], seed=None
+) -> dict[str, Channel]:
+    """按物理层配置为每个方向建立链路。
+
+    Args:
+        params: 物理层参数，见 `get_phy_params`。
+        seed: 可选，随机种子，各方向的链路由它与端口号派生各自的种子；默认为 `None`。
+
+    Returns:
+        各方向的链路。
+        - 键: 发送方物理层的端口号。
+        - 值: 从该物理层发出的链路。
+    """
+    return {
+        port: Channel(
+            error_prob=param["errorProb"],
+            buffer_size=int(param["bufferSize"]),
+            delay=param["delay"] / 1000,
+            jitter=param["jitter"] / 1000,
+            loss=param["loss"],
+            seed=None if seed is None else f"{seed}-{port}",
+        )
+        for port, param in params.items()
+    }
+
+
+def sum_stats(channels: Iterable[Channel]) -> dict[str, int]:
+    """汇总多条链路的统计数据。
+
+    Args:
+        channels: 要汇总的链路。
+
+    Returns:
+        各项统计数据之和，见 `Channel.stats`。
+    """
+    total: dict[str, int] = {}
+    for channel in channels:
+        for key, value in channel.stats.items():
+            total[key] = total.get(key, 0) + value
+    return total
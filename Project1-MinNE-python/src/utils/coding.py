@@ -1,9 +1,21 @@
+import mmap
+import os
 from base64 import b64decode, b64encode
-from re import findall
+from typing import Iterator
 
 BITS_PER_ASCII = 8
 BITS_PER_UNICODE = 16
 
+# 流式编码文件时每次读取的字节数，必须是 3 的倍数，使各段 Base64 可以直接拼接。
+FILE_CHUNK_SIZE = 3 * 4096
+# 流式解码文件时每次处理的位数，对应 4 个 Base64 字符。
+BITS_PER_B64_QUAD = 4 * BITS_PER_ASCII
+
+# 压缩线路编码的帧头：1 字节魔数 + 4 字节位长度。
+# 旧格式中每个字节只可能是 0x00 或 0x01，因此魔数不会与之混淆。
+PACKED_MAGIC = b"\xa5"
+PACKED_HEADER_LEN = 5
+
 
 def string_to_bits(string: str) -> str:
     """将01字符串转换为01比特流。
@@ -29,92 +41,351 @@ def bits_to_string(bits: str) -> str:
     return "".join(list(map(lambda bit: chr(ord(bit) + ord("0")), bits)))
 
 
+def binary_to_bytes(binary: str) -> bytes:
+    """将01字符串压缩为字节串，每字节8位。
+
+    末尾不足8位的部分以0补齐。
+
+    Args:
+        binary: 01字符串。
+
+    Returns:
+        压缩所得的字节串。
+    """
+    if not binary:
+        return b""
+    padding = -len(binary) % 8
+    return (int(binary, 2) << padding).to_bytes((len(binary) + padding) // 8, "big")
+
+
+def bytes_to_binary(data: bytes) -> str:
+    """将字节串展开为01字符串，每字节8位。
+
+    借助整型数的二进制表示一次性转换，不逐字节处理。
+
+    Args:
+        data: 字节串。
+
+    Returns:
+        展开所得的01字符串。
+    """
+    if not data:
+        return ""
+    return bin(int.from_bytes(data, "big"))[2:].zfill(8 * len(data))
+
+
+def pack_bits(binary: str) -> bytes:
+    """将01字符串编码为压缩线路格式。
+
+    格式为魔数 + 4 字节大端位长度 + 每字节8位的数据。
+
+    Args:
+        binary: 01字符串。
+
+    Returns:
+        压缩线路格式的字节串。
+    """
+    return PACKED_MAGIC + len(binary).to_bytes(4, "big") + binary_to_bytes(binary)
+
+
+def unpack_bits(data: bytes) -> str:
+    """将压缩线路格式解码为01字符串。
+
+    Args:
+        data: 压缩线路格式的字节串。
+
+    Returns:
+        解码所得的01字符串。
+    """
+    length = int.from_bytes(data[1:PACKED_HEADER_LEN], "big")
+    body = data[PACKED_HEADER_LEN:]
+    return bytes_to_binary(body)[:length] if length else ""
+
+
+def is_packed(data: bytes) -> bool:
+    """判断收到的字节串是否为压缩线路格式。
+
+    Args:
+        data: 收到的字节串。
+
+    Returns:
+        压缩格式为 `True`，旧格式为 `False`。
+    """
+    return data[:1] == PACKED_MAGIC
+
+
+def encode_wire(binary: str, packed: bool) -> bytes:
+    """将01字符串编码为线路上传输的字节串。
+
+    Args:
+        binary: 01字符串。
+        packed: 使用压缩格式为 `True`，使用旧格式（每位1字节）为 `False`。
+
+    Returns:
+        线路上传输的字节串。
+    """
+    if packed:
+        return pack_bits(binary)
+    return string_to_bits(binary).encode("utf-8")
+
+
+def decode_wire(data: bytes) -> str:
+    """将线路上收到的字节串解码为01字符串，自动识别格式。
+
+    Args:
+        data: 线路上收到的字节串。
+
+    Returns:
+        解码所得的01字符串。
+    """
+    if is_packed(data):
+        return unpack_bits(data)
+    return bits_to_string(data.decode("utf-8"))
+
+
 def encode_ascii(ascii: str) -> str:
     """将ASCII字符编码为01字符串。
 
+    先整体编码为字节串，再一次性展开为01字符串。
+
     Args:
         ascii: 要编码的ASCII字符。
 
     Returns:
         编码所得的01字符串。
     """
-    return "".join(
-        str(bin(ord(char)))[2:].zfill(BITS_PER_ASCII) for char in ascii
-    )
+    try:
+        return bytes_to_binary(ascii.encode("latin-1"))
+    # 码点超过 8 位的字符无法用 8 位表示，保持原先逐字符展开的结果。
+    except UnicodeEncodeError:
+        return "".join(str(bin(ord(char)))[2:].zfill(BITS_PER_ASCII) for char in ascii)
 
 
 def decode_ascii(binary: str) -> str:
     """将01字符串解码为ASCII字符。
 
+    末尾不足 8 位的部分会被舍弃。
+
     Args:
         binary: 要解码的01字符串。
 
     Returns:
         解码所得的ASCII字符。
     """
-    return "".join(
-        [
-            chr(int(char, 2))
-            for char in findall(f".{{{BITS_PER_ASCII}}}", binary)
-        ]
-    )
+    usable = len(binary) // BITS_PER_ASCII * BITS_PER_ASCII
+    return binary_to_bytes(binary[:usable]).decode("latin-1")
 
 
 def encode_unicode(unicode: str) -> str:
     """将Unicode字符编码为01字符串。
 
+    每个字符 16 位（UTF-16BE），基本多文种平面以外的字符编码为代理对。
+
     Args:
         unicode: 要编码的Unicode字符。
 
     Returns:
         编码所得的01字符串。
     """
-    return "".join(
-        str(bin(ord(char)))[2:].zfill(BITS_PER_UNICODE) for char in unicode
-    )
+    return bytes_to_binary(unicode.encode("utf-16-be", "surrogatepass"))
 
 
 def decode_unicode(binary: str) -> str:
     """将01字符串解码为Unicode字符。
 
+    末尾不足 16 位的部分会被舍弃。
+
     Args:
         binary: 要解码的01字符串。
 
     Returns:
         解码所得的Unicode字符。
     """
-    return "".join(
-        [
-            chr(int(char, 2))
-            for char in findall(f".{{{BITS_PER_UNICODE}}}", binary)
-        ]
-    )
+    usable = len(binary) // BITS_PER_UNICODE * BITS_PER_UNICODE
+    return binary_to_bytes(binary[:usable]).decode("utf-16-be", "surrogatepass")
+
 
+def encode_utf8(text: str) -> str:
+    """将任意字符按 UTF-8 编码为01字符串。
+
+    ASCII 字符只占 8 位，其余字符占 16 到 32 位。
+
+    Args:
+        text: 要编码的字符。
 
-def encode_file(filepath: str) -> str:
+    Returns:
+        编码所得的01字符串。
+    """
+    return bytes_to_binary(text.encode("utf-8", "surrogatepass"))
+
+
+def decode_utf8(binary: str) -> str:
+    """将01字符串按 UTF-8 解码。
+
+    末尾不足 8 位的部分会被舍弃，无法解码的字节替换为 U+FFFD。
+
+    Args:
+        binary: 要解码的01字符串。
+
+    Returns:
+        解码所得的字符。
+    """
+    usable = len(binary) // BITS_PER_ASCII * BITS_PER_ASCII
+    return binary_to_bytes(binary[:usable]).decode("utf-8", "replace")
+
+
+def encode_file(filepath: str, raw: bool = False) -> str:
     """将文件编码为01字符串。
 
     Args:
         filename: 要编码的文件的绝对路径。
+        raw: 可选，是否直接展开原始字节，不经 Base64；默认为 `False`。
 
     Returns:
         编码所得的01字符串。
     """
     with open(filepath, mode="rb") as fr:
-        secret = b64encode(fr.read()).decode("utf-8")
-    return encode_ascii(secret)
+        data = fr.read()
+    if raw:
+        return bytes_to_binary(data)
+    return encode_ascii(b64encode(data).decode("utf-8"))
+
+
+def iter_encode_file(
+    filepath: str,
+    chunk_size: int = FILE_CHUNK_SIZE,
+    use_mmap: bool = False,
+    raw: bool = False,
+) -> Iterator[str]:
+    """将文件分段编码为01字符串。
+
+    各段拼接后与 `encode_file` 的结果相同，但任意时刻只有一段在内存中。
+
+    Args:
+        filepath: 要编码的文件的绝对路径。
+        chunk_size: 可选，每段读取的字节数，须为 3 的倍数；默认为 `FILE_CHUNK_SIZE`。
+        use_mmap: 可选，是否用内存映射读取文件；默认为 `False`。
+        raw: 可选，是否直接展开原始字节，不经 Base64；默认为 `False`。
+
+    Yields:
+        每段编码所得的01字符串。
+    """
+
+    def encode(chunk: bytes) -> str:
+        if raw:
+            return bytes_to_binary(chunk)
+        return encode_ascii(b64encode(chunk).decode("utf-8"))
+
+    with open(filepath, mode="rb") as fr:
+        if use_mmap and os.fstat(fr.fileno()).st_size:
+            with mmap.mmap(fr.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for start in range(0, len(mm), chunk_size):
+                    yield encode(mm[start : start + chunk_size])
+            return
+        while chunk := fr.read(chunk_size):
+            yield encode(chunk)
 
 
-def decode_file(binary: str) -> tuple[bytes, bool]:
+def encoded_file_len(filepath: str, raw: bool = False) -> int:
+    """计算文件编码后的01字符串长度，不读取文件内容。
+
+    Args:
+        filepath: 要编码的文件的绝对路径。
+        raw: 可选，是否直接展开原始字节，不经 Base64；默认为 `False`。
+
+    Returns:
+        编码所得的01字符串的位数。
+    """
+    size = os.path.getsize(filepath)
+    if raw:
+        return size * BITS_PER_ASCII
+    return -(-size // 3) * BITS_PER_B64_QUAD
+
+
+class FileDecoder:
+    """流式文件解码器。
+
+    逐段接收01字符串，凑满完整的 Base64 字符组（原始模式下为完整字节）
+    就解码并写入文件，内存中只保留不足一组的余量。
+    """
+
+    def __init__(self, filepath: str, raw: bool = False) -> None:
+        """打开要写入的文件。
+
+        解码结果先写入同目录下的临时文件，收完整后才改名为 `filepath`，
+        中途放弃的传输不会留下残缺的文件。
+
+        Args:
+            filepath: 解码结果要写入的文件路径。
+            raw: 可选，01字符串是否为原始字节展开，不经 Base64；默认为 `False`。
+        """
+        self.__filepath = filepath
+        self.__partpath = f"{filepath}.part"
+        self.__file = open(self.__partpath, mode="wb")
+        self.__pending = ""
+        self.__decoded = True
+        self.__raw = raw
+        self.__group = BITS_PER_ASCII if raw else BITS_PER_B64_QUAD
+
+    def feed(self, binary: str) -> None:
+        """接收一段01字符串。
+
+        Args:
+            binary: 按序到达的一段01字符串。
+        """
+        self.__pending += binary
+        usable = len(self.__pending) // self.__group * self.__group
+        if usable:
+            self.__write(self.__pending[:usable])
+            self.__pending = self.__pending[usable:]
+
+    def close(self, complete: bool = True) -> bool:
+        """写入余量并关闭文件。
+
+        Args:
+            complete: 可选，传输是否完整结束；为 `False` 时删除临时文件。默认为 `True`。
+
+        Returns:
+            是否成功解码，成功为`True`，失败为`False`；传输不完整也算失败。
+        """
+        if self.__pending:
+            self.__write(self.__pending)
+            self.__pending = ""
+        self.__file.close()
+        if not complete:
+            os.remove(self.__partpath)
+            return False
+        os.replace(self.__partpath, self.__filepath)
+        return self.__decoded
+
+    def __write(self, binary: str) -> None:
+        """解码一段01字符串并写入文件。"""
+        # 原始模式下只有收尾时才可能出现不足一字节的余量，说明数据不完整。
+        if self.__raw:
+            self.__file.write(decode_file(binary, raw=True)[0])
+            if len(binary) % BITS_PER_ASCII:
+                self.__decoded = False
+            return
+        try:
+            self.__file.write(b64decode(decode_ascii(binary).encode("utf-8")))
+        except Exception:
+            self.__decoded = False
+
+
+def decode_file(binary: str, raw: bool = False) -> tuple[bytes, bool]:
     """将01字符串解码为文件。
 
     Args:
         binary: 要解码的01字符串。
+        raw: 可选，01字符串是否为原始字节展开，不经 Base64；默认为 `False`。
 
     Returns:
         - [0] 解码所得的文件的字节串。
         - [1] 是否成功解码，成功为`True`，失败为`False`。
     """
+    if raw:
+        usable = len(binary) // BITS_PER_ASCII * BITS_PER_ASCII
+        return binary_to_bytes(binary[:usable]), True
     try:
         data = b64decode(decode_ascii(binary).encode("utf-8"))
     except Exception:
@@ -140,3 +411,13 @@ if __name__ == "__main__":
     unicode_decoded = decode_unicode(unicode_encoded)
     print(f"{unicode_encoded=}")
     print(f"{unicode_decoded=}")
+
+    utf8_encoded = encode_utf8(message)
+    utf8_decoded = decode_utf8(utf8_encoded)
+    print(f"{utf8_encoded=}")
+    print(f"{utf8_decoded=}")
+
+    packed_encoded = pack_bits(unicode_encoded)
+    packed_decoded = unpack_bits(packed_encoded)
+    print(f"{packed_encoded=}")
+    print(f"{packed_decoded=}")
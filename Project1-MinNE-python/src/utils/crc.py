@@ -0,0 +1,65 @@
+from binascii import crc_hqx
+
+from utils.coding import binary_to_bytes
+
+CRC16_INIT = 0xFFFF
+CRC16_POLY = 0xA001
+
+
+def make_crc_table(poly: int) -> tuple[int, ...]:
+    """生成按字节查表的 CRC-16 表。
+
+    Args:
+        poly: 反射形式的生成多项式。
+
+    Returns:
+        256 项的 CRC-16 表，第 i 项为字节 i 的余式。
+    """
+    table = []
+    for byte in range(256):
+        cur = byte
+        for _ in range(8):
+            cur = (cur >> 1) ^ poly if cur & 1 else cur >> 1
+        table.append(cur)
+    return tuple(table)
+
+
+CRC16_TABLE = make_crc_table(CRC16_POLY)
+
+
+def crc16(data: bytes, init: int = CRC16_INIT) -> int:
+    """按字节查表计算 CRC-16 校验码。
+
+    多项式为 `CRC16_POLY`，与原先逐位移位的算法结果一致。
+
+    Args:
+        data: 要校验的字节串。
+        init: 可选，寄存器初值；默认为 `CRC16_INIT`。
+
+    Returns:
+        CRC-16 校验码对应的整型数。
+    """
+    cur = init
+    table = CRC16_TABLE
+    for byte in data:
+        cur = (cur >> 8) ^ table[(cur ^ byte) & 0xFF]
+    return cur
+
+
+def generate_crc(binary: str, compat: bool = True) -> int:
+    """对任意长的 01 字符串生成 CRC-16 校验码。
+
+    兼容模式下，先将 01 字符串转为十六进制字符串，再对其 ASCII 码查表计算，
+    结果与旧版逐位算法逐位相同；非兼容模式下，直接对压缩后的字节串调用
+    标准库的 C 实现 `binascii.crc_hqx`（CRC-16/CCITT）。
+
+    Args:
+        binary: 任意 01 字符串。
+        compat: 可选，是否使用兼容模式；默认为 `True`。
+
+    Returns:
+        CRC-16 校验码对应的整型数。
+    """
+    if compat:
+        return crc16(hex(int(binary, 2))[2:].encode("ascii"))
+    return crc_hqx(binary_to_bytes(binary), CRC16_INIT)
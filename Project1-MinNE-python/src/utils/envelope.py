@@ -0,0 +1,127 @@
+from struct import Struct
+
+from utils.coding import binary_to_bytes, bytes_to_binary
+
+# 网元内部消息的信封：固定长度的结构体头部 + 变长字段。
+# 头部依次为魔数、消息类型、标志位、源端口、目的端口、
+# 01 字符串的位数、文本的字节数、文件路径的字节数。
+ENVELOPE_MAGIC = b"NE"
+ENVELOPE_HEADER = Struct("!2sBBHHIII")
+
+
+class EnvelopeFlag:
+    """信封标志位，标明哪些可选字段存在。"""
+
+    SRC = 0x01
+    DST = 0x02
+    MESSAGE = 0x04
+    TEXT = 0x08
+    FILE = 0x10
+    HAS_DECODED = 0x20
+    DECODED = 0x40
+
+
+# 可选字段与对应标志位。
+ENVELOPE_FIELDS = {
+    "src": EnvelopeFlag.SRC,
+    "dst": EnvelopeFlag.DST,
+    "message": EnvelopeFlag.MESSAGE,
+    "text": EnvelopeFlag.TEXT,
+    "file": EnvelopeFlag.FILE,
+    "decoded": EnvelopeFlag.HAS_DECODED,
+}
+
+
+def encode_envelope(data: dict) -> bytes:
+    """将网元内部消息打包为信封。
+
+    01 字符串每字节压缩 8 位，文本与文件路径按 UTF-8 编码。
+
+    Args:
+        data: 消息数据，必须含 "msgtype"，其余字段见 `ENVELOPE_FIELDS`。
+
+    Returns:
+        打包所得的字节串。
+
+    Raises:
+        ValueError: 消息中有未定义的字段。
+    """
+    unknown = data.keys() - ENVELOPE_FIELDS.keys() - {"msgtype"}
+    if unknown:
+        raise ValueError(f"Unknown envelope fields {sorted(unknown)}")
+
+    flags = 0
+    for key, flag in ENVELOPE_FIELDS.items():
+        if key in data:
+            flags |= flag
+    if data.get("decoded"):
+        flags |= EnvelopeFlag.DECODED
+
+    message = data.get("message", "")
+    text = data.get("text", "").encode("utf-8")
+    file = data.get("file", "").encode("utf-8")
+    header = ENVELOPE_HEADER.pack(
+        ENVELOPE_MAGIC,
+        int(data["msgtype"]),
+        flags,
+        int(data.get("src", 0)),
+        int(data.get("dst", 0)),
+        len(message),
+        len(text),
+        len(file),
+    )
+    return b"".join((header, binary_to_bytes(message), text, file))
+
+
+def decode_envelope(data: bytes) -> dict:
+    """将信封解析为网元内部消息。
+
+    用 `memoryview` 切片定位各字段，只在生成最终字段值时读取一次数据。
+
+    Args:
+        data: 收到的字节串。
+
+    Returns:
+        消息数据，只含打包时存在的字段。
+
+    Raises:
+        ValueError: 字节串不是合法的信封。
+    """
+    view = memoryview(data)
+    if len(view) < ENVELOPE_HEADER.size:
+        raise ValueError("Envelope too short")
+    (
+        magic,
+        msgtype,
+        flags,
+        src,
+        dst,
+        message_bits,
+        text_len,
+        file_len,
+    ) = ENVELOPE_HEADER.unpack_from(view)
+    message_len = -(-message_bits // 8)
+    if magic != ENVELOPE_MAGIC:
+        raise ValueError("Bad envelope magic")
+    if len(view) != ENVELOPE_HEADER.size + message_len + text_len + file_len:
+        raise ValueError("Envelope length mismatch")
+
+    result = {"msgtype": str(msgtype)}
+    if flags & EnvelopeFlag.SRC:
+        result["src"] = str(src)
+    if flags & EnvelopeFlag.DST:
+        result["dst"] = str(dst)
+
+    start = ENVELOPE_HEADER.size
+    end = start + message_len
+    if flags & EnvelopeFlag.MESSAGE:
+        result["message"] = bytes_to_binary(view[start:end])[:message_bits]
+    start, end = end, end + text_len
+    if flags & EnvelopeFlag.TEXT:
+        result["text"] = str(view[start:end], "utf-8")
+    start, end = end, end + file_len
+    if flags & EnvelopeFlag.FILE:
+        result["file"] = str(view[start:end], "utf-8")
+    if flags & EnvelopeFlag.HAS_DECODED:
+        result["decoded"] = bool(flags & EnvelopeFlag.DECODED)
+    return result
@@ -0,0 +1,79 @@
+import asyncio
+
+from utils.channel import Channel
+
+
+def upper_port(phy: str) -> str:
+    """获取物理层端口所属设备的网络层端口。
+
+    物理层端口形如 `1{id}10{n}`，网络层端口形如 `1{id}200`。
+
+    Args:
+        phy: 物理层端口号。
+
+    Returns:
+        该设备网络层的端口号。
+    """
+    return f"{phy[:-3]}200"
+
+
+class Fabric:
+    """进程内的交换结构。
+
+    代替 UDP 套接字与外部物理层程序，在同一个事件循环上的各层之间投递数据。
+    发往已连线物理层端口的数据，直接放入链路对端设备网络层的接收队列，
+    来源记为对端物理层端口，与外部物理层程序转发的效果相同；如果该方向配置了链路，
+    先经链路加入误码、丢包与时延。发往其它已注册端口的数据原样投递，
+    发往未注册端口的数据被丢弃。
+    """
+
+    def __init__(
+        self, links: dict[str, str] = None, channels: dict[str, Channel] = None
+    ) -> None:
+        """初始化交换结构。
+
+        Args:
+            links: 可选，物理层端口之间的连线，两个方向都要列出；默认为空。
+            channels: 可选，各方向的链路，键为发送方物理层端口号；默认为空，即理想链路。
+        """
+        self.__links = links or {}
+        self.__channels = channels or {}
+        self.__queues: dict[str, asyncio.Queue] = {}
+
+    def attach(self, port: str) -> asyncio.Queue:
+        """注册端口。
+
+        重复注册同一端口时返回同一个队列，注册前发来的数据不会丢失。
+
+        Args:
+            port: 要注册的端口号。
+
+        Returns:
+            该端口的接收队列，元素为 `(数据, 来源端口号)`。
+        """
+        return self.__queues.setdefault(port, asyncio.Queue())
+
+    def sendto(self, data: bytes, src: str, dst: str) -> None:
+        """投递数据。
+
+        Args:
+            data: 要投递的字节串。
+            src: 发送方的端口号。
+            dst: 目的端口号。
+        """
+        peer = self.__links.get(dst)
+        if not peer:
+            queue = self.__queues.get(dst)
+            if queue:
+                queue.put_nowait((data, src))
+            return
+
+        # 经物理链路送到对端设备的网络层，来源为对端物理层。
+        queue = self.__queues.get(upper_port(peer))
+        if not queue:
+            return
+        channel = self.__channels.get(dst)
+        if channel:
+            channel.send(data, lambda data: queue.put_nowait((data, peer)))
+        else:
+            queue.put_nowait((data, peer))
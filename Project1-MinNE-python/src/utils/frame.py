@@ -1,3 +1,7 @@
+from utils.coding import encode_wire
+from utils.crc import generate_crc
+
+
 def dec_to_bin(decimal: int, length: int) -> str:
     """将十进制数转换为对应的 01 字符串。
 
@@ -31,41 +35,25 @@ def bin_to_dec(binary: str) -> int:
         return decimal
 
 
-def generate_crc(binary: str) -> int:
-    """对任意长的 01 字符串生成 CRC-16 校验码。
-
-    Args:
-        binary: 任意 01 字符串。
-
-    Returns:
-        CRC-16 校验码对应的整型数。
-    """
-    cur = 0xFFFF
-    poly = 0xA001
-    for byte in hex(int(binary, 2))[2:]:
-        cur ^= ord(byte)
-        for _ in range(8):
-            last = cur % 2
-            cur >>= 1
-            if last == 1:
-                cur ^= poly
-    return cur
-
-
 class FrameParam:
     """帧参数。"""
 
     LOCATOR = "01111110"
     SUSPICIOUS = "11111"
+    STUFFED = "111110"
+    TERMINATOR = "111111"
 
     LOCATOR_LEN = 8
     SUSPICIOUS_LEN = 5
     PORT_LEN = 16
-    SESSION_LEN = 2
+    SESSION_LEN = 3
     REPLY_LEN = 1
-    SEQ_LEN = 1
+    SEQ_LEN = 8
+    SEQ_SPACE = 2**SEQ_LEN
     DATA_LEN = 32
     CRC_LEN = 16
+    # 为 `True` 时使用与旧版逐位相同的校验码，为 `False` 时使用压缩字节 + C 实现。
+    CRC_COMPAT = True
     HEAD_LEN = PORT_LEN + SESSION_LEN + REPLY_LEN + SEQ_LEN
     TAIL_LEN = PORT_LEN + CRC_LEN
 
@@ -73,11 +61,13 @@ class FrameParam:
 class SessionState:
     """当前会话状态。"""
 
-    NORMAL = "00"
-    FIN = "01"
-    REQ_TXT = "10"
-    REQ_IMG = "11"
-    REQ_LIST = (REQ_TXT, REQ_IMG)
+    NORMAL = "000"
+    FIN = "001"
+    REQ_TXT = "010"
+    REQ_IMG = "011"
+    REQ_RAW = "100"
+    REQ_UTF8 = "101"
+    REQ_LIST = (REQ_TXT, REQ_IMG, REQ_RAW, REQ_UTF8)
 
 
 class ReplyState:
@@ -100,10 +90,27 @@ class Frame:
         self.verified = kwargs.get("verified", False)
         self.length = kwargs.get("length", 0)
 
+        self.__wire: dict[bool, bytes] = {}
+
     def __str__(self) -> str:
         """打印帧信息。"""
         return f"[Frame {self.seq}] ({self.src}->{self.dst},{self.session_state}/{self.reply_state}) {self.data}"
 
+    def wire(self, packed: bool) -> bytes:
+        """获取该帧在线路上传输的字节串。
+
+        编码结果缓存在帧上，重传或广播时不再重复编码。
+
+        Args:
+            packed: 使用压缩格式为 `True`，使用旧格式为 `False`。
+
+        Returns:
+            线路上传输的字节串。
+        """
+        if packed not in self.__wire:
+            self.__wire[packed] = encode_wire(self.binary, packed)
+        return self.__wire[packed]
+
     @staticmethod
     def calc_num(message: str) -> int:
         """计算消息需要分几帧发送。
@@ -122,6 +129,38 @@ class Frame:
         )
 
 
+class LazyFrame(Frame):
+    """按需解析的帧。
+
+    创建时只带有源端口与目标端口，转发设备据此即可转发；
+    其余字段与校验结果在首次访问时才完整解析。
+    """
+
+    LAZY_FIELDS = ("session_state", "reply_state", "seq", "data", "verified")
+
+    def __init__(self, binary: str, src: str, dst: str) -> None:
+        """初始化帧。
+
+        Args:
+            binary: 原始 01 字符串。
+            src: 该帧的源端口。
+            dst: 该帧的目标端口。
+        """
+        super().__init__(src=src, dst=dst, binary=binary, length=len(binary))
+        # 去掉其余字段，留给 `__getattr__` 在首次访问时解析。
+        for field in LazyFrame.LAZY_FIELDS:
+            delattr(self, field)
+
+    def __getattr__(self, name: str):
+        """首次访问其余字段时，完整解析该帧。"""
+        if name not in LazyFrame.LAZY_FIELDS:
+            raise AttributeError(name)
+        frame = FrameParser().parse(self.binary)
+        for field in LazyFrame.LAZY_FIELDS:
+            setattr(self, field, getattr(frame, field))
+        return getattr(frame, name)
+
+
 class FrameBuilder:
     """帧建造者。"""
 
@@ -162,13 +201,17 @@ class FrameBuilder:
         self.__reply_state = reply_state if reply_state != None else self.__reply_state
         self.__binary += self.__reply_state
 
-    def __set_seq(self, step_seq: bool) -> None:
+    def __set_seq(self, step_seq: bool, seq: int) -> None:
         """设置序号。
 
         Args:
             step_seq: 该次需递增序号为 `True`，不递增为 `False`。
+            seq: 指定的序号，优先于 `step_seq`。
         """
-        self.__seq = int(not self.__seq) if step_seq else self.__seq
+        if seq != None:
+            self.__seq = seq % FrameParam.SEQ_SPACE
+        elif step_seq:
+            self.__seq = (self.__seq + 1) % FrameParam.SEQ_SPACE
         self.__binary += dec_to_bin(self.__seq, FrameParam.SEQ_LEN)
 
     def __set_data(self, data: str) -> None:
@@ -191,17 +234,17 @@ class FrameBuilder:
 
     def __apply_crc(self) -> None:
         """生成 CRC-16 校验码。"""
-        crc = generate_crc(self.__binary)
+        crc = generate_crc(self.__binary, FrameParam.CRC_COMPAT)
         self.__binary += dec_to_bin(crc, FrameParam.CRC_LEN)
 
     def __add_locator(self) -> None:
-        """在帧前后添加定位串。"""
-        pos = self.__binary.find(FrameParam.SUSPICIOUS)
-        while pos != -1:
-            self.__binary = f"{self.__binary[: pos + FrameParam.SUSPICIOUS_LEN]}0{self.__binary[pos + FrameParam.SUSPICIOUS_LEN :]}"
-            pos = self.__binary.find(FrameParam.SUSPICIOUS, pos + 6)
+        """在帧前后添加定位串。
 
-        self.__binary = f"{FrameParam.LOCATOR}{self.__binary}{FrameParam.LOCATOR}"
+        每连续 5 个 1 后插入一个 0。`str.replace` 从左到右不重叠地一次扫描，
+        与逐个插入的结果完全相同。
+        """
+        stuffed = self.__binary.replace(FrameParam.SUSPICIOUS, FrameParam.STUFFED)
+        self.__binary = f"{FrameParam.LOCATOR}{stuffed}{FrameParam.LOCATOR}"
 
     def build(self, step_seq: bool = True, **kwargs) -> Frame:
         """建造帧。
@@ -214,6 +257,7 @@ class FrameBuilder:
             - src: 该帧的源端口；
             - session_state: 当前会话状态；
             - reply_state: 回复状态；
+            - seq: 指定序号，用于 ACK/NAK；
             - data: 该帧封装的数据；
             - dst: 该帧的目标端口。
 
@@ -224,7 +268,7 @@ class FrameBuilder:
         self.__set_src(kwargs.get("src", None))
         self.__set_session_state(kwargs.get("session_state", None))
         self.__set_reply_state(kwargs.get("reply_state", None))
-        self.__set_seq(step_seq)
+        self.__set_seq(step_seq, kwargs.get("seq", None))
         self.__set_data(kwargs.get("data", None))
         self.__set_dst(kwargs.get("dst", None))
         self.__apply_crc()
@@ -267,7 +311,11 @@ class FrameParser:
 
     def __get_seq(self) -> None:
         """获取序号。"""
-        self.__seq = bin_to_dec(self.__message[FrameParam.HEAD_LEN - 1])
+        self.__seq = bin_to_dec(
+            self.__message[
+                FrameParam.HEAD_LEN - FrameParam.SEQ_LEN : FrameParam.HEAD_LEN
+            ]
+        )
 
     def __get_data(self) -> None:
         """获取该帧中封装的数据。"""
@@ -282,7 +330,9 @@ class FrameParser:
     def __check_crc(self) -> None:
         """CRC-16 检验。"""
         actual_crc = bin_to_dec(self.__message[-FrameParam.CRC_LEN :])
-        assumed_crc = generate_crc(self.__message[: -FrameParam.CRC_LEN])
+        assumed_crc = generate_crc(
+            self.__message[: -FrameParam.CRC_LEN], FrameParam.CRC_COMPAT
+        )
         self.__verified = True if actual_crc == assumed_crc else False
 
     def parse(self, binary: str) -> Frame:
@@ -295,8 +345,9 @@ class FrameParser:
             解析所得的帧。
         """
         self.__message = FrameParser.__extract_message(binary)
-        if not self.__message:
-            return Frame()
+        # 误码可能让帧尾定位串提前出现，提取出的信息连帧头帧尾都不够长。
+        if len(self.__message) < FrameParam.HEAD_LEN + FrameParam.TAIL_LEN:
+            return Frame(binary=binary, length=len(binary))
 
         self.__get_src()
         self.__get_session_state()
@@ -318,6 +369,73 @@ class FrameParser:
             length=len(binary),
         )
 
+    def parse_lazy(self, binary: str) -> LazyFrame:
+        """只解析帧的源端口与目标端口，其余字段留到首次访问时再解析。
+
+        Args:
+            binary: 原始 01 字符串。
+
+        Returns:
+            按需解析的帧。
+        """
+        src, dst = FrameParser.parse_ports(binary)
+        return LazyFrame(binary, src, dst)
+
+    @staticmethod
+    def parse_ports(binary: str) -> tuple[str, str]:
+        """只取出帧的源端口与目标端口，不解析数据，也不做校验。
+
+        填充后的数据中，恰好连续 5 个 1 之后的 0 都是填充的，去填充只与局部有关：
+        帧头取开头足够长的一段去填充；帧尾从足够靠前的某个 0 之后开始去填充，
+        所得的末尾与整帧去填充的末尾相同。耗时与帧长几乎无关。
+
+        Args:
+            binary: 原始 01 字符串。
+
+        Returns:
+            - [0] 该帧的源端口。
+            - [1] 该帧的目标端口。
+            提取失败时均为 `Frame` 的默认值。
+        """
+        start = binary.find(FrameParam.LOCATOR)
+        if start == -1:
+            return "X", "X"
+        start += FrameParam.LOCATOR_LEN
+        end = binary.find(FrameParam.TERMINATOR, start)
+        if end == -1:
+            return "X", "X"
+        # 帧尾定位串前还有一个 0。
+        end -= 1
+
+        # 与完整解析相同，去填充后连帧头帧尾都不够长的帧视为提取失败。
+        # 每 6 位中最多有 1 位是填充的，足够长的帧不必数出填充的位数。
+        length = end - start
+        if length - length // len(FrameParam.STUFFED) < (
+            FrameParam.HEAD_LEN + FrameParam.TAIL_LEN
+        ):
+            length -= binary.count(FrameParam.STUFFED, start, end)
+            if length < FrameParam.HEAD_LEN + FrameParam.TAIL_LEN:
+                return "X", "X"
+
+        # 每 5 位最多填充 1 位，再多取一个填充串的长度，保证末尾的填充完整。
+        head_span = (
+            FrameParam.PORT_LEN
+            + FrameParam.PORT_LEN // FrameParam.SUSPICIOUS_LEN
+            + len(FrameParam.STUFFED)
+        )
+        head = binary[start : min(end, start + head_span)].replace(
+            FrameParam.STUFFED, FrameParam.SUSPICIOUS
+        )
+        tail_span = (
+            FrameParam.TAIL_LEN + FrameParam.TAIL_LEN // FrameParam.SUSPICIOUS_LEN
+        )
+        cut = max(binary.rfind("0", start, end - tail_span), start - 1) + 1
+        tail = binary[cut:end].replace(FrameParam.STUFFED, FrameParam.SUSPICIOUS)
+        return (
+            str(bin_to_dec(head[: FrameParam.PORT_LEN])),
+            str(bin_to_dec(tail[-FrameParam.TAIL_LEN : -FrameParam.CRC_LEN])),
+        )
+
     @staticmethod
     def __extract_message(binary: str) -> str:
         """从 01 字符串中提取帧。
@@ -328,36 +446,24 @@ class FrameParser:
         Returns:
             - 提取出的信息。如果提取失败则为""。
         """
-        message = ""
         start = binary.find(FrameParam.LOCATOR)
 
         # 如果没找到定位串，就返回空帧。
         if start == -1:
             return ""
 
-        # 向后反变换。
+        # 填充后的数据中不会出现连续 6 个 1，因此第一次出现的位置就是帧尾定位串。
         start += FrameParam.LOCATOR_LEN
-        susp = binary.find(FrameParam.SUSPICIOUS, start)
-        while susp != -1:
-            # 如果下标上溢，说明帧有问题。
-            try:
-                after_susp = binary[susp + FrameParam.SUSPICIOUS_LEN]
-            except IndexError:
-                return ""
-
-            # 如果到达帧尾，就返回提取出的信息。
-            if after_susp == "1":
-                message += binary[start : susp - 1]
-                return message
-
-            # 如果只是连续5个1，就删除后面的0，然后继续寻找。
-            else:
-                message += binary[start : susp + FrameParam.SUSPICIOUS_LEN]
-                start = susp + FrameParam.SUSPICIOUS_LEN + 1
-                susp = binary.find(FrameParam.SUSPICIOUS, start)
+        end = binary.find(FrameParam.TERMINATOR, start)
 
         # 如果只找到了1个定位串，也返回空帧。
-        return ""
+        if end == -1:
+            return ""
+
+        # 帧尾定位串前还有一个 0，一并去掉后，删除每个连续 5 个 1 后面的 0。
+        return binary[start : end - 1].replace(
+            FrameParam.STUFFED, FrameParam.SUSPICIOUS
+        )
 
 
 if __name__ == "__main__":
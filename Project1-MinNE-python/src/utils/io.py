@@ -1,6 +1,13 @@
 import os
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from json import loads
+from random import Random
+from re import findall, fullmatch
+from typing import Optional
+
+from utils.logger import Logger, loggers
+from utils.params import ForwardingMode, LogLevel, Network
 
 # 各重要目录名。
 CONFIG_DIR = "config"
@@ -39,20 +46,38 @@ log_dir = os.path.join(rootdir, LOG_DIR)
 if not os.path.exists(log_dir):
     os.mkdir(log_dir)
 
+# 物理层配置文件中的连线行，以及未配置时各链路参数的默认值。
+LINK_PATTERN = r"(\d+),(\d+)--(\d+),(\d+)((?:\s+\w+=\S+)*)"
+PHY_DEFAULTS = {
+    "errorProb": 0.0,
+    "bufferSize": 1500.0,
+    "delay": 0.0,
+    "jitter": 0.0,
+    "loss": 0.0,
+}
+
 # 时区设置。
 timezone(timedelta(hours=8))
 
 
-def write_log(device_id: str, message: str) -> None:
+def write_log(
+    device_id: str, message: str, level: int = LogLevel.INFO, **fields
+) -> None:
     """记录日志。
 
+    每台设备的日志写入 log 目录下的 `{device_id}.log`，每行一条 JSON 记录，
+    见 `Logger`。记录只放入内存缓冲区，由后台线程批量写入。
+
     Args:
         device_id: 发起记录请求的设备号。
         message: 要记录的日志消息。
+        level: 可选，日志级别，见 `LogLevel`；默认为 `INFO`。
+        fields: 附加的字段，如速率、目的端口等，取值须能序列化为 JSON。
     """
-    log_path = os.path.join(log_dir, f"{device_id}.log")
-    with open(log_path, "a", encoding="utf-8") as fa:
-        fa.write(f"[{datetime.now().strftime('%H:%M:%S.%f')[:-3]}] {message}\n")
+    logger = loggers.get(device_id)
+    if logger is None:
+        logger = loggers[device_id] = Logger(os.path.join(log_dir, f"{device_id}.log"))
+    logger.log(level, message, **fields)
 
 
 def cover_batch(stage: str) -> None:
@@ -111,26 +136,67 @@ def run_batch() -> None:
     os.system(batch_file)
 
 
-def get_host_config() -> list[str]:
-    """获取主机配置。
+@dataclass
+class DeviceMap:
+    """解析后的设备拓扑文件。"""
+
+    # 主机设备号列表；文件中没有 "host" 时为 `None`。
+    hosts: Optional[list[str]]
+    # 交换机设备号与配置，配置中 "phynum" 为物理层数量。
+    switches: dict[str, dict]
+    # 路由器设备号与配置，配置中 "LAN"、"WAN" 分别为局域网与广域网环境。
+    routers: dict[str, dict]
+    # 启用压缩线路编码的物理层端口号列表。
+    packed: list[str]
+
+
+# 各设备拓扑文件的解析结果，以及解析时文件的修改时间与大小。
+devicemap_cache: dict[str, tuple[tuple[int, int], DeviceMap]] = {}
+
+
+def load_devicemap() -> DeviceMap:
+    """读取设备拓扑文件。
+
+    解析结果按文件路径缓存在进程内，所有读取设备拓扑的函数共用同一份；
+    只有文件的修改时间或大小变化时才重新解析。
 
     Returns:
-        拓扑内的主机设备号列表。
+        解析后的设备拓扑。
     """
-    # 打开配置文件。
     try:
-        with open(devicemap_file, "r", encoding="utf-8") as fr:
-            # 读取该设备配置。
-            try:
-                hosts = loads(fr.read())["host"]
-            except KeyError:
-                print(f"[Error] Hosts absence")
-                exit(-1)
-            else:
-                return hosts
+        stat = os.stat(devicemap_file)
     except FileNotFoundError:
         print(f"[Error] {devicemap_file} not found")
         exit(-1)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = devicemap_cache.get(devicemap_file)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    with open(devicemap_file, "r", encoding="utf-8") as fr:
+        config: dict = loads(fr.read())
+    hosts = config.get("host")
+    devicemap = DeviceMap(
+        hosts=None if hosts is None else [str(host) for host in hosts],
+        switches=config.get("switch", {}),
+        routers=config.get("router", {}),
+        packed=[str(port) for port in config.get("packed", [])],
+    )
+    devicemap_cache[devicemap_file] = (stamp, devicemap)
+    return devicemap
+
+
+def get_host_config() -> list[str]:
+    """获取主机配置。
+
+    Returns:
+        拓扑内的主机设备号列表。
+    """
+    hosts = load_devicemap().hosts
+    if hosts is None:
+        print(f"[Error] Hosts absence")
+        exit(-1)
+    return list(hosts)
 
 
 def get_switch_config(device_id: str) -> int:
@@ -142,19 +208,10 @@ def get_switch_config(device_id: str) -> int:
     Returns:
         物理层数量。
     """
-    # 打开配置文件。
     try:
-        with open(devicemap_file, "r", encoding="utf-8") as fr:
-            # 读取该设备配置。
-            try:
-                num = loads(fr.read())["switch"][device_id]["phynum"]
-            except KeyError:
-                print(f"[Error] Device {device_id} absence")
-                exit(-1)
-            else:
-                return num
-    except FileNotFoundError:
-        print(f"[Error] {devicemap_file} not found")
+        return load_devicemap().switches[device_id]["phynum"]
+    except KeyError:
+        print(f"[Error] Device {device_id} absence")
         exit(-1)
 
 
@@ -171,20 +228,13 @@ def get_router_WAN(device_id: str) -> dict[str, dict]:
             - "exit": 要到达该路由器，消息应该从哪个本地物理层端口送出。
             - "cost": 到达该路由器的费用。
     """
-    # 打开配置文件。
     try:
-        with open(devicemap_file, "r", encoding="utf-8") as fr:
-            # 读取初始路由表。
-            try:
-                WAN_env: dict = loads(fr.read())["router"][device_id]["WAN"]
-            except KeyError:
-                print(f"[Error] Device {device_id} absence")
-                exit(-1)
-            else:
-                return WAN_env
-    except FileNotFoundError:
-        print(f"[Error] {devicemap_file} not found")
+        WAN_env: dict = load_devicemap().routers[device_id]["WAN"]
+    except KeyError:
+        print(f"[Error] Device {device_id} absence")
         exit(-1)
+    # 返回副本，调用方修改时不影响缓存。
+    return {dst: dict(path) for dst, path in WAN_env.items()}
 
 
 def get_router_LAN(device_id: str) -> dict[str, str]:
@@ -198,20 +248,199 @@ def get_router_LAN(device_id: str) -> dict[str, str]:
         - 键: 所属主机的设备号。
         - 值: 到达该主机的本地物理层端口号。
     """
+    try:
+        LAN_env: dict = load_devicemap().routers[device_id]["LAN"]
+    except KeyError:
+        print(f"[Error] Device {device_id} absence")
+        exit(-1)
+    return dict(LAN_env)
+
+
+def get_forwarding_mode(device_id: str) -> str:
+    """获取交换机或路由器的转发方式。
+
+    在设备拓扑文件中该设备的配置里以 "forwarding" 给出，
+    取值为 "cut-through" 或 "store-and-forward"。
+
+    Args:
+        device_id: 交换机或路由器的设备号。
+
+    Returns:
+        转发方式，见 `ForwardingMode`；未给出时为 `FORWARDING_MODE`。
+    """
+    devicemap = load_devicemap()
+    config = devicemap.switches.get(device_id) or devicemap.routers.get(device_id)
+    if config is None:
+        print(f"[Error] Device {device_id} absence")
+        exit(-1)
+    mode = config.get("forwarding", Network.FORWARDING_MODE)
+    if mode not in ForwardingMode.MODES:
+        print(f"[Error] Unknown forwarding mode {mode} of device {device_id}")
+        exit(-1)
+    return mode
+
+
+def get_device_ids() -> tuple[list[str], list[str], list[str]]:
+    """获取拓扑内的全部设备号。
+
+    Returns:
+        - [0] 主机设备号列表。
+        - [1] 交换机设备号列表。
+        - [2] 路由器设备号列表。
+    """
+    devicemap = load_devicemap()
+    return (
+        list(devicemap.hosts or []),
+        list(devicemap.switches.keys()),
+        list(devicemap.routers.keys()),
+    )
+
+
+def get_phy_links() -> dict[str, str]:
+    """获取物理层之间的连线。
+
+    连线写在物理层配置文件中，每行形如 `1,0--3,0`，即设备 1 的 0 号物理层与
+    设备 3 的 0 号物理层相连；行末可以带有该链路的参数，见 `get_phy_params`。
+
+    Returns:
+        物理层连线，两个方向都会列出。
+        - 键: 某一物理层的端口号。
+        - 值: 与之相连的物理层的端口号。
+    """
+    links = {}
     # 打开配置文件。
     try:
-        with open(devicemap_file, "r", encoding="utf-8") as fr:
-            # 读取初始路由表。
-            try:
-                LAN_env: dict = loads(fr.read())["router"][device_id]["LAN"]
-            except KeyError:
-                print(f"[Error] Device {device_id} absence")
-                exit(-1)
-            else:
-                return LAN_env
+        with open(ne_file, "r", encoding="utf-8") as fr:
+            for line in fr:
+                match = fullmatch(LINK_PATTERN, line.strip())
+                if not match:
+                    continue
+                a_id, a_phy, b_id, b_phy, _ = match.groups()
+                a, b = f"1{a_id}10{a_phy}", f"1{b_id}10{b_phy}"
+                links[a], links[b] = b, a
     except FileNotFoundError:
-        print(f"[Error] {devicemap_file} not found")
+        print(f"[Error] {ne_file} not found")
+        exit(-1)
+    return links
+
+
+def get_phy_params() -> dict[str, dict[str, float]]:
+    """获取各条物理链路的参数。
+
+    物理层配置文件中以 `键 = 值` 形式给出的是全局参数，写在连线行末的
+    `键=值` 只对该链路的两个方向生效。参数包括：
+    - errorProb: 误码率，即每一位出错的概率。
+    - bufferSize: 缓存区大小，即单帧的最大位数，更长的帧被丢弃。
+    - delay: 传播时延，单位为毫秒。
+    - jitter: 时延抖动的幅度，单位为毫秒。
+    - loss: 整帧丢失的概率。
+
+    Returns:
+        各方向链路的参数，未给出的取 `PHY_DEFAULTS` 中的默认值。
+        - 键: 发送方物理层的端口号。
+        - 值: 参数名与参数值。
+    """
+    defaults = dict(PHY_DEFAULTS)
+    overrides: dict[str, dict[str, float]] = {}
+    # 打开配置文件。
+    try:
+        with open(ne_file, "r", encoding="utf-8") as fr:
+            for line in fr:
+                line = line.strip()
+                link = fullmatch(LINK_PATTERN, line)
+                if link:
+                    a_id, a_phy, b_id, b_phy, options = link.groups()
+                    param = {
+                        key: float(value)
+                        for key, value in findall(r"(\w+)=([\d.eE+-]+)", options)
+                        if key in PHY_DEFAULTS
+                    }
+                    overrides[f"1{a_id}10{a_phy}"] = param
+                    overrides[f"1{b_id}10{b_phy}"] = param
+                    continue
+                option = fullmatch(r"(\w+)\s*=\s*([\d.eE+-]+)", line)
+                if option and option.group(1) in PHY_DEFAULTS:
+                    defaults[option.group(1)] = float(option.group(2))
+    except FileNotFoundError:
+        print(f"[Error] {ne_file} not found")
         exit(-1)
+    return {port: {**defaults, **param} for port, param in overrides.items()}
+
+
+def get_metrics_path(name: str) -> str:
+    """生成某一进程的指标文本文件路径。
+
+    Args:
+        name: 进程名，如 "1-net"。
+
+    Returns:
+        log 目录下以 `.prom` 结尾的文件路径。
+    """
+    return os.path.join(log_dir, f"{name}.prom")
+
+
+def get_packed_ports() -> list[str]:
+    """获取启用压缩线路编码的物理层端口。
+
+    外部物理层程序只认旧格式，因此默认不启用；只有在设备拓扑文件的 "packed"
+    列表中显式列出的端口，才从第一帧起就使用压缩格式。
+
+    Returns:
+        启用压缩线路编码的物理层端口号列表。
+    """
+    return list(load_devicemap().packed)
+
+
+def generate_devicemap(routers: int, seed: int = 0) -> dict:
+    """生成测试用的设备拓扑。
+
+    路由器连成环，再加若干随机捷径，每台路由器的局域网内有一台主机。
+
+    Args:
+        routers: 路由器数量，设备号为 1 至 `routers`，主机的设备号接在其后。
+        seed: 可选，随机种子；默认为 0。
+
+    Returns:
+        与设备拓扑文件格式相同的字典，链路费用为 1 至 10 之间的随机整数。
+    """
+    random = Random(seed)
+    ids = [str(i) for i in range(1, routers + 1)]
+    config = {
+        str(i): {"LAN": {str(routers + i): f"1{i}100"}, "WAN": {}}
+        for i in range(1, routers + 1)
+    }
+
+    def link(a: str, b: str) -> None:
+        """连接两台路由器，两个方向的费用相同。"""
+        if a == b or b in config[a]["WAN"]:
+            return
+        cost = random.randint(1, 10)
+        config[a]["WAN"][b] = {
+            "exit": f"1{a}10{len(config[a]['WAN']) + 1}",
+            "cost": cost,
+        }
+        config[b]["WAN"][a] = {
+            "exit": f"1{b}10{len(config[b]['WAN']) + 1}",
+            "cost": cost,
+        }
+
+    for index, device_id in enumerate(ids):
+        link(device_id, ids[(index + 1) % routers])
+        link(device_id, random.choice(ids))
+    return {
+        "router": config,
+        "switch": {},
+        "host": [str(routers + i) for i in range(1, routers + 1)],
+    }
+
+
+def new_rsc_path() -> str:
+    """生成资源目录下保存接收文件的路径。
+
+    Returns:
+        文件的绝对路径。
+    """
+    return os.path.join(rsc_dir, f"received-{datetime.now().strftime('%H%M%S')}.png")
 
 
 def save_rsc(data: bytes) -> tuple[str, bool]:
@@ -223,8 +452,7 @@ def save_rsc(data: bytes) -> tuple[str, bool]:
     Returns:
         保存成功为`True`，保存失败为`False`。
     """
-    filepath = os.path.join(
-        rsc_dir, f"received-{datetime.now().strftime('%H%M%S')}.png")
+    filepath = new_rsc_path()
     try:
         with open(filepath, "wb") as fw:
             fw.write(data)
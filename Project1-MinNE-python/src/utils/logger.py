@@ -0,0 +1,187 @@
+import atexit
+import json
+import os
+from collections import deque
+from datetime import datetime
+from threading import Event, Lock, Thread
+from time import time
+
+from utils.params import LogLevel, Network
+
+
+class Logger:
+    """缓冲写入的结构化日志。
+
+    记录时只把时刻、级别与字段放入内存缓冲区，不做格式化，也不访问文件；
+    后台线程每隔 `interval` 秒，或者缓冲区积累到 `capacity` 条时，
+    才把这批记录格式化为 JSON Lines 写入一直打开的文件。
+    文件超过 `max_bytes` 字节时轮转，保留 `backups` 个旧文件。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        level: int = Network.LOG_LEVEL,
+        capacity: int = Network.LOG_BUFFER,
+        interval: float = Network.LOG_INTERVAL,
+        max_bytes: int = Network.LOG_MAX_BYTES,
+        backups: int = Network.LOG_BACKUPS,
+    ) -> None:
+        """初始化日志，打开文件并启动后台线程。
+
+        Args:
+            path: 日志文件路径。
+            level: 可选，最低记录级别，见 `LogLevel`；默认为 `LOG_LEVEL`。
+            capacity: 可选，触发刷新的缓冲记录数；默认为 `LOG_BUFFER`。
+            interval: 可选，定期刷新的间隔，单位为秒；默认为 `LOG_INTERVAL`。
+            max_bytes: 可选，单个文件的最大字节数，为 0 时不轮转；默认为 `LOG_MAX_BYTES`。
+            backups: 可选，轮转时保留的旧文件数；默认为 `LOG_BACKUPS`。
+        """
+        self.__path = path
+        self.__level = level
+        self.__capacity = capacity
+        self.__max_bytes = max_bytes
+        self.__backups = backups
+        # 双端队列的追加与弹出是线程安全的，记录时不必加锁。
+        self.__records: deque[tuple[float, int, str, dict]] = deque()
+        self.__lock = Lock()
+        self.__file = open(path, "ab")
+        self.__wakeup = Event()
+        self.__closed = False
+        Thread(target=self.__run, args=(interval,), daemon=True).start()
+
+    @property
+    def level(self) -> int:
+        """最低记录级别，低于该级别的记录直接丢弃。"""
+        return self.__level
+
+    @level.setter
+    def level(self, level: int) -> None:
+        self.__level = level
+
+    def log(self, level: int, message: str, **fields) -> None:
+        """记录一条日志。
+
+        Args:
+            level: 级别，见 `LogLevel`。
+            message: 日志消息。
+            fields: 附加的字段，取值须能序列化为 JSON。
+        """
+        if level < self.__level or self.__closed:
+            return
+        self.__records.append((time(), level, message, fields))
+        if len(self.__records) >= self.__capacity:
+            self.__wakeup.set()
+
+    def debug(self, message: str, **fields) -> None:
+        """记录一条调试日志。"""
+        self.log(LogLevel.DEBUG, message, **fields)
+
+    def info(self, message: str, **fields) -> None:
+        """记录一条普通日志。"""
+        self.log(LogLevel.INFO, message, **fields)
+
+    def warning(self, message: str, **fields) -> None:
+        """记录一条警告日志。"""
+        self.log(LogLevel.WARNING, message, **fields)
+
+    def error(self, message: str, **fields) -> None:
+        """记录一条错误日志。"""
+        self.log(LogLevel.ERROR, message, **fields)
+
+    def flush(self) -> None:
+        """把缓冲区中的记录写入文件。"""
+        with self.__lock:
+            # 只取出此刻已有的记录，之后追加的留给下一次刷新。
+            records = [self.__records.popleft() for _ in range(len(self.__records))]
+            if not records or self.__file.closed:
+                return
+            data = "".join(map(Logger.format, records)).encode("utf-8")
+            if self.__max_bytes and self.__file.tell() + len(data) > self.__max_bytes:
+                self.__rotate()
+            self.__file.write(data)
+            self.__file.flush()
+
+    def close(self) -> None:
+        """写入剩余的记录，停止后台线程并关闭文件。"""
+        self.__closed = True
+        self.flush()
+        with self.__lock:
+            self.__file.close()
+        self.__wakeup.set()
+
+    @staticmethod
+    def format(record: tuple[float, int, str, dict]) -> str:
+        """将一条记录格式化为一行 JSON。
+
+        Args:
+            record: 时刻、级别、消息与附加字段。
+
+        Returns:
+            以换行结尾的 JSON 字符串。
+        """
+        tick, level, message, fields = record
+        return (
+            json.dumps(
+                {
+                    "time": datetime.fromtimestamp(tick).isoformat(
+                        timespec="milliseconds"
+                    ),
+                    "level": LogLevel.NAMES[level],
+                    "message": message,
+                    **fields,
+                },
+                ensure_ascii=False,
+            )
+            + "\n"
+        )
+
+    def __rotate(self) -> None:
+        """轮转日志文件：`x.log` 改名为 `x.log.1`，旧文件依次后移，最旧的删除。"""
+        self.__file.close()
+        for index in range(self.__backups, 0, -1):
+            source = f"{self.__path}.{index - 1}" if index > 1 else self.__path
+            if os.path.exists(source):
+                os.replace(source, f"{self.__path}.{index}")
+        if not self.__backups:
+            os.remove(self.__path)
+        self.__file = open(self.__path, "ab")
+
+    def __run(self, interval: float) -> None:
+        """后台线程：定期或被唤醒时刷新，直到关闭。"""
+        while not self.__closed:
+            self.__wakeup.wait(interval)
+            self.__wakeup.clear()
+            self.flush()
+
+
+def read_log(path: str) -> list[dict]:
+    """读取 JSON Lines 格式的日志。
+
+    跳过无法解析的行，例如旧格式的日志或写了一半的最后一行。
+
+    Args:
+        path: 日志文件路径。
+
+    Returns:
+        各条记录，按写入顺序排列。
+    """
+    records = []
+    with open(path, "r", encoding="utf-8") as fr:
+        for line in fr:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+# 进程内各设备的日志，退出时写入剩余的记录。
+loggers: dict[str, Logger] = {}
+
+
+@atexit.register
+def close_loggers() -> None:
+    """关闭所有日志。"""
+    for logger in loggers.values():
+        logger.close()
@@ -0,0 +1,477 @@
+import os
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Thread
+from typing import Callable, Optional, Union
+
+from utils.params import Network
+
+# 直方图默认的桶上界，单位为秒，从帧的封装解析（微秒级）覆盖到往返时间（秒级）。
+DEFAULT_BUCKETS = (
+    1e-5,
+    2.5e-5,
+    5e-5,
+    1e-4,
+    2.5e-4,
+    5e-4,
+    1e-3,
+    2.5e-3,
+    5e-3,
+    1e-2,
+    2.5e-2,
+    5e-2,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+
+class Counter:
+    """计数器，只增不减。"""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        """初始化计数为 0。"""
+        self.value = 0
+
+    def inc(self, amount: Union[int, float] = 1) -> None:
+        """增加计数。
+
+        Args:
+            amount: 可选，增量；默认为 1。
+        """
+        self.value += amount
+
+
+class Gauge:
+    """仪表，记录可增可减的当前值。
+
+    也可以指定取值函数，导出时才读取，例如接收队列的长度，热路径上没有开销。
+    """
+
+    __slots__ = ("value", "function")
+
+    def __init__(self) -> None:
+        """初始化当前值为 0。"""
+        self.value = 0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        """设置当前值。"""
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """指定取值函数，之后导出时以其返回值为当前值。"""
+        self.function = function
+
+    def get(self) -> float:
+        """读取当前值。"""
+        return self.function() if self.function else self.value
+
+
+class Histogram:
+    """直方图，按桶统计样本的分布。
+
+    每个样本只落入一个桶，导出时才累加成 Prometheus 要求的累计计数。
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """初始化直方图。
+
+        Args:
+            buckets: 可选，升序排列的桶上界，最后隐含一个 `+Inf` 桶；默认为 `DEFAULT_BUCKETS`。
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """记录一个样本。
+
+        Args:
+            value: 样本值。
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class NullMetric:
+    """关闭指标时使用的空指标，所有操作都不做任何事。"""
+
+    __slots__ = ()
+
+    def inc(self, amount: Union[int, float] = 1) -> None:
+        """忽略增量。"""
+
+    def set(self, value: float) -> None:
+        """忽略当前值。"""
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """忽略取值函数。"""
+
+    def observe(self, value: float) -> None:
+        """忽略样本。"""
+
+
+NULL_METRIC = NullMetric()
+
+
+class MetricFamily:
+    """同名的一族指标，按标签区分。
+
+    各层在初始化时用 `labels` 取出自己的指标并保存，热路径上只做一次属性自增。
+    """
+
+    KINDS = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        kind: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        """初始化指标族。
+
+        Args:
+            name: 指标名。
+            doc: 指标说明。
+            kind: 指标类型，"counter"、"gauge" 或 "histogram"。
+            buckets: 可选，直方图的桶上界；默认为 `DEFAULT_BUCKETS`。
+        """
+        self.name = name
+        self.doc = doc
+        self.kind = kind
+        self.__buckets = buckets
+        self.__children: dict[tuple, Union[Counter, Gauge, Histogram]] = {}
+
+    def labels(self, **labels: str) -> Union[Counter, Gauge, Histogram, NullMetric]:
+        """取出带有指定标签的指标，不存在时新建。
+
+        Args:
+            labels: 标签名与标签值。
+
+        Returns:
+            对应的指标；关闭指标时为空指标。
+        """
+        if not Network.METRICS:
+            return NULL_METRIC
+        key = tuple(sorted(labels.items()))
+        child = self.__children.get(key)
+        if child is None:
+            if self.kind == "histogram":
+                child = Histogram(self.__buckets)
+            else:
+                child = MetricFamily.KINDS[self.kind]()
+            self.__children[key] = child
+        return child
+
+    def bind(self, label: str, **labels: str) -> "BoundFamily":
+        """固定其余标签，生成按某一标签取出指标的字典。
+
+        Args:
+            label: 取出时才确定的标签名。
+            labels: 其余标签名与标签值。
+
+        Returns:
+            以该标签的值为键的字典，首次取出时新建指标。
+        """
+        return BoundFamily(self, label, labels)
+
+    def clear(self) -> None:
+        """删除所有指标。"""
+        self.__children.clear()
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        """列出所有样本。
+
+        Returns:
+            各样本的名称、标签与值，直方图展开为各桶、总和与样本数。
+        """
+        samples = []
+        for key, child in list(self.__children.items()):
+            labels = dict(key)
+            if self.kind == "counter":
+                samples.append((self.name, labels, child.value))
+            elif self.kind == "gauge":
+                samples.append((self.name, labels, child.get()))
+            else:
+                cumulative = 0
+                bounds = [*map(format_value, child.buckets), "+Inf"]
+                for bound, count in zip(bounds, child.counts):
+                    cumulative += count
+                    samples.append(
+                        (f"{self.name}_bucket", {**labels, "le": bound}, cumulative)
+                    )
+                samples.append((f"{self.name}_sum", labels, child.sum))
+                samples.append((f"{self.name}_count", labels, child.count))
+        return samples
+
+
+class BoundFamily(dict):
+    """固定了部分标签的指标族。
+
+    以剩下一个标签的值为键，命中时只是一次字典查找，适合按端口计数的热路径。
+    """
+
+    def __init__(self, family: MetricFamily, label: str, labels: dict[str, str]):
+        """初始化空字典。
+
+        Args:
+            family: 所属的指标族。
+            label: 作为键的标签名。
+            labels: 其余标签名与标签值。
+        """
+        super().__init__()
+        self.__family = family
+        self.__label = label
+        self.__labels = labels
+
+    def __missing__(self, value: str) -> Union[Counter, Gauge, Histogram, NullMetric]:
+        """取出并缓存该标签值对应的指标。"""
+        child = self[value] = self.__family.labels(
+            **self.__labels, **{self.__label: value}
+        )
+        return child
+
+
+class Registry:
+    """指标注册表。
+
+    同一进程内的各层共用一个注册表，以标签区分设备与端口；
+    可以按 Prometheus 文本格式导出到文件或 HTTP 端点。
+    """
+
+    def __init__(self) -> None:
+        """初始化空注册表。"""
+        self.__families: dict[str, MetricFamily] = {}
+
+    def __register(self, name: str, doc: str, kind: str, **kwargs) -> MetricFamily:
+        """注册指标族，同名时返回已有的指标族。"""
+        if name not in self.__families:
+            self.__families[name] = MetricFamily(name, doc, kind, **kwargs)
+        return self.__families[name]
+
+    def counter(self, name: str, doc: str) -> MetricFamily:
+        """注册计数器。
+
+        Args:
+            name: 指标名，按惯例以 `_total` 结尾。
+            doc: 指标说明。
+
+        Returns:
+            计数器族。
+        """
+        return self.__register(name, doc, "counter")
+
+    def gauge(self, name: str, doc: str) -> MetricFamily:
+        """注册仪表。
+
+        Args:
+            name: 指标名。
+            doc: 指标说明。
+
+        Returns:
+            仪表族。
+        """
+        return self.__register(name, doc, "gauge")
+
+    def histogram(
+        self, name: str, doc: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> MetricFamily:
+        """注册直方图。
+
+        Args:
+            name: 指标名，按惯例带有单位后缀。
+            doc: 指标说明。
+            buckets: 可选，桶上界；默认为 `DEFAULT_BUCKETS`。
+
+        Returns:
+            直方图族。
+        """
+        return self.__register(name, doc, "histogram", buckets=buckets)
+
+    def clear(self) -> None:
+        """删除所有指标的数据，保留已注册的指标族。"""
+        for family in self.__families.values():
+            family.clear()
+
+    def snapshot(self) -> dict[str, float]:
+        """取出所有样本的当前值，便于程序内比较。
+
+        Returns:
+            - 键: 样本名与标签，格式同文本导出。
+            - 值: 样本值。
+        """
+        return {
+            f"{name}{format_labels(labels)}": value
+            for family in self.__families.values()
+            for name, labels, value in family.samples()
+        }
+
+    def exposition(self) -> str:
+        """按 Prometheus 文本格式导出所有指标。
+
+        Returns:
+            导出的文本。
+        """
+        lines = []
+        for family in self.__families.values():
+            lines.append(f"# HELP {family.name} {family.doc}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            lines.extend(
+                f"{name}{format_labels(labels)} {format_value(value)}"
+                for name, labels, value in family.samples()
+            )
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """将所有指标写入文本文件，供 node_exporter 的 textfile 收集器读取。
+
+        先写临时文件再替换，收集器不会读到写了一半的文件。
+
+        Args:
+            path: 文件路径，按惯例以 `.prom` 结尾。
+        """
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as fw:
+            fw.write(self.exposition())
+        os.replace(temp_path, path)
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    """按 Prometheus 文本格式拼接标签。"""
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+    return f"{{{pairs}}}"
+
+
+def escape(value: str) -> str:
+    """转义标签值中的反斜杠、双引号与换行。"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value: float) -> str:
+    """按 Prometheus 文本格式书写数值，整数不带小数点。"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+# 进程内共用的注册表，以及各层上报的指标。
+REGISTRY = Registry()
+
+FRAMES = REGISTRY.counter(
+    "minne_frames_total", "Frames sent to or received from a PHY port."
+)
+BYTES = REGISTRY.counter(
+    "minne_bytes_total", "Bytes sent to or received from a port, on any socket."
+)
+MESSAGES = REGISTRY.counter(
+    "minne_messages_total", "Messages exchanged between layers of one device."
+)
+CRC_FAILURES = REGISTRY.counter(
+    "minne_crc_failures_total", "Received frames that failed the CRC check."
+)
+FRAMES_DROPPED = REGISTRY.counter(
+    "minne_frames_dropped_total", "Frames dropped at ingress by a forwarding device."
+)
+NAKS = REGISTRY.counter("minne_naks_total", "NAKs received by a sender.")
+RETRANSMITS = REGISTRY.counter(
+    "minne_retransmits_total", "Frames sent again after a NAK or a timeout."
+)
+TIMEOUTS = REGISTRY.counter(
+    "minne_timeouts_total", "Retransmission timeouts of a sender."
+)
+KEEPALIVE_ABORTS = REGISTRY.counter(
+    "minne_keepalive_aborts_total",
+    "Transfers given up after KEEPALIVE_MAX_RETRY timeouts in a row.",
+)
+TRANSFERS = REGISTRY.counter(
+    "minne_transfers_total", "Messages a host has finished sending."
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "minne_queue_depth", "Datagrams waiting in a layer's receive queue."
+)
+ACK_RTT = REGISTRY.histogram(
+    "minne_ack_rtt_seconds", "Round-trip time from a frame to its ACK."
+)
+FRAME_BUILD = REGISTRY.histogram(
+    "minne_frame_build_seconds", "Time spent building one frame."
+)
+FRAME_PARSE = REGISTRY.histogram(
+    "minne_frame_parse_seconds", "Time spent parsing one frame."
+)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """拉取端点，对任意 GET 请求返回注册表的文本导出。"""
+
+    registry = REGISTRY
+
+    def do_GET(self) -> None:
+        """返回所有指标。"""
+        body = self.registry.exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        """不打印访问日志，以免混入设备的输出。"""
+
+
+def serve_metrics(
+    port: int, registry: Registry = REGISTRY, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """在后台线程上开启 HTTP 拉取端点。
+
+    指标只在导出时读取，不需要与事件循环或收发线程同步。
+
+    Args:
+        port: 监听的端口号。
+        registry: 可选，要导出的注册表；默认为进程内共用的注册表。
+        host: 可选，监听的地址；默认只监听本机。
+
+    Returns:
+        HTTP 服务器，可以调用 `shutdown()` 关闭。
+    """
+    handler = type("Handler", (MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def export_textfile(
+    path: str,
+    interval: float = Network.METRICS_INTERVAL,
+    registry: Registry = REGISTRY,
+) -> Event:
+    """在后台线程上定期把指标写入文本文件。
+
+    Args:
+        path: 文件路径。
+        interval: 可选，写入间隔，单位为秒；默认为 `METRICS_INTERVAL`。
+        registry: 可选，要导出的注册表；默认为进程内共用的注册表。
+
+    Returns:
+        停止事件，设置后再写入一次就结束。
+    """
+    stopped = Event()
+
+    def run() -> None:
+        while not stopped.wait(interval):
+            registry.write_textfile(path)
+        registry.write_textfile(path)
+
+    Thread(target=run, daemon=True).start()
+    return stopped
@@ -0,0 +1,81 @@
+from time import monotonic, sleep
+
+from utils.params import Network
+
+
+class TokenBucket:
+    """令牌桶。
+
+    以 `rate` 帧每秒的速度积累令牌，最多积累 `burst` 个；每发一帧消耗一个令牌，
+    只有令牌耗尽时才需要等待。开启自适应后，按丢包与确认情况加性增、乘性减地
+    调整速率，但不低于 `min_rate`。
+    """
+
+    def __init__(
+        self,
+        rate: float = Network.PACING_RATE,
+        burst: int = Network.PACING_BURST,
+        min_rate: float = Network.PACING_MIN_RATE,
+        adaptive: bool = Network.PACING_ADAPTIVE,
+    ) -> None:
+        """初始化令牌桶，初始时桶是满的。
+
+        Args:
+            rate: 可选，最大速率，单位为帧每秒；默认为 `PACING_RATE`。
+            burst: 可选，桶容量，即最大突发帧数；默认为 `PACING_BURST`。
+            min_rate: 可选，自适应时的最低速率；默认为 `PACING_MIN_RATE`。
+            adaptive: 可选，是否按丢包情况调整速率；默认为 `PACING_ADAPTIVE`。
+        """
+        self.__max_rate = rate
+        self.__min_rate = min(min_rate, rate)
+        self.__rate = rate
+        self.__burst = burst
+        self.__adaptive = adaptive
+        self.__tokens = float(burst)
+        self.__tick = monotonic()
+
+    @property
+    def rate(self) -> float:
+        """当前速率，单位为帧每秒。"""
+        return self.__rate
+
+    def __refill(self) -> None:
+        """按经过的时间补充令牌。"""
+        now = monotonic()
+        self.__tokens = min(
+            self.__burst, self.__tokens + (now - self.__tick) * self.__rate
+        )
+        self.__tick = now
+
+    def reserve(self) -> float:
+        """预先取走一个令牌，不等待。
+
+        令牌不足时记为欠账，由调用者自行等待，供事件循环中不阻塞地限速。
+
+        Returns:
+            取用前需要等待的时间，单位为秒。
+        """
+        self.__refill()
+        self.__tokens -= 1
+        return max(0.0, -self.__tokens / self.__rate)
+
+    def consume(self) -> float:
+        """取走一个令牌，桶空时等待到有令牌为止。
+
+        Returns:
+            等待的时间，单位为秒。
+        """
+        waited = self.reserve()
+        if waited:
+            sleep(waited)
+        return waited
+
+    def on_loss(self) -> None:
+        """发生超时或收到 NAK 时，速率减半。"""
+        if self.__adaptive:
+            self.__rate = max(self.__min_rate, self.__rate / 2)
+
+    def on_ack(self) -> None:
+        """有新数据被确认时，速率增加一个最低速率的步长。"""
+        if self.__adaptive:
+            self.__rate = min(self.__max_rate, self.__rate + self.__min_rate)
@@ -3,6 +3,11 @@ class MessageType:
 
     TEXT = "1"
     FILE = "2"
+    # 不经 Base64，直接以原始字节逐位传输的文件。
+    RAW_FILE = "3"
+    # 按 UTF-8 变长编码的文本。
+    UTF8_TEXT = "4"
+    FILE_LIST = (FILE, RAW_FILE)
 
 
 class Mode:
@@ -12,22 +17,99 @@ class Mode:
     BROADCAST = "2"
 
 
+class ARQMode:
+    """差错控制协议。"""
+
+    GO_BACK_N = "GBN"
+    SELECTIVE_REPEAT = "SR"
+
+
+class ForwardingMode:
+    """交换机与路由器的转发方式。"""
+
+    # 直通转发：解析出端口就转发，不做校验。
+    CUT_THROUGH = "cut-through"
+    # 存储转发：入口处完整解析并校验，丢弃校验失败的帧。
+    STORE_AND_FORWARD = "store-and-forward"
+    MODES = (CUT_THROUGH, STORE_AND_FORWARD)
+
+
+class LogLevel:
+    """日志级别。"""
+
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+    NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
 class Network:
     """通信网络约束。"""
 
     INTER_NE_BUFSIZE = 1024
     IN_NE_BUFSIZE = 8 * 1024 * 1024
 
+    # 是否允许与对端协商压缩线路编码。
+    PACKED_WIRE = True
+    # 文件是否以原始字节传输；为 `False` 时沿用 Base64 编码。
+    RAW_FILE = True
+    # 文本是否按 UTF-8 编码；为 `False` 时沿用每字符 16 位的编码。
+    UTF8_TEXT = True
+
     USER_TIMEOUT = 180
     SELECT_TIMEOUT = 0.5
     RECV_TIMEOUT = 0.5
+    # 自适应重传超时的初值与上下限，单位为秒。
+    RTO_INIT = RECV_TIMEOUT
+    RTO_MIN = 0.05
+    RTO_MAX = 2
     FLOW_INTERVAL = 0.02
 
+    # 令牌桶限速：最大速率（帧每秒）、最大突发帧数，以及是否按丢包自适应。
+    # 自适应时速率不低于原先固定间隔对应的速率。
+    PACING_RATE = 500
+    PACING_BURST = 16
+    PACING_MIN_RATE = 1 / FLOW_INTERVAL
+    PACING_ADAPTIVE = True
+
     KEEPALIVE_MAX_RETRY = 8
 
-    REMOTE_MAX_LIFE = 100
+    # 网元内部分块传输：每块数据的字节数、等待确认前最多连发的块数、确认超时与重试次数。
+    # 一个窗口的数据要能放进接收方套接字的缓存区，否则会在本机回环上丢包。
+    STREAM_CHUNK_SIZE = 16 * 1024
+    STREAM_WINDOW = 8
+    STREAM_TIMEOUT = 0.5
+    STREAM_MAX_RETRY = 8
+
+    # 滑动窗口大小与差错控制协议。窗口为 1 时退化为停止等待。
+    WINDOW_SIZE = 8
+    ARQ_MODE = ARQMode.GO_BACK_N
+
+    # 是否收集各层的指标，以及各进程把指标写入 log 目录下文本文件的间隔，单位为秒。
+    # 帧的封装与解析耗时每 `METRICS_SAMPLE` 帧抽样计时一次，其余指标逐帧累加。
+    METRICS = True
+    METRICS_INTERVAL = 5
+    METRICS_SAMPLE = 16
+
+    # 日志：最低记录级别、触发刷新的缓冲记录数与刷新间隔（秒）、
+    # 单个文件的最大字节数与轮转时保留的旧文件数。
+    LOG_LEVEL = LogLevel.INFO
+    LOG_BUFFER = 256
+    LOG_INTERVAL = 1
+    LOG_MAX_BYTES = 4 * 1024 * 1024
+    LOG_BACKUPS = 3
+
+    # 交换机端口地址表：表项的寿命（秒）与最多学习的表项数。
+    REMOTE_TTL = 300
+    REMOTE_MAX_ENTRIES = 4096
+
+    # 设备拓扑文件中没有给出转发方式时，交换机与路由器的转发方式。
+    FORWARDING_MODE = ForwardingMode.CUT_THROUGH
 
     ROUTER_SPREAD_INTERVAL = 10
+    # 路由器转发表中缓存的查找结果数。
+    ROUTE_CACHE_SIZE = 1024
 
 
 class Topology:
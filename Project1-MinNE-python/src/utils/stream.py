@@ -0,0 +1,233 @@
+from struct import Struct
+from typing import Optional
+
+from utils.params import Network
+
+# 网元内部分块传输的块头：魔数、块类型、消息号、块序号、总块数。
+# ACK 块的块序号为接收方期望的下一块。
+CHUNK_MAGIC = b"NC"
+CHUNK_HEADER = Struct("!2sBIII")
+
+
+class ChunkType:
+    """块类型。"""
+
+    DATA = 0
+    ACK = 1
+
+
+class Chunk:
+    """网元内部传输的一个块。"""
+
+    def __init__(
+        self, kind: int, msg_id: int, seq: int, total: int, payload=b""
+    ) -> None:
+        """初始化块。
+
+        Args:
+            kind: 块类型，见 `ChunkType`。
+            msg_id: 所属消息的消息号。
+            seq: 块序号；ACK 块为期望的下一块。
+            total: 该消息的总块数。
+            payload: 可选，块中的数据；默认为空。
+        """
+        self.kind = kind
+        self.msg_id = msg_id
+        self.seq = seq
+        self.total = total
+        self.payload = payload
+
+
+def encode_chunk(chunk: Chunk) -> bytes:
+    """将块打包为字节串。
+
+    Args:
+        chunk: 要打包的块。
+
+    Returns:
+        打包所得的字节串。
+    """
+    header = CHUNK_HEADER.pack(
+        CHUNK_MAGIC, chunk.kind, chunk.msg_id, chunk.seq, chunk.total
+    )
+    return header + chunk.payload
+
+
+def decode_chunk(data: bytes) -> Optional[Chunk]:
+    """将字节串解析为块。
+
+    块中的数据是 `memoryview` 切片，不复制。
+
+    Args:
+        data: 收到的字节串。
+
+    Returns:
+        解析所得的块；不是合法的块时为 `None`。
+    """
+    view = memoryview(data)
+    if len(view) < CHUNK_HEADER.size:
+        return None
+    magic, kind, msg_id, seq, total = CHUNK_HEADER.unpack_from(view)
+    if magic != CHUNK_MAGIC or kind not in (ChunkType.DATA, ChunkType.ACK):
+        return None
+    return Chunk(kind, msg_id, seq, total, view[CHUNK_HEADER.size :])
+
+
+def split_chunks(data: bytes, size: int) -> list[memoryview]:
+    """将消息切分为若干块数据。
+
+    Args:
+        data: 要切分的消息。
+        size: 每块数据的最大字节数。
+
+    Returns:
+        各块数据的 `memoryview` 切片；空消息也占一块。
+    """
+    view = memoryview(data)
+    return [view[i : i + size] for i in range(0, len(view), size)] or [view]
+
+
+class StreamSender:
+    """分块传输的发送方。
+
+    只维护协议状态，不涉及套接字；由调用者负责发送与计时。
+    每发一个窗口就等待确认，超时则从确认的位置起重发（回退 N 块）。
+    只有一块的消息不等待确认。
+    """
+
+    def __init__(self, data: bytes, msg_id: int) -> None:
+        """切分消息。
+
+        Args:
+            data: 要发送的消息。
+            msg_id: 该消息的消息号。
+        """
+        self.__msg_id = msg_id
+        self.__parts = split_chunks(data, Network.STREAM_CHUNK_SIZE)
+        self.__base = 0
+        self.__retry = 0
+
+    @property
+    def done(self) -> bool:
+        """是否所有块都已被确认。"""
+        return self.__base >= len(self.__parts)
+
+    def window(self) -> list[bytes]:
+        """取出当前窗口内要（重）发的块。
+
+        Returns:
+            打包好的块。
+        """
+        total = len(self.__parts)
+        end = min(self.__base + Network.STREAM_WINDOW, total)
+        chunks = [
+            encode_chunk(
+                Chunk(ChunkType.DATA, self.__msg_id, seq, total, self.__parts[seq])
+            )
+            for seq in range(self.__base, end)
+        ]
+        if total == 1:
+            self.__base = 1
+        return chunks
+
+    def ack(self, chunk: Optional[Chunk]) -> bool:
+        """处理收到的块。
+
+        Args:
+            chunk: 收到的块。
+
+        Returns:
+            是本消息的新确认为 `True`，否则为 `False`。
+        """
+        if (
+            not chunk
+            or chunk.kind != ChunkType.ACK
+            or chunk.msg_id != self.__msg_id
+            or chunk.seq <= self.__base
+        ):
+            return False
+        self.__base, self.__retry = chunk.seq, 0
+        return True
+
+    def timeout(self) -> bool:
+        """处理确认超时。
+
+        Returns:
+            还可以重发为 `True`，重试次数耗尽为 `False`。
+        """
+        self.__retry += 1
+        return self.__retry < Network.STREAM_MAX_RETRY
+
+
+class StreamReceiver:
+    """分块传输的接收方。
+
+    只维护协议状态，不涉及套接字；由调用者负责回复确认与计时。
+    按序接收各块，每收满一个窗口、收到乱序块或收完时确认；超时则重复确认。
+    """
+
+    def __init__(self, first: Chunk) -> None:
+        """以第一块开始接收。
+
+        Args:
+            first: 消息的第一块，之后仍要交给 `feed`。
+        """
+        self.__msg_id = first.msg_id
+        self.__total = first.total
+        self.__parts: list[memoryview] = []
+        self.__acked = 0
+        self.__retry = 0
+
+    @property
+    def done(self) -> bool:
+        """是否已收完。"""
+        return len(self.__parts) == self.__total
+
+    @property
+    def message(self) -> bytes:
+        """拼接所得的完整消息。"""
+        return b"".join(self.__parts)
+
+    def feed(self, chunk: Optional[Chunk]) -> Optional[bytes]:
+        """处理收到的块。
+
+        Args:
+            chunk: 收到的块，其它消息的块会被忽略。
+
+        Returns:
+            需要回复的确认；不需要回复时为 `None`。
+        """
+        if not chunk or chunk.kind != ChunkType.DATA or chunk.msg_id != self.__msg_id:
+            return None
+        self.__retry = 0
+        in_order = chunk.seq == len(self.__parts)
+        if in_order:
+            self.__parts.append(chunk.payload)
+        # 只有一块的消息不确认。
+        if self.__total == 1:
+            return None
+        if (
+            not in_order
+            or self.done
+            or len(self.__parts) - self.__acked >= Network.STREAM_WINDOW
+        ):
+            return self.__make_ack()
+        return None
+
+    def timeout(self) -> Optional[bytes]:
+        """处理接收超时。
+
+        Returns:
+            需要重复回复的确认；重试次数耗尽时为 `None`。
+        """
+        self.__retry += 1
+        if self.__retry == Network.STREAM_MAX_RETRY:
+            return None
+        return self.__make_ack()
+
+    def __make_ack(self) -> bytes:
+        """生成确认，携带期望的下一块。"""
+        self.__acked = len(self.__parts)
+        return encode_chunk(
+            Chunk(ChunkType.ACK, self.__msg_id, self.__acked, self.__total)
+        )